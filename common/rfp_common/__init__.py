@@ -0,0 +1 @@
+"""Modules imported by both the server (fastapi/) and the chat UI (streamlit-ui/)."""
@@ -0,0 +1,70 @@
+import os
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Shared by the ingestion service and the chat UI, so it defaults to a folder next to both
+CHUNK_STORE_PATH = os.getenv("CHUNK_STORE_PATH", "../data/chunk_store.sqlite3")
+
+_chunk_store = None
+_chunk_store_lock = threading.Lock()
+
+
+class ChunkStore:
+    """
+    Local store of chunk text keyed by Qdrant point ID.
+
+    With compact payloads Qdrant only holds the fields used for filtering and
+    citations; the text lives here and is read back for the final top-k only.
+    """
+
+    def __init__(self, path: str = CHUNK_STORE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, text TEXT NOT NULL, metadata TEXT NOT NULL)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def put_many(self, chunks: list[tuple[str, str, dict]]):
+        """Store (point_id, text, metadata) tuples, replacing existing ones."""
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, text, metadata) VALUES (?, ?, ?)",
+                [(point_id, text, json.dumps(metadata)) for point_id, text, metadata in chunks],
+            )
+
+    def get_many(self, point_ids: list[str]) -> dict[str, dict]:
+        """Return {point_id: {"text": ..., "metadata": ...}} for the IDs that are stored."""
+        if not point_ids:
+            return {}
+        placeholders = ",".join("?" * len(point_ids))
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT id, text, metadata FROM chunks WHERE id IN ({placeholders})", [str(i) for i in point_ids]
+            ).fetchall()
+        return {point_id: {"text": text, "metadata": json.loads(metadata)} for point_id, text, metadata in rows}
+
+    def delete_many(self, point_ids: list[str]):
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM chunks WHERE id = ?", [(str(i),) for i in point_ids])
+
+
+def get_chunk_store() -> ChunkStore:
+    """Return the process-wide chunk store, creating it on first use."""
+    global _chunk_store
+    with _chunk_store_lock:
+        if _chunk_store is None:
+            _chunk_store = ChunkStore()
+        return _chunk_store
@@ -0,0 +1,103 @@
+import os
+import logging
+import threading
+import httpx
+from qdrant_client import QdrantClient
+
+logger = logging.getLogger(__name__)
+
+# gRPC keeps one multiplexed HTTP/2 connection open instead of a REST connection pool
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "true").lower() == "true"
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", "60"))
+# Pings an idle channel so load balancers and NAT do not drop it between requests
+QDRANT_GRPC_KEEPALIVE_MS = int(os.getenv("QDRANT_GRPC_KEEPALIVE_MS", "30000"))
+MISTRAL_API_URL = os.getenv("MISTRAL_API_URL", "https://api.mistral.ai/v1")
+MISTRAL_HTTP_TIMEOUT = float(os.getenv("MISTRAL_HTTP_TIMEOUT", "120"))
+MISTRAL_HTTP_MAX_CONNECTIONS = int(os.getenv("MISTRAL_HTTP_MAX_CONNECTIONS", "20"))
+MISTRAL_HTTP_KEEPALIVE_SECONDS = float(os.getenv("MISTRAL_HTTP_KEEPALIVE_SECONDS", "120"))
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _get_or_create(name: str, create):
+    with _clients_lock:
+        if name not in _clients:
+            _clients[name] = create()
+        return _clients[name]
+
+
+def get_qdrant_client() -> QdrantClient:
+    """Return the process-wide Qdrant client, connecting over gRPC unless QDRANT_PREFER_GRPC is off."""
+    return _get_or_create("qdrant", lambda: QdrantClient(
+        url=os.getenv("QDRANT_URL"),
+        api_key=os.getenv("QDRANT_API_KEY"),
+        prefer_grpc=QDRANT_PREFER_GRPC,
+        grpc_port=QDRANT_GRPC_PORT,
+        timeout=QDRANT_TIMEOUT,
+        grpc_options={
+            "grpc.keepalive_time_ms": QDRANT_GRPC_KEEPALIVE_MS,
+            "grpc.keepalive_timeout_ms": 10000,
+            "grpc.keepalive_permit_without_calls": 1,
+            "grpc.http2.max_pings_without_data": 0,
+        },
+    ))
+
+
+def get_mistral_http_client() -> httpx.Client:
+    """Return the process-wide connection pool to the Mistral API, shared by the chat and embedding models."""
+    api_key = os.getenv("MISTRALAI_API_KEY")
+    if not api_key:
+        # Would otherwise only surface as a 401 on the first request
+        raise RuntimeError("MISTRALAI_API_KEY is not set")
+    return _get_or_create("mistral_http", lambda: httpx.Client(
+        base_url=MISTRAL_API_URL,
+        headers={
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+            "Authorization": f"Bearer {api_key}",
+        },
+        timeout=MISTRAL_HTTP_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=MISTRAL_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=MISTRAL_HTTP_MAX_CONNECTIONS,
+            keepalive_expiry=MISTRAL_HTTP_KEEPALIVE_SECONDS,
+        ),
+    ))
+
+
+def get_chat_model():
+    """Return the process-wide streaming chat model."""
+    def create():
+        from langchain_mistralai import ChatMistralAI
+        return ChatMistralAI(
+            model="mistral-large-latest",
+            temperature=0.2,
+            max_retries=2,
+            api_key=os.getenv("MISTRALAI_API_KEY"),
+            streaming=True,
+            client=get_mistral_http_client(),
+        )
+    return _get_or_create("chat_model", create)
+
+
+def warm_up_clients(mistral: bool = True) -> bool:
+    """
+    Open the Qdrant and, if mistral is set, the Mistral connections ahead of the
+    first request. Failures are logged. Returns whether every connection opened.
+    """
+    ready = True
+    try:
+        get_qdrant_client().get_collections()
+    except Exception as e:
+        logger.warning(f"Qdrant warm-up failed: {e}")
+        ready = False
+    if not mistral:
+        return ready
+    try:
+        get_mistral_http_client().get("/models").raise_for_status()
+    except Exception as e:
+        logger.warning(f"Mistral warm-up failed: {e}")
+        ready = False
+    return ready
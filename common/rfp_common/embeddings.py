@@ -0,0 +1,88 @@
+import os
+import threading
+from typing import List
+from langchain_core.embeddings import Embeddings
+
+# "mistral" calls the Mistral API, "local" runs a sentence-transformers model on this machine's CPU
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "mistral")
+# Defaults to mistral-embed, or LOCAL_EMBEDDING_DEFAULT_MODEL for the local backend
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL")
+LOCAL_EMBEDDING_DEFAULT_MODEL = "BAAI/bge-small-en-v1.5"
+# "torch" or "onnx" (needs sentence-transformers[onnx], 3.2 or newer)
+LOCAL_EMBEDDING_RUNTIME = os.getenv("LOCAL_EMBEDDING_RUNTIME", "torch")
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "32"))
+LOCAL_EMBEDDING_THREADS = int(os.getenv("LOCAL_EMBEDDING_THREADS", str(os.cpu_count() or 1)))
+# Instruction some retrieval models expect in front of queries, e.g. for bge "Represent this sentence for searching relevant passages: "
+LOCAL_EMBEDDING_QUERY_PREFIX = os.getenv("LOCAL_EMBEDDING_QUERY_PREFIX", "")
+
+MISTRAL_EMBED_VECTOR_SIZE = 1024
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+class LocalEmbeddings(Embeddings):
+    """sentence-transformers model run in batches on the CPU, using LOCAL_EMBEDDING_THREADS threads."""
+
+    def __init__(self, model: str, runtime: str = LOCAL_EMBEDDING_RUNTIME, batch_size: int = LOCAL_EMBEDDING_BATCH_SIZE, threads: int = LOCAL_EMBEDDING_THREADS, query_prefix: str = LOCAL_EMBEDDING_QUERY_PREFIX):
+        try:
+            import torch
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise RuntimeError("EMBEDDING_BACKEND=local requires the 'sentence-transformers' package: pip install -r requirements-local-embeddings.txt") from e
+        torch.set_num_threads(threads)
+        # Older releases have no backend argument, so torch, their only runtime, is left implicit
+        runtime_kwargs = {} if runtime == "torch" else {"backend": runtime}
+        self.model = SentenceTransformer(model, device="cpu", **runtime_kwargs)
+        self.batch_size = batch_size
+        self.query_prefix = query_prefix
+        # encode is not re-entrant across threads on the same model
+        self._lock = threading.Lock()
+
+    @property
+    def vector_size(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            vectors = self.model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True, convert_to_numpy=True)
+        return vectors.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([self.query_prefix + text])[0]
+
+
+class EmbeddingBackend:
+    """The configured embedding model: its langchain Embeddings, a name for caches and manifests, and its vector size."""
+
+    def __init__(self, name: str, embeddings: Embeddings, vector_size: int):
+        self.name = name
+        self.embeddings = embeddings
+        self.vector_size = vector_size
+
+
+def create_embedding_backend(backend: str = EMBEDDING_BACKEND, model: str = EMBEDDING_MODEL) -> EmbeddingBackend:
+    if backend == "mistral":
+        from langchain_mistralai import MistralAIEmbeddings
+        from rfp_common.clients import get_mistral_http_client
+        model = model or "mistral-embed"
+        embeddings = MistralAIEmbeddings(model=model, api_key=os.getenv("MISTRALAI_API_KEY"), client=get_mistral_http_client())
+        return EmbeddingBackend(model, embeddings, MISTRAL_EMBED_VECTOR_SIZE)
+    if backend == "local":
+        model = model or LOCAL_EMBEDDING_DEFAULT_MODEL
+        embeddings = LocalEmbeddings(model)
+        # Prefixed so cached vectors never mix with those of a hosted model of the same name
+        return EmbeddingBackend(f"local:{model}", embeddings, embeddings.vector_size)
+    raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}'")
+
+
+def get_embedding_backend() -> EmbeddingBackend:
+    """Return the process-wide embedding backend, loading it on first use."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_embedding_backend()
+        return _backend
@@ -1,40 +1,142 @@
 import os
 import uuid
+import logging
+import threading
 from pathlib import Path
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from asyncio import create_task, Lock, Queue, to_thread, sleep
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import RedirectResponse, JSONResponse
+from fastapi.responses import RedirectResponse, JSONResponse, FileResponse
 from google.auth.exceptions import GoogleAuthError
 from google_drive_downloader import GoogleDriveDownloader
-from google_auth_oauthlib.flow import Flow 
+from drive_client import get_drive_client_factory
+from profiling import PROFILE_ALL_SYNCS, load_profile, profile_directory, profiling
 
 env_path = Path('.env')
 if env_path.exists():
     load_dotenv(dotenv_path=env_path)
 
-from qdrant import initialiseVectorDatabase
-from file_embedding import process_and_add_embeddings
+logger = logging.getLogger(__name__)
 
-app = FastAPI()
 STREAMLIT_UI_URL = os.getenv("STREAMLIT_UI_URL", "http://localhost:8501")
+READINESS_MAX_BACKOFF = float(os.getenv("READINESS_MAX_BACKOFF", "30"))
+# "inline" ingests inside this process, "queue" hands per-file tasks to `python -m worker`
+INGESTION_MODE = os.getenv("INGESTION_MODE", "inline")
 status_lock = Lock()
+# Held while files are ingested so full and incremental syncs do not ingest the same file twice
+ingestion_lock = Lock()
 download_statuses = {}
+drive_sync = None
 
-flow = Flow.from_client_secrets_file(
-    GoogleDriveDownloader.CREDENTIALS_FILE,
-    scopes=GoogleDriveDownloader.SCOPES,
-    redirect_uri=f"{os.getenv('APP_URL', 'http://127.0.0.1:8000')}/callback",
-)
+_flow = None
+_flow_lock = threading.Lock()
 
+readiness = {"vector_db": False, "error": None}
+
+
+def get_flow():
+    """Build the OAuth flow on first use and share it across requests."""
+    global _flow
+    with _flow_lock:
+        if _flow is None:
+            from google_auth_oauthlib.flow import Flow
+            _flow = Flow.from_client_secrets_file(
+                GoogleDriveDownloader.CREDENTIALS_FILE,
+                scopes=GoogleDriveDownloader.SCOPES,
+                redirect_uri=f"{os.getenv('APP_URL', 'http://127.0.0.1:8000')}/callback",
+            )
+        return _flow
+
+
+async def wait_for_vector_database():
+    """Create the collection in the background, retrying until Qdrant is reachable."""
+    from qdrant import initialiseVectorDatabase
+    from rfp_common.clients import warm_up_clients
+    from rfp_common.embeddings import EMBEDDING_BACKEND
+
+    attempt = 0
+    while True:
+        try:
+            await to_thread(initialiseVectorDatabase)
+            await to_thread(warm_up_clients, EMBEDDING_BACKEND == "mistral")
+            readiness["vector_db"] = True
+            readiness["error"] = None
+            logger.info("Vector database is ready")
+            return
+        except Exception as e:
+            readiness["error"] = str(e)
+            delay = min(2 ** attempt, READINESS_MAX_BACKOFF)
+            logger.warning(f"Vector database not ready ({e}), retrying in {delay}s")
+            attempt += 1
+            await sleep(delay)
+
+
+def apply_drive_changes(upserts: list[dict], removals: list[dict], processing_id: str) -> list[dict]:
+    """
+    Remove the files that left Drive, then ingest new and changed ones inline or
+    through the workers. A changed file's old points are only removed once its new
+    version is in. Returns the files that failed inline, for the next sync to retry.
+    """
+    from drive_sync import remove_indexed_files
+    from ingest_scheduler import ingest_in_priority_order, prioritize
+
+    remove_indexed_files(removals)
+    if not upserts:
+        return []
+    if INGESTION_MODE == "queue":
+        from task_queue import get_task_queue
+        files = prioritize(upserts)
+        get_task_queue().enqueue(processing_id, [task_payload(file, overwrite=True) for file in files], [file["priority"] for file in files])
+        return []  # the workers retry failed tasks themselves
+    from file_embedding import process_file
+    return ingest_in_priority_order(GoogleDriveDownloader(), upserts, processing_id, lambda *args: None, process_file, overwrite=True)
+
+
+async def run_drive_sync(readiness_task):
+    """Keep the index in step with Drive once the vector database is ready."""
+    from drive_sync import DriveChangeSource, DriveSync
+
+    global drive_sync
+    await readiness_task
+    drive_sync = DriveSync(DriveChangeSource(), apply_drive_changes, lock=ingestion_lock)
+    await drive_sync.run()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from drive_sync import DRIVE_SYNC_ENABLED
+
+    readiness_task = create_task(wait_for_vector_database())
+    drive_sync_task = create_task(run_drive_sync(readiness_task)) if DRIVE_SYNC_ENABLED else None
+    yield
+    readiness_task.cancel()
+    if drive_sync_task:
+        drive_sync_task.cancel()
+
+
+app = FastAPI(lifespan=lifespan)
 processing_progress_queue = Queue()
-initialiseVectorDatabase()
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    if not readiness["vector_db"]:
+        return JSONResponse(status_code=503, content={"status": "starting", "checks": readiness})
+    return {"status": "ready", "checks": readiness}
 
 @app.get("/auth")
-async def authenticate():
+async def authenticate(profile: bool = False):
     try:
-        auth_url, _ = flow.authorization_url(access_type="offline", include_granted_scopes="true")
-        return RedirectResponse(url=auth_url)
+        auth_url, _ = get_flow().authorization_url(access_type="offline", include_granted_scopes="true")
+        response = RedirectResponse(url=auth_url)
+        if profile:
+            # Remembered across the Google consent redirect so /callback profiles this sync
+            response.set_cookie("profile_sync", "1", max_age=600, httponly=True)
+        return response
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
@@ -46,16 +148,24 @@ async def callback(request: Request):
             if not code:
                 raise HTTPException(status_code=400, detail="Missing authorization code")
             
+            flow = get_flow()
             flow.fetch_token(code=code)
             with open(GoogleDriveDownloader.TOKEN_FILE, "w") as token_file:
                 token_file.write(flow.credentials.to_json())
+            get_drive_client_factory().reset_credentials()
 
         processing_id = str(uuid.uuid4())
         downloader = GoogleDriveDownloader()
         downloader.initialize_service()
+        profile = PROFILE_ALL_SYNCS or request.cookies.get("profile_sync") == "1"
 
-        create_task(download_files_task(processing_id, downloader))
-        return RedirectResponse(url=f"{STREAMLIT_UI_URL}?processing_id={processing_id}")
+        if INGESTION_MODE == "queue":
+            create_task(enqueue_files_task(processing_id, downloader, profile))
+        else:
+            create_task(download_files_task(processing_id, downloader, profile))
+        response = RedirectResponse(url=f"{STREAMLIT_UI_URL}?processing_id={processing_id}")
+        response.delete_cookie("profile_sync")
+        return response
     except GoogleAuthError as e:
         return JSONResponse(status_code=401, content={"error": str(e)})
 
@@ -69,7 +179,48 @@ async def download_status(processing_id: str):
         # If no update is available yet, yield control to the event loop
         await sleep(0.5)
 
-def download_progress_callback(processing_id: str, processed: int, total: int, current_process: str):
+@app.post("/drive/notifications")
+async def drive_notification(request: Request):
+    """Receiver for Drive changes.watch push notifications."""
+    if drive_sync is None:
+        raise HTTPException(status_code=503, detail="Drive sync is not running")
+    accepted = drive_sync.notify(
+        request.headers.get("X-Goog-Channel-ID"),
+        request.headers.get("X-Goog-Resource-State"),
+        request.headers.get("X-Goog-Channel-Token", ""),
+    )
+    if not accepted:
+        raise HTTPException(status_code=403, detail="Unknown channel")
+    return {"status": "ok"}
+
+@app.get("/drive/sync")
+async def drive_sync_status():
+    if drive_sync is None:
+        return {"running": False}
+    return {"running": True, **drive_sync.status}
+
+@app.get("/profiles/{processing_id}")
+async def get_profile(processing_id: str):
+    stages = await to_thread(load_profile, processing_id)
+    if stages is None:
+        raise HTTPException(status_code=404, detail=f"No profile for '{processing_id}'")
+    return {"processing_id": processing_id, "stages": stages}
+
+@app.get("/profiles/{processing_id}/{artifact}")
+async def get_profile_artifact(processing_id: str, artifact: str):
+    """Download a cProfile dump, e.g. to open it with snakeviz."""
+    path = os.path.join(profile_directory(processing_id), os.path.basename(artifact))
+    if not artifact.endswith(".prof") or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail=f"No artifact '{artifact}'")
+    return FileResponse(path, media_type="application/octet-stream", filename=artifact)
+
+@app.get("/sync/plan")
+async def sync_plan(workers: int = 1):
+    """Dry run of a sync: the files it would change and its projected size, cost and duration."""
+    from sync_plan import build_sync_plan
+    return await to_thread(build_sync_plan, GoogleDriveDownloader(), None, workers)
+
+def download_progress_callback(processing_id: str, processed: int, total: int, current_process: str, queryable: list[str] = None):
     status = {
         "processing_id": processing_id,
         "status": "in_progress",
@@ -77,11 +228,31 @@ def download_progress_callback(processing_id: str, processed: int, total: int, c
         "processed": processed,
         "total": total
     }
+    if queryable is not None:
+        status["queryable"] = list(queryable)
     # Push the status update to the queue
     processing_progress_queue.put_nowait(status)
 
 
-async def download_files_task(processing_id: str, downloader: GoogleDriveDownloader):
+def plan_full_sync(downloader: GoogleDriveDownloader) -> list[dict]:
+    """
+    Compare Drive with the ingest manifest, remove the files that left Drive, and
+    return the files to ingest. Replaced versions are removed as their new ones go in.
+    """
+    from drive_sync import remove_indexed_files
+    from ingest_manifest import get_ingest_manifest
+    from sync_plan import entries_to_remove, files_to_ingest, plan_sync
+
+    plan = plan_sync(downloader.list_all_files(), get_ingest_manifest().all())
+    logger.info(f"Sync plan: {', '.join(f'{action} {len(files)}' for action, files in plan.items())}")
+    remove_indexed_files(entries_to_remove(plan))
+    return files_to_ingest(plan)
+
+
+async def download_files_task(processing_id: str, downloader: GoogleDriveDownloader, profile: bool = False):
+    from file_embedding import process_file
+    from ingest_scheduler import ingest_in_priority_order
+
     try:
         # Initialize with in-progress status
         status = {
@@ -93,11 +264,14 @@ async def download_files_task(processing_id: str, downloader: GoogleDriveDownloa
         }
         await processing_progress_queue.put(status)
 
-        # Start downloading (make the downloader function asynchronous)
-        await to_thread(downloader.download_all, processing_id, download_progress_callback)
-        await to_thread(process_and_add_embeddings, processing_id, download_progress_callback)
+        # Download and ingest file by file, most relevant first, so the chatbot is useful sooner
+        with profiling(processing_id, profile):
+            async with ingestion_lock:
+                files = await to_thread(plan_full_sync, downloader)
+                # Changed files must not reuse their local copy of the previous version
+                await to_thread(ingest_in_priority_order, downloader, files, processing_id, download_progress_callback, process_file, overwrite=True)
 
-        total = downloader.get_total_files()
+        total = len(files)
         # When download is complete, update status to completed
         status = {
             "processing_id": processing_id,
@@ -116,3 +290,63 @@ async def download_files_task(processing_id: str, downloader: GoogleDriveDownloa
         await processing_progress_queue.put(status)
 
 
+
+
+def task_payload(file: dict, profile: bool = False, overwrite: bool = False) -> dict:
+    """The task queue payload for ingesting a Drive file in a worker."""
+    return {
+        "id": file["id"],
+        "name": file["name"],
+        "folder": file["folder"],
+        "modifiedTime": file.get("modifiedTime"),
+        "size": file.get("size", 0),
+        "profile": profile,
+        "overwrite": overwrite,
+    }
+
+
+async def enqueue_files_task(processing_id: str, downloader: GoogleDriveDownloader, profile: bool = False):
+    """Hand every file to the ingestion workers and report their progress until all are finished."""
+    from task_queue import get_task_queue
+    from ingest_scheduler import prioritize
+
+    try:
+        status = {
+            "processing_id": processing_id,
+            "status": "in_progress",
+            "current_process": "Queueing Documents",
+            "processed": 0,
+            "total": 1
+        }
+        await processing_progress_queue.put(status)
+
+        queue = get_task_queue()
+        async with ingestion_lock:
+            files = prioritize(await to_thread(plan_full_sync, downloader))
+        payloads = [task_payload(file, profile, overwrite=True) for file in files]
+        await to_thread(queue.enqueue, processing_id, payloads, [file["priority"] for file in files])
+
+        while True:
+            progress = await to_thread(queue.progress, processing_id)
+            finished = progress["done"] + progress["failed"]
+            if finished >= progress["total"]:
+                break
+            queryable = await to_thread(queue.done_payloads, processing_id)
+            download_progress_callback(processing_id, finished, progress["total"], "Ingesting Documents", [p["name"] for p in queryable])
+            await sleep(1)
+
+        status = {
+            "processing_id": processing_id,
+            "status": "completed",
+            "current_process": "",
+            "processed": progress["done"],
+            "total": progress["total"],
+            "failed": progress["failed"]
+        }
+        await processing_progress_queue.put(status)
+    except Exception as e:
+        status = {
+            "processing_id": processing_id,
+            "status": f"failed: {str(e)}"
+        }
+        await processing_progress_queue.put(status)
@@ -0,0 +1,203 @@
+import os
+import re
+import fcntl
+import sqlite3
+import threading
+import zlib
+from contextlib import contextmanager
+from hashlib import blake2b
+import numpy as np
+
+# Collapse chunks of the same rfp_status into one point when their estimated word
+# 5-gram Jaccard similarity is at least CHUNK_DEDUP_THRESHOLD
+CHUNK_DEDUP_ENABLED = os.getenv("CHUNK_DEDUP_ENABLED", "true").lower() == "true"
+CHUNK_DEDUP_THRESHOLD = float(os.getenv("CHUNK_DEDUP_THRESHOLD", "0.85"))
+CHUNK_DEDUP_SHINGLE_SIZE = int(os.getenv("CHUNK_DEDUP_SHINGLE_SIZE", "5"))
+# A local file: workers on other machines keep their own index, and only collapse
+# chunks into the points they ingested themselves
+DEDUP_INDEX_PATH = os.getenv("DEDUP_INDEX_PATH", "dedup_index.sqlite3")
+
+# 16 bands of 8 rows: pairs above ~0.7 similarity almost always share a band
+NUM_BANDS = 16
+ROWS_PER_BAND = 8
+NUM_PERM = NUM_BANDS * ROWS_PER_BAND
+_MERSENNE_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(0x5EED)
+# Fixed seed: signatures are persisted and must stay comparable across runs
+_PERM_A = _rng.integers(1, _MERSENNE_PRIME, NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, _MERSENNE_PRIME, NUM_PERM, dtype=np.uint64)
+
+_deduplicator = None
+_deduplicator_lock = threading.Lock()
+
+
+def minhash_signature(text: str, shingle_size: int = CHUNK_DEDUP_SHINGLE_SIZE) -> np.ndarray:
+    """MinHash signature (NUM_PERM uint32 values) of the word shingles of a text, ignoring case and punctuation."""
+    words = re.findall(r"\w+", text.lower())
+    shingles = {" ".join(words[i:i + shingle_size]) for i in range(max(len(words) - shingle_size + 1, 1))}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) & _MERSENNE_PRIME for s in shingles), dtype=np.uint64, count=len(shingles))
+    permuted = (hashes[:, None] * _PERM_A + _PERM_B) % _MERSENNE_PRIME
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def band_hashes(signature: np.ndarray) -> list[int]:
+    """One signed 64-bit hash per LSH band, to fit an SQLite integer."""
+    return [
+        int.from_bytes(blake2b(band.tobytes(), digest_size=8).digest(), "big", signed=True)
+        for band in signature.reshape(NUM_BANDS, ROWS_PER_BAND)
+    ]
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of the texts behind two signatures."""
+    return float(np.mean(a == b))
+
+
+class DedupIndex:
+    """
+    LSH index of the MinHash signatures of stored points, per collection and scope
+    (rfp_status), so that new chunks can be compared with everything ingested before.
+    Collections are the ones behind aliases: a re-index builds a new collection
+    whose points may have the same IDs as those of the live one.
+    """
+
+    def __init__(self, path: str = DEDUP_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            keyed_by_point = [column[1] for column in conn.execute("PRAGMA table_info(signatures)") if column[5]] == ["point_id"]
+            if keyed_by_point:
+                conn.execute("ALTER TABLE signatures RENAME TO signatures_by_point")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS signatures (point_id TEXT NOT NULL, collection TEXT NOT NULL, signature BLOB NOT NULL, "
+                "PRIMARY KEY (collection, point_id))"
+            )
+            if keyed_by_point:
+                conn.execute("INSERT INTO signatures SELECT point_id, collection, signature FROM signatures_by_point")
+                conn.execute("DROP TABLE signatures_by_point")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS bands (collection TEXT NOT NULL, scope TEXT NOT NULL, band INTEGER NOT NULL, "
+                "hash INTEGER NOT NULL, point_id TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS bands_lookup ON bands (collection, scope, band, hash)")
+            conn.execute("CREATE INDEX IF NOT EXISTS bands_point ON bands (point_id)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def candidates(self, collection: str, scope: str, hashes: list[int]) -> dict[str, np.ndarray]:
+        """Return {point_id: signature} of the stored points sharing at least one band."""
+        clauses = " OR ".join("(band = ? AND hash = ?)" for _ in hashes)
+        params = [value for band, hash_value in enumerate(hashes) for value in (band, hash_value)]
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT s.point_id, s.signature FROM signatures s WHERE s.collection = ? AND s.point_id IN ("
+                f"SELECT point_id FROM bands WHERE collection = ? AND scope = ? AND ({clauses}))",
+                [collection, collection, scope, *params],
+            ).fetchall()
+        return {point_id: np.frombuffer(signature, dtype=np.uint32) for point_id, signature in rows}
+
+    def add_many(self, collection: str, entries: list[tuple[str, str, np.ndarray]]):
+        """Index (point_id, scope, signature) entries."""
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO signatures (point_id, collection, signature) VALUES (?, ?, ?)",
+                [(point_id, collection, signature.tobytes()) for point_id, _, signature in entries],
+            )
+            conn.executemany(
+                "INSERT INTO bands (collection, scope, band, hash, point_id) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (collection, scope, band, hash_value, point_id)
+                    for point_id, scope, signature in entries
+                    for band, hash_value in enumerate(band_hashes(signature))
+                ],
+            )
+
+    def delete_many(self, collection: str, point_ids: list[str]):
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM signatures WHERE collection = ? AND point_id = ?", [(collection, str(i)) for i in point_ids])
+            conn.executemany("DELETE FROM bands WHERE collection = ? AND point_id = ?", [(collection, str(i)) for i in point_ids])
+
+    def drop_collection(self, collection: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM signatures WHERE collection = ?", (collection,))
+            conn.execute("DELETE FROM bands WHERE collection = ?", (collection,))
+
+    @contextmanager
+    def lock(self):
+        """
+        Hold the index's reference lock, which serialises looking up and recording
+        signatures, and read-modify-writes of point references, across the threads
+        and processes sharing the index. It is a lock on a file next to the index,
+        not an SQLite transaction, so the index can be written while it is held.
+        """
+        with self._lock, open(f"{self.path}.lock", "a") as lock_file:
+            # Released when the file is closed
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+
+class ChunkDeduplicator:
+    """Finds the chunks of a batch that nearly duplicate a stored point or an earlier chunk of the batch."""
+
+    def __init__(self, index: DedupIndex = None, threshold: float = CHUNK_DEDUP_THRESHOLD):
+        self.index = index or DedupIndex()
+        self.threshold = threshold
+
+    def find_duplicates(self, collection: str, chunks: list[tuple[str, str, str]]) -> tuple[dict[str, str], list[tuple[str, str, np.ndarray]]]:
+        """
+        Take (point_id, scope, text) chunks. Returns {duplicate point_id: point_id it
+        collapses into}, mapping a chunk that is already stored to itself, and the
+        (point_id, scope, signature) entries of the chunks that become points, to pass
+        to record() once they are stored.
+        """
+        duplicates = {}
+        new_entries = []
+        batch_buckets: dict[tuple[str, int, int], list[tuple[str, np.ndarray]]] = {}
+        for point_id, scope, text in chunks:
+            signature = minhash_signature(text)
+            hashes = band_hashes(signature)
+            candidates = self.index.candidates(collection, scope, hashes)
+            if point_id in candidates:
+                # Stored by an earlier attempt at the same file version
+                duplicates[point_id] = point_id
+                continue
+            for band, hash_value in enumerate(hashes):
+                candidates.update(batch_buckets.get((scope, band, hash_value), []))
+            best_id, best_similarity = None, 0.0
+            for candidate_id, candidate_signature in candidates.items():
+                candidate_similarity = similarity(signature, candidate_signature)
+                if candidate_similarity > best_similarity:
+                    best_id, best_similarity = candidate_id, candidate_similarity
+            if best_similarity >= self.threshold:
+                duplicates[point_id] = best_id
+                continue
+            new_entries.append((point_id, scope, signature))
+            for band, hash_value in enumerate(hashes):
+                batch_buckets.setdefault((scope, band, hash_value), []).append((point_id, signature))
+        return duplicates, new_entries
+
+    def record(self, collection: str, entries: list[tuple[str, str, np.ndarray]]):
+        self.index.add_many(collection, entries)
+
+    def forget(self, collection: str, point_ids: list[str]):
+        self.index.delete_many(collection, point_ids)
+
+
+def get_chunk_deduplicator() -> ChunkDeduplicator:
+    """Return the process-wide deduplicator, creating it on first use."""
+    global _deduplicator
+    with _deduplicator_lock:
+        if _deduplicator is None:
+            _deduplicator = ChunkDeduplicator()
+        return _deduplicator
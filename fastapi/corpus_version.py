@@ -0,0 +1,33 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+
+# Shared with the chat UI, which scopes its answer cache by these versions
+CORPUS_STATE_PATH = os.getenv("CORPUS_STATE_PATH", "../data/corpus_state.sqlite3")
+
+
+@contextmanager
+def _connect(path: str = CORPUS_STATE_PATH):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS corpus_versions (scope TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+            yield conn
+    finally:
+        conn.close()
+
+
+def bump_corpus_version(rfp_statuses: set[str]):
+    """
+    Record that the documents of the given rfp_status values changed. The "all"
+    scope changes with every status, since unfiltered chats search everything.
+    """
+    with _connect() as conn:
+        conn.executemany(
+            "INSERT INTO corpus_versions (scope, version) VALUES (?, 1) "
+            "ON CONFLICT(scope) DO UPDATE SET version = version + 1",
+            [(scope,) for scope in set(rfp_statuses) | {"all"}],
+        )
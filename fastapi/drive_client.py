@@ -0,0 +1,103 @@
+import os
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+import httplib2
+import google_auth_httplib2
+from google.oauth2.credentials import Credentials
+from google.auth.transport.requests import Request as GoogleRequest
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import DISCOVERY_URI, build_from_document
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+TOKEN_FILE = "token.json"
+DRIVE_HTTP_TIMEOUT = int(os.getenv("DRIVE_HTTP_TIMEOUT", "60"))
+
+_factory = None
+_factory_lock = threading.Lock()
+
+
+class DriveClientFactory:
+    """
+    Hands out Drive services that are cheap to get and safe to use from many threads.
+
+    The discovery document and the credentials are loaded once and kept in memory.
+    Tokens are refreshed under a lock shortly before they expire, and every thread
+    gets its own service over its own keep-alive httplib2 connection pool, since
+    httplib2 is not thread-safe.
+    """
+    REFRESH_MARGIN = timedelta(minutes=5)
+
+    def __init__(self, token_file: str = TOKEN_FILE, timeout: int = DRIVE_HTTP_TIMEOUT):
+        self.token_file = token_file
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._credentials = None
+        self._discovery_document = None
+        # Bumped whenever the credentials are replaced so threads rebuild their service
+        self._generation = 0
+
+    def get_discovery_document(self) -> dict:
+        """Return the parsed Drive v3 discovery document, loading it on first use."""
+        with self._lock:
+            if self._discovery_document is None:
+                content = discovery_cache.get_static_doc("drive", "v3")
+                if content is None:
+                    url = DISCOVERY_URI.format(api="drive", apiVersion="v3")
+                    _, content = httplib2.Http(timeout=self.timeout).request(url)
+                self._discovery_document = json.loads(content)
+            return self._discovery_document
+
+    def _needs_refresh(self, creds: Credentials) -> bool:
+        if not creds.token:
+            return True
+        if creds.expiry is None:
+            return False
+        return creds.expiry - self.REFRESH_MARGIN <= datetime.utcnow()
+
+    def get_credentials(self) -> Credentials:
+        """Load or refresh credentials, refreshing ahead of expiry."""
+        with self._lock:
+            creds = self._credentials
+            if creds is None:
+                if not os.path.exists(self.token_file):
+                    raise HTTPException(status_code=401, detail="Authentication required")
+                creds = Credentials.from_authorized_user_file(self.token_file)
+                self._credentials = creds
+            if self._needs_refresh(creds):
+                if not creds.refresh_token:
+                    raise HTTPException(status_code=401, detail="Authentication required")
+                logger.info("Refreshing Google Drive access token")
+                creds.refresh(GoogleRequest())
+                with open(self.token_file, "w") as token_file:
+                    token_file.write(creds.to_json())
+            return creds
+
+    def reset_credentials(self):
+        """Drop the cached credentials, e.g. after a new token has been written."""
+        with self._lock:
+            self._credentials = None
+            self._generation += 1
+
+    def get_service(self):
+        """Return the Drive service for the calling thread."""
+        creds = self.get_credentials()
+        local = self._local
+        if getattr(local, "generation", None) != self._generation:
+            http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http(timeout=self.timeout))
+            local.service = build_from_document(self.get_discovery_document(), http=http)
+            local.generation = self._generation
+        return local.service
+
+
+def get_drive_client_factory() -> DriveClientFactory:
+    """Return the process-wide DriveClientFactory, creating it on first use."""
+    global _factory
+    with _factory_lock:
+        if _factory is None:
+            _factory = DriveClientFactory()
+        return _factory
@@ -0,0 +1,427 @@
+"""
+Near-real-time sync from Google Drive.
+
+Drive push notifications (changes.watch) for the whole changes feed arrive at
+POST /drive/notifications. They carry no detail, so each one only wakes up the
+sync loop, which waits for the burst to settle (DRIVE_SYNC_DEBOUNCE_SECONDS of
+quiet, at most DRIVE_SYNC_MAX_DELAY_SECONDS), reads the changes feed from the
+saved page token, collapses it to the latest change per file and ingests only the
+files that were added, changed, moved or removed. Files that fail to ingest are
+retried on the following rounds. A fallback poll every
+DRIVE_SYNC_POLL_INTERVAL seconds covers lost notifications and deployments
+without a public DRIVE_WEBHOOK_URL.
+
+Simulate a notification stream locally, without Drive or Qdrant, with:
+
+    python -m drive_sync simulate --files 20 --events 300
+"""
+import os
+import json
+import shutil
+import time
+import uuid
+import asyncio
+import logging
+import argparse
+import tempfile
+from typing import Callable, Optional
+from ingest_manifest import IngestManifest, SQLiteIngestManifest, get_ingest_manifest
+
+logger = logging.getLogger(__name__)
+
+DRIVE_SYNC_ENABLED = os.getenv("DRIVE_SYNC_ENABLED", "true").lower() == "true"
+# Public HTTPS address of /drive/notifications; without it only the poller runs
+DRIVE_WEBHOOK_URL = os.getenv("DRIVE_WEBHOOK_URL")
+# Sent back by Drive with every notification so forged ones can be rejected
+DRIVE_WEBHOOK_TOKEN = os.getenv("DRIVE_WEBHOOK_TOKEN", "")
+DRIVE_SYNC_DEBOUNCE_SECONDS = float(os.getenv("DRIVE_SYNC_DEBOUNCE_SECONDS", "10"))
+DRIVE_SYNC_MAX_DELAY_SECONDS = float(os.getenv("DRIVE_SYNC_MAX_DELAY_SECONDS", "60"))
+DRIVE_SYNC_POLL_INTERVAL = float(os.getenv("DRIVE_SYNC_POLL_INTERVAL", "300"))
+DRIVE_WATCH_TTL_SECONDS = int(os.getenv("DRIVE_WATCH_TTL_SECONDS", str(24 * 3600)))
+DRIVE_SYNC_STATE_FILE = os.getenv("DRIVE_SYNC_STATE_FILE", "drive_sync_state.json")
+# Rounds a file that fails to ingest is tried in before it is left to the next full sync
+DRIVE_SYNC_MAX_ATTEMPTS = int(os.getenv("DRIVE_SYNC_MAX_ATTEMPTS", "3"))
+
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+CHANGE_FIELDS = "nextPageToken,newStartPageToken,changes(fileId,removed,changeType,file(id,name,mimeType,parents,trashed,modifiedTime,size))"
+
+
+class DriveChangeSource:
+    """The Drive changes feed and its push-notification channels."""
+
+    def __init__(self):
+        from google_drive_downloader import GoogleDriveDownloader
+        self.downloader = GoogleDriveDownloader()
+
+    @property
+    def service(self):
+        return self.downloader.service
+
+    def tracked_folders(self) -> dict[str, str]:
+        """Return {folder_id: folder_name} of the folders that are ingested, re-read each time to see new subfolders."""
+        return self.downloader.list_tracked_folders()
+
+    def start_page_token(self) -> str:
+        return self.service.changes().getStartPageToken().execute()["startPageToken"]
+
+    def list_changes(self, page_token: str) -> tuple[list[dict], str]:
+        """Return the changes since page_token, oldest first, and the token to continue from."""
+        changes = []
+        while True:
+            response = self.service.changes().list(pageToken=page_token, fields=CHANGE_FIELDS, pageSize=1000).execute()
+            changes.extend(response.get("changes", []))
+            if "newStartPageToken" in response:
+                return changes, response["newStartPageToken"]
+            page_token = response["nextPageToken"]
+
+    def watch(self, page_token: str, address: str, token: str, ttl_seconds: int) -> dict:
+        """Open a notification channel for the changes feed. Returns {"id", "resourceId", "expiration"}."""
+        channel = self.service.changes().watch(pageToken=page_token, body={
+            "id": str(uuid.uuid4()),
+            "type": "web_hook",
+            "address": address,
+            "token": token,
+            "expiration": int((time.time() + ttl_seconds) * 1000),
+        }).execute()
+        return {"id": channel["id"], "resourceId": channel["resourceId"], "expiration": int(channel["expiration"])}
+
+    def stop(self, channel: dict):
+        self.service.channels().stop(body={"id": channel["id"], "resourceId": channel["resourceId"]}).execute()
+
+
+class SimulatedChangeSource:
+    """In-memory stand-in for DriveChangeSource. emit() appends to its changes feed."""
+
+    def __init__(self, folders: tuple[str, ...] = ("new", "submitted")):
+        self._folders = {f"folder-{name}": name for name in folders}
+        self._changes = []
+
+    def tracked_folders(self) -> dict[str, str]:
+        return dict(self._folders)
+
+    def emit(self, file_id: str, name: str, folder: Optional[str], modified_time: str = None, size: int = 0):
+        """Record a change to a file; a folder of None removes it."""
+        if folder is None:
+            self._changes.append({"changeType": "file", "fileId": file_id, "removed": True})
+            return
+        self._changes.append({"changeType": "file", "fileId": file_id, "removed": False, "file": {
+            "id": file_id,
+            "name": name,
+            "mimeType": "application/pdf",
+            "parents": [f"folder-{folder}"],
+            "trashed": False,
+            "modifiedTime": modified_time or time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime()),
+            "size": str(size),
+        }})
+
+    def start_page_token(self) -> str:
+        return str(len(self._changes))
+
+    def list_changes(self, page_token: str) -> tuple[list[dict], str]:
+        return self._changes[int(page_token):], str(len(self._changes))
+
+    def watch(self, page_token: str, address: str, token: str, ttl_seconds: int) -> dict:
+        return {"id": str(uuid.uuid4()), "resourceId": "simulated", "expiration": int((time.time() + ttl_seconds) * 1000)}
+
+    def stop(self, channel: dict):
+        pass
+
+
+def resolve_changes(changes: list[dict], tracked_folders: dict[str, str], manifest: IngestManifest) -> tuple[list[dict], list[dict]]:
+    """
+    Collapse a run of changes to the latest one per file and compare it with the
+    manifest. Returns (files to ingest, manifest entries of the files to remove).
+    A changed or moved file is only in the first list: its old version is removed
+    once the new one is ingested.
+    """
+    latest = {}
+    for change in changes:
+        if change.get("changeType", "file") == "file":
+            latest[change["fileId"]] = change
+
+    upserts, removals = [], []
+    for file_id, change in latest.items():
+        file = change.get("file") or {}
+        folder = next((tracked_folders[parent] for parent in file.get("parents", []) if parent in tracked_folders), None)
+        previous = manifest.get(file_id)
+        if change.get("removed") or file.get("trashed") or folder is None or file.get("mimeType") == FOLDER_MIME_TYPE:
+            if previous:
+                removals.append(previous)
+            continue
+        if previous and (previous["name"], previous["folder"], previous["modified_time"]) == (file["name"], folder, file.get("modifiedTime")):
+            continue  # metadata-only change, e.g. sharing
+        upserts.append({
+            "id": file_id,
+            "name": file["name"],
+            "folder": folder,
+            "modifiedTime": file.get("modifiedTime"),
+            "size": file.get("size", 0),
+        })
+    return upserts, removals
+
+
+def remove_indexed_files(entries: list[dict]):
+    """Delete the points, manifest entries and local copies of files as they were ingested."""
+    from qdrant import get_vector_db
+    from google_drive_downloader import GoogleDriveDownloader
+
+    db = get_vector_db()
+    downloader = GoogleDriveDownloader()
+    manifest = get_ingest_manifest()
+    for entry in entries:
+        # Points ingested before they carried a file ID are matched by name and folder
+        deleted = db.delete_file_points(entry["file_id"], filename=downloader.sanitize_filename(entry["name"]), rfp_status=entry["folder"])
+        manifest.remove(entry["file_id"])
+        shutil.rmtree(downloader.local_dir(entry["file_id"]), ignore_errors=True)
+        legacy_path = downloader.legacy_local_path(entry["name"], entry["folder"])
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+        logger.info(f"Removed {deleted} points of '{entry['folder']}/{entry['name']}'")
+
+
+class DriveSync:
+    """
+    Turns change notifications into debounced incremental syncs.
+
+    apply_changes(upserts, removals, processing_id) does the actual work; see
+    resolve_changes for what it receives. It returns the files it could not ingest,
+    which are retried on the next rounds, up to max_attempts in all, unless a newer
+    change to them comes in. The page token is only advanced once apply_changes
+    returns, so a batch that raises is picked up again on the next round.
+    """
+
+    def __init__(
+        self,
+        source,
+        apply_changes: Callable[[list[dict], list[dict], str], list[dict]],
+        manifest: IngestManifest = None,
+        state_file: str = DRIVE_SYNC_STATE_FILE,
+        debounce_seconds: float = DRIVE_SYNC_DEBOUNCE_SECONDS,
+        max_delay_seconds: float = DRIVE_SYNC_MAX_DELAY_SECONDS,
+        poll_interval: float = DRIVE_SYNC_POLL_INTERVAL,
+        webhook_url: Optional[str] = DRIVE_WEBHOOK_URL,
+        webhook_token: str = DRIVE_WEBHOOK_TOKEN,
+        watch_ttl_seconds: int = DRIVE_WATCH_TTL_SECONDS,
+        lock: asyncio.Lock = None,
+        requires_token_file: bool = True,
+        max_attempts: int = DRIVE_SYNC_MAX_ATTEMPTS,
+    ):
+        self.source = source
+        self.apply_changes = apply_changes
+        self.manifest = manifest or get_ingest_manifest()
+        self.state_file = state_file
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.poll_interval = poll_interval
+        self.webhook_url = webhook_url
+        self.webhook_token = webhook_token
+        self.watch_ttl_seconds = watch_ttl_seconds
+        # Held while a batch is applied, e.g. shared with manual full syncs
+        self.lock = lock or asyncio.Lock()
+        self.requires_token_file = requires_token_file
+        self.max_attempts = max_attempts
+        self._notified = asyncio.Event()
+        self.status = {"notifications": 0, "syncs": 0, "last_sync_at": None, "last_batch": None, "error": None}
+
+    def load_state(self) -> dict:
+        if not os.path.exists(self.state_file):
+            return {}
+        with open(self.state_file) as state_file:
+            return json.load(state_file)
+
+    def save_state(self, state: dict):
+        tmp_path = f"{self.state_file}.tmp"
+        with open(tmp_path, "w") as state_file:
+            json.dump(state, state_file)
+        os.replace(tmp_path, self.state_file)
+
+    def notify(self, channel_id: str, resource_state: str, token: str) -> bool:
+        """Handle a notification's X-Goog-* headers. Returns False if it is not from our channel."""
+        channel = self.load_state().get("channel")
+        if channel is None or channel_id != channel["id"] or token != self.webhook_token:
+            return False
+        if resource_state != "sync":  # "sync" only confirms a new channel
+            self.status["notifications"] += 1
+            self._notified.set()
+        return True
+
+    def ensure_watch(self):
+        """Open a notification channel, or replace the current one before it expires."""
+        if not self.webhook_url:
+            return
+        state = self.load_state()
+        channel = state.get("channel")
+        renew_at_ms = (time.time() + 2 * self.poll_interval) * 1000
+        if channel and channel["expiration"] > renew_at_ms:
+            return
+        page_token = state.get("page_token") or self.source.start_page_token()
+        state["channel"] = self.source.watch(page_token, self.webhook_url, self.webhook_token, self.watch_ttl_seconds)
+        self.save_state(state)
+        logger.info(f"Watching Drive changes on channel {state['channel']['id']}")
+        if channel:
+            try:
+                self.source.stop(channel)
+            except Exception as e:
+                logger.warning(f"Could not stop channel {channel['id']}: {e}")
+
+    def sync_once(self) -> dict:
+        """
+        Apply the changes since the saved page token, and retry the files that failed
+        before. Returns {"upserts", "deletes", "failed"} counts.
+        """
+        state = self.load_state()
+        if "page_token" not in state:
+            # Changes before this point are covered by the last full sync
+            state["page_token"] = self.source.start_page_token()
+            self.save_state(state)
+            return {"upserts": 0, "deletes": 0, "failed": 0}
+
+        changes, next_page_token = self.source.list_changes(state["page_token"])
+        upserts, removals = resolve_changes(changes, self.source.tracked_folders(), self.manifest)
+        # A newer change to a file that failed before replaces the retry
+        changed_ids = {change["fileId"] for change in changes}
+        retries = [failure for failure in state.get("failed", []) if failure["file"]["id"] not in changed_ids]
+        upserts += [failure["file"] for failure in retries]
+        failed = []
+        if upserts or removals:
+            processing_id = f"drive-sync-{uuid.uuid4()}"
+            logger.info(
+                f"{processing_id}: {len(changes)} changes, ingesting {len(upserts)} files "
+                f"({len(retries)} retried) and removing {len(removals)}"
+            )
+            failed = self.apply_changes(upserts, removals, processing_id) or []
+
+        attempts = {failure["file"]["id"]: failure["attempts"] for failure in retries}
+        pending = []
+        for file in failed:
+            failure = {"file": file, "attempts": attempts.get(file["id"], 0) + 1}
+            if failure["attempts"] >= self.max_attempts:
+                logger.error(f"Giving up on '{file['folder']}/{file['name']}' after {failure['attempts']} attempts")
+                continue
+            pending.append(failure)
+        state = self.load_state()  # the channel may have been renewed meanwhile
+        state["page_token"] = next_page_token
+        state["failed"] = pending
+        self.save_state(state)
+        return {"upserts": len(upserts), "deletes": len(removals), "failed": len(failed)}
+
+    async def _debounce(self):
+        """Return once no notification arrived for debounce_seconds, or max_delay_seconds have passed."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_delay_seconds
+        while True:
+            self._notified.clear()
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            try:
+                await asyncio.wait_for(self._notified.wait(), timeout=min(self.debounce_seconds, remaining))
+            except asyncio.TimeoutError:
+                return
+
+    @staticmethod
+    def _token_file() -> str:
+        from drive_client import TOKEN_FILE
+        return TOKEN_FILE
+
+    async def run(self):
+        """Sync after every burst of notifications, and at least every poll_interval seconds."""
+        while True:
+            if self.requires_token_file and not os.path.exists(self._token_file()):
+                # Nothing to sync until someone signs in through /auth
+                await asyncio.sleep(self.poll_interval)
+                continue
+            try:
+                await asyncio.to_thread(self.ensure_watch)
+            except Exception as e:
+                logger.error(f"Could not watch Drive changes: {e}")
+            try:
+                await asyncio.wait_for(self._notified.wait(), timeout=self.poll_interval)
+                await self._debounce()
+            except asyncio.TimeoutError:
+                pass
+            # Notifications from here on trigger another round
+            self._notified.clear()
+            try:
+                async with self.lock:
+                    batch = await asyncio.to_thread(self.sync_once)
+                self.status.update(syncs=self.status["syncs"] + 1, last_sync_at=time.time(), last_batch=batch, error=None)
+            except Exception as e:
+                logger.error(f"Drive sync failed: {e}")
+                self.status["error"] = str(e)
+
+
+async def simulate(files: int, events: int, burst_size: int, burst_gap: float, event_gap: float, debounce_seconds: float, max_delay_seconds: float):
+    """Feed a bursty notification stream through DriveSync and report batching and freshness."""
+    import random
+
+    source = SimulatedChangeSource()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        manifest = SQLiteIngestManifest(os.path.join(tmp_dir, "manifest.sqlite3"))
+        emitted_at = {}
+        latencies, batches = [], []
+
+        def apply_changes(upserts, removals, processing_id):
+            now = time.time()
+            for entry in removals:
+                manifest.remove(entry["file_id"])
+            for file in upserts:
+                manifest.record(file)
+            for file_id in {file["id"] for file in upserts} | {entry["file_id"] for entry in removals}:
+                first_change = emitted_at.pop(file_id, None)
+                if first_change is not None:
+                    latencies.append(now - first_change)
+            batches.append(len(upserts) + len(removals))
+            return []
+
+        sync = DriveSync(
+            source, apply_changes, manifest=manifest, state_file=os.path.join(tmp_dir, "state.json"),
+            debounce_seconds=debounce_seconds, max_delay_seconds=max_delay_seconds, poll_interval=3600,
+            webhook_url="https://simulated.invalid/drive/notifications", webhook_token="simulated",
+            requires_token_file=False,
+        )
+        await asyncio.to_thread(sync.sync_once)  # take the starting page token
+        await asyncio.to_thread(sync.ensure_watch)
+        channel_id = sync.load_state()["channel"]["id"]
+        runner = asyncio.create_task(sync.run())
+
+        rng = random.Random(0)
+        for i in range(events):
+            file_id = f"file-{rng.randrange(files)}"
+            folder = rng.choice(["new", "new", "new", "submitted", None])
+            source.emit(file_id, f"{file_id}.pdf", folder)
+            emitted_at.setdefault(file_id, time.time())
+            sync.notify(channel_id, "change", "simulated")
+            await asyncio.sleep(burst_gap if (i + 1) % burst_size == 0 else event_gap)
+        # Wait until the whole feed has been consumed
+        while sync.load_state()["page_token"] != source.start_page_token():
+            await asyncio.sleep(0.05)
+        runner.cancel()
+
+    print(f"notifications: {sync.status['notifications']}  syncs: {sync.status['syncs']}  files applied: {sum(batches)}")
+    if batches:
+        print(f"notifications per sync: {sync.status['notifications'] / sync.status['syncs']:.1f}  largest batch: {max(batches)}")
+    if latencies:
+        latencies.sort()
+        p50, p95 = latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)]
+        print(f"freshness (first change to applied): p50 {p50:.2f}s  p95 {p95:.2f}s  max {latencies[-1]:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive change sync tools.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    sim = commands.add_parser("simulate", help="Simulate a Drive notification stream in memory")
+    sim.add_argument("--files", type=int, default=20, help="Distinct files the changes touch")
+    sim.add_argument("--events", type=int, default=300, help="Changes to emit")
+    sim.add_argument("--burst-size", type=int, default=25, help="Changes per burst")
+    sim.add_argument("--event-gap", type=float, default=0.01, help="Seconds between changes within a burst")
+    sim.add_argument("--burst-gap", type=float, default=2.0, help="Seconds between bursts")
+    sim.add_argument("--debounce", type=float, default=0.5)
+    sim.add_argument("--max-delay", type=float, default=3.0)
+    args = parser.parse_args()
+
+    asyncio.run(simulate(args.files, args.events, args.burst_size, args.burst_gap, args.event_gap, args.debounce, args.max_delay))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import os
+import hashlib
+import sqlite3
+import threading
+from array import array
+from contextlib import contextmanager
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3")
+
+_embedding_cache = None
+_embedding_cache_lock = threading.Lock()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Embeddings keyed by model name and text hash, stored as float32 blobs in SQLite."""
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, text_hash))"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get_many(self, model: str, texts: list[str]) -> dict[str, list[float]]:
+        """Return {text_hash: vector} for the texts that are cached."""
+        hashes = list({text_hash(text) for text in texts})
+        if not hashes:
+            return {}
+        placeholders = ",".join("?" * len(hashes))
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                [model, *hashes],
+            ).fetchall()
+        return {row_hash: array("f", vector).tolist() for row_hash, vector in rows}
+
+    def put_many(self, model: str, texts: list[str], vectors: list[list[float]]):
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                [(model, text_hash(text), array("f", vector).tobytes()) for text, vector in zip(texts, vectors)],
+            )
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Return the process-wide embedding cache, creating it on first use."""
+    global _embedding_cache
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            _embedding_cache = EmbeddingCache()
+        return _embedding_cache
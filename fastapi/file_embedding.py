@@ -1,39 +1,121 @@
 import os
-from typing import Callable
+from itertools import islice
+from typing import Callable, Iterable, Iterator
 # from langchain.document_loaders import PDFLoader, DocLoader
-from langchain_community.document_loaders import PyPDFLoader, UnstructuredWordDocumentLoader, PyMuPDFLoader
+from langchain_community.document_loaders import UnstructuredWordDocumentLoader
 from langchain_mistralai import MistralAIEmbeddings
 from langchain_core.documents.base import Document
-from qdrant import QdrantDB
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from qdrant import QdrantDB, get_vector_db
+from pdf_parser import iter_pdf_pages
+from parse_cache import file_sha256, get_parse_cache
+from profiling import profile_stage
 
 ASSETS_DIR = "assets"
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "4000"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+# Bump a version whenever its parser or its settings change, so cached pages are re-parsed
+PARSER_VERSIONS = {
+    "pdf": "pymupdf-2",
+    "word": "unstructured-2",
+}
+# Per-file metadata that is filled in from the current path rather than the cache
+PATH_METADATA_KEYS = ("source", "file_path")
 
-def process_and_add_embeddings(processing_id: str, progress_callback: Callable[[str, int, int, int, str], None]):
-    
-    qdrant_class = QdrantDB()
-    documents_to_embed: list[Document] = []
-    if not os.path.exists(ASSETS_DIR):
-        raise ValueError(f"The folder '{ASSETS_DIR}' does not exist.")
-    chunk_count = 0
-    file_list = os.listdir(ASSETS_DIR)
-    for file_name in file_list:
-        file_path = os.path.join(ASSETS_DIR, file_name)
-        
-        if file_path.endswith('.pdf'):
-            # loader = PyPDFLoader(file_path)
-            loader = PyMuPDFLoader(file_path)
-        elif file_path.endswith('.doc') or file_path.endswith('.docx'):
-            loader = UnstructuredWordDocumentLoader(file_path)
-        else:
-            continue  
-
-        try:
-            documents: list[Document] = loader.load_and_split()
-            chunk_count = chunk_count + 1
-            progress_callback(processing_id, chunk_count, len(file_list), "Chunking Documents")
-            documents_to_embed = documents_to_embed + documents
-
-        except Exception as e:
-            print(f"Error processing file {file_name}: {e}")
-
-    qdrant_class.add_documents(documents_to_embed, processing_id, progress_callback)
+def iter_file_pages(file_path: str) -> Iterator[Document]:
+    """
+    Yield one Document per page of a single file as it is parsed, reusing the parse
+    cache when the same content was parsed before. PDFs are parsed page range by
+    page range, so a long file never has to be held in memory at once.
+    """
+    if file_path.endswith('.pdf'):
+        parser_version = PARSER_VERSIONS["pdf"]
+        parse = lambda: iter_pdf_pages(file_path)
+    elif file_path.endswith('.doc') or file_path.endswith('.docx'):
+        parser_version = PARSER_VERSIONS["word"]
+        parse = lambda: (
+            (page.page_content, {"page": number, **page.metadata})
+            for number, page in enumerate(UnstructuredWordDocumentLoader(file_path).lazy_load())
+        )
+    else:
+        return
+
+    cache = get_parse_cache()
+    sha256 = file_sha256(file_path)
+    path_metadata = {"source": file_path, "file_path": file_path}
+    pages = cache.iter_pages(sha256, parser_version)
+    if pages is not None:
+        for text, metadata in pages:
+            yield Document(page_content=text, metadata={**metadata, **path_metadata})
+        return
+
+    with cache.writer(sha256, parser_version) as add_page:
+        for text, metadata in parse():
+            metadata = {k: v for k, v in metadata.items() if k not in PATH_METADATA_KEYS}
+            add_page(text, metadata)
+            yield Document(page_content=text, metadata={**metadata, **path_metadata})
+
+def iter_file_chunks(file_path: str, stats: dict = None) -> Iterator[Document]:
+    """Yield the chunks of a single file, page by page, counting pages, chunks and characters into stats if given."""
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    for page in iter_file_pages(file_path):
+        chunks = splitter.split_documents([page])
+        if stats is not None:
+            stats["pages"] = stats.get("pages", 0) + 1
+            stats["chunks"] = stats.get("chunks", 0) + len(chunks)
+            stats["characters"] = stats.get("characters", 0) + sum(len(chunk.page_content) for chunk in chunks)
+        yield from chunks
+
+def is_supported(file_path: str) -> bool:
+    return file_path.endswith(('.pdf', '.doc', '.docx'))
+
+def add_in_batches(chunks: Iterable[Document], processing_id: str, progress_callback: Callable[[str, int, int, str], None], db: QdrantDB = None) -> int:
+    """Embed and insert chunks INGEST_BATCH_SIZE at a time. Returns the number of points created."""
+    db = db or get_vector_db()
+    inserted = 0
+    chunks = iter(chunks)
+    while batch := list(islice(chunks, INGEST_BATCH_SIZE)):
+        inserted += db.add_documents(batch, processing_id, progress_callback)
+    return inserted
+
+def local_file_id(file_path: str) -> str:
+    """File ID of a file that did not come from Drive."""
+    return f"local:{os.path.basename(file_path)}"
+
+def iter_asset_files(assets_dir: str = ASSETS_DIR) -> Iterator[tuple[str, str]]:
+    """
+    Yield (file_path, file_id) for the supported files in the assets folder, in name
+    order: Drive downloads sit in a directory named after their file ID, and files
+    placed directly in the folder get local_file_id.
+    """
+    for name in sorted(os.listdir(assets_dir)):
+        path = os.path.join(assets_dir, name)
+        if os.path.isdir(path):
+            for file_name in sorted(os.listdir(path)):
+                if is_supported(file_name):
+                    yield os.path.join(path, file_name), name
+        elif is_supported(path):
+            yield path, local_file_id(path)
+
+def tag_chunks(chunks: Iterable[Document], file_id: str, version: str) -> Iterator[Document]:
+    """Number the chunks of a file and tag them with its ID and version, from which their point IDs are derived."""
+    for number, chunk in enumerate(chunks):
+        chunk.metadata.update(file_id=file_id, version=version, chunk=number)
+        yield chunk
+
+@profile_stage("process_file")
+def process_file(file_path: str, processing_id: str, progress_callback: Callable[[str, int, int, str], None], stats: dict = None, file_id: str = None, version: str = None, db: QdrantDB = None) -> int:
+    """
+    Chunk, embed and insert a single file. Returns the number of points written.
+    file_id and version default to local_file_id and the hash of the file's content;
+    ingesting the same version again, e.g. after a failure, overwrites the same points.
+    If stats is given, it receives the pages, chunks, characters and points ingested.
+    """
+    if not is_supported(file_path):
+        return 0
+    chunks = tag_chunks(iter_file_chunks(file_path, stats), file_id or local_file_id(file_path), version or file_sha256(file_path))
+    points = add_in_batches(chunks, processing_id, progress_callback, db)
+    if stats is not None:
+        stats["points"] = points
+    return points
@@ -2,12 +2,9 @@ import os
 import re
 import io
 import logging
-from typing import Callable
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request as GoogleRequest
 from googleapiclient.http import MediaIoBaseDownload
-from googleapiclient.discovery import build
 from fastapi import HTTPException
+from drive_client import TOKEN_FILE, get_drive_client_factory
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -16,32 +13,26 @@ logger = logging.getLogger(__name__)
 class GoogleDriveDownloader:
     SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
     CREDENTIALS_FILE = "creds.json"
-    TOKEN_FILE = "token.json"
+    TOKEN_FILE = TOKEN_FILE
     DOWNLOAD_DIR = "./assets"
     ROOT_FOLDER_NAME = "Mridu Tiwari (RFP Overall Master - New)"
     FOLDER_LIST = ["new", "submitted"]
+    FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+    SUPPORTED_EXTENSIONS = ('.docx', '.pdf')
+    DOWNLOAD_WORKERS = int(os.getenv("DRIVE_DOWNLOAD_WORKERS", "4"))
 
-    def __init__(self):
-        self.service = None
-        self.total_files_downloaded = 0
+    @property
+    def service(self):
+        """The Drive service for the calling thread."""
+        return get_drive_client_factory().get_service()
 
     def load_credentials(self):
         """Load or refresh credentials."""
-        if os.path.exists(self.TOKEN_FILE):
-            creds = Credentials.from_authorized_user_file(self.TOKEN_FILE)
-            if creds.valid:
-                return creds
-            if creds.expired and creds.refresh_token:
-                creds.refresh(GoogleRequest())
-                with open(self.TOKEN_FILE, "w") as token_file:
-                    token_file.write(creds.to_json())
-                return creds
-        raise HTTPException(status_code=401, detail="Authentication required")
+        return get_drive_client_factory().get_credentials()
 
     def initialize_service(self):
         """Initialize the Google Drive service."""
-        creds = self.load_credentials()
-        self.service = build('drive', 'v3', credentials=creds)
+        get_drive_client_factory().get_service()
 
     @staticmethod
     def sanitize_filename(filename):
@@ -63,81 +54,110 @@ class GoogleDriveDownloader:
             raise HTTPException(status_code=404, detail=f"Folder '{folder_name}' not found.")
         return folders[0]['id']
 
-    def list_files_in_folder(self, folder_id):
-        """List all files in a folder by its ID."""
-        results = self.service.files().list(
-            q=f"'{folder_id}' in parents and trashed = false",
-            fields="files(id, name, mimeType)"
-        ).execute()
-        return results.get('files', [])
+    def list_files_in_folder(self, folder_id, extra_query=""):
+        """List all files in a folder by its ID, following result pages."""
+        files = []
+        page_token = None
+        while True:
+            results = self.service.files().list(
+                q=f"'{folder_id}' in parents and trashed = false{extra_query}",
+                fields="nextPageToken, files(id, name, mimeType, modifiedTime, size)",
+                pageSize=1000,
+                pageToken=page_token,
+            ).execute()
+            files.extend(results.get('files', []))
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return files
+
+    def walk_folder(self, folder_id):
+        """Yield every file below a folder, descending into its subfolders."""
+        for item in self.list_files_in_folder(folder_id):
+            if item['mimeType'] == self.FOLDER_MIME_TYPE:
+                yield from self.walk_folder(item['id'])
+            else:
+                yield item
+
+    def list_tracked_folders(self):
+        """Return {folder_id: name of the FOLDER_LIST folder it is in} for the FOLDER_LIST folders and all their subfolders."""
+        root_folder_id = self.get_folder_id(self.ROOT_FOLDER_NAME)
+        tracked = {}
+        for subfolder in self.FOLDER_LIST:
+            try:
+                pending = [self.get_folder_id(subfolder, parent_id=root_folder_id)]
+            except HTTPException as e:
+                logger.error(f"Failed to process folder '{subfolder}': {e.detail}")
+                continue
+            while pending:
+                folder_id = pending.pop()
+                tracked[folder_id] = subfolder
+                children = self.list_files_in_folder(folder_id, f" and mimeType = '{self.FOLDER_MIME_TYPE}'")
+                pending.extend(child['id'] for child in children)
+        return tracked
     
-    def get_total_files(self):
-        """Get the total number of files in ROOT_FOLDER_NAME/{folders in FOLDER_LIST}."""
-        total_files = 0
+    def list_all_files(self):
+        """
+        List the files in ROOT_FOLDER_NAME/{folders in FOLDER_LIST} and their subfolders,
+        each tagged with the name of the FOLDER_LIST folder it is in.
+        """
+        all_files = []
         root_folder_id = self.get_folder_id(self.ROOT_FOLDER_NAME)
 
         for subfolder in self.FOLDER_LIST:
             try:
                 subfolder_id = self.get_folder_id(subfolder, parent_id=root_folder_id)
-                files = self.list_files_in_folder(subfolder_id)
-                total_files += len([file for file in files if file['mimeType'] != 'application/vnd.google-apps.folder'])
+                for file in self.walk_folder(subfolder_id):
+                    all_files.append({**file, "folder": subfolder})
             except HTTPException as e:
                 logger.error(f"Failed to process folder '{subfolder}': {e.detail}")
 
-        return total_files
+        return all_files
 
+    def local_dir(self, file_id):
+        """The directory holding the local copy of a Drive file, named after its ID so files that share a name never collide."""
+        return os.path.join(self.DOWNLOAD_DIR, self.sanitize_filename(file_id))
 
+    def local_path(self, file_id, file_name, parent_folder_name):
+        """Where a file is downloaded to: its name prefixed with its parent folder name, which ingestion reads back as rfp_status."""
+        return os.path.join(self.local_dir(file_id), self.sanitize_filename(f"{parent_folder_name}_{file_name}"))
 
-    def download_file(self, file_id, file_name, parent_folder_name):
-        """Download a file by its ID and append its parent folder name to the file name."""
-        if not file_name.lower().endswith(('.docx', '.pdf')):
+    def legacy_local_path(self, file_name, parent_folder_name):
+        """Where files were downloaded to before each got its own directory."""
+        return os.path.join(self.DOWNLOAD_DIR, self.sanitize_filename(f"{parent_folder_name}_{file_name}"))
+
+    def download_file(self, file_id, file_name, parent_folder_name, overwrite: bool = False):
+        """
+        Download a file by its ID and append its parent folder name to the file name.
+        Returns the local path, or None if the file type is not supported.
+        An existing local copy is reused unless overwrite is set. Copies of the
+        file under an earlier name or folder are removed.
+        """
+        if not file_name.lower().endswith(self.SUPPORTED_EXTENSIONS):
             logger.info(f"Skipping download for '{file_name}': Unsupported file type.")
-            return
+            return None
 
-        # Append the parent folder name to the file name
-        modified_file_name = f"{parent_folder_name}_{file_name}"
-        sanitized_file_name = self.sanitize_filename(modified_file_name)
-        file_path = os.path.join(self.DOWNLOAD_DIR, sanitized_file_name)
+        file_path = self.local_path(file_id, file_name, parent_folder_name)
+        sanitized_file_name = os.path.basename(file_path)
 
-        if os.path.exists(file_path):
+        if os.path.exists(file_path) and not overwrite:
             logger.info(f"File '{sanitized_file_name}' already exists at {file_path}. Skipping download.")
-            return
+            return file_path
 
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
         request = self.service.files().get_media(fileId=file_id)
-
-        with io.FileIO(file_path, 'wb') as file:
+        # Written aside and moved into place, so an interrupted download never leaves a truncated copy
+        tmp_path = f"{file_path}.part"
+        with io.FileIO(tmp_path, 'wb') as file:
             downloader = MediaIoBaseDownload(file, request)
             done = False
             while not done:
                 status, done = downloader.next_chunk()
                 logger.info(f"Downloading {sanitized_file_name}: {int(status.progress() * 100)}% complete")
+        os.replace(tmp_path, file_path)
+        for stale in os.listdir(os.path.dirname(file_path)):
+            if stale != sanitized_file_name:
+                os.remove(os.path.join(os.path.dirname(file_path), stale))
 
         logger.info(f"Downloaded: {sanitized_file_name} to {file_path}")
+        return file_path
 
-
-    def download_files_in_folder(self, folder_id, folder_name: str, processing_id: str, progress_callback: Callable[[str, int, int, str], None]):
-        """Download all files in a folder."""
-        files = self.list_files_in_folder(folder_id)
-        total_files = self.get_total_files()
-        # downloaded_count = 0
-        for file in files:
-            if file['mimeType'] != 'application/vnd.google-apps.folder':  # Skip subfolders
-                self.download_file(file['id'], file['name'], folder_name)
-                self.total_files_downloaded += 1
-                progress_callback(processing_id, self.total_files_downloaded, total_files, "Downloading Documents")
-
-    def download_all(self, processing_id: str, progress_callback: Callable[[str, int, int, str], None]):
-        """Download files from ROOT_FOLDER_NAME and its specified subfolders."""
-        self.ensure_download_directory()
-        self.initialize_service()
-
-        # Get the ID of the root folder
-        root_folder_id = self.get_folder_id(self.ROOT_FOLDER_NAME)
-
-        for subfolder in self.FOLDER_LIST:
-            try:
-                subfolder_id = self.get_folder_id(subfolder, parent_id=root_folder_id)
-                logger.info(f"Downloading files from folder: {self.ROOT_FOLDER_NAME}/{subfolder}")
-                self.download_files_in_folder(subfolder_id, subfolder, processing_id, progress_callback)
-            except HTTPException as e:
-                logger.error(f"Failed to process folder '{subfolder}': {e.detail}")
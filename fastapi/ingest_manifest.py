@@ -0,0 +1,284 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Optional
+from task_queue import TASK_QUEUE_URL
+
+INGEST_MANIFEST_PATH = os.getenv("INGEST_MANIFEST_PATH", "ingest_manifest.sqlite3")
+# A redis:// URL shares the manifest between the server and workers on other machines.
+# Defaults to the task queue's Redis when there is one, and otherwise to INGEST_MANIFEST_PATH.
+INGEST_MANIFEST_URL = os.getenv("INGEST_MANIFEST_URL") or (
+    TASK_QUEUE_URL if TASK_QUEUE_URL.startswith(("redis://", "rediss://")) else f"sqlite:///{INGEST_MANIFEST_PATH}"
+)
+
+_ingest_manifest = None
+_ingest_manifest_lock = threading.Lock()
+
+
+def file_kind(name: str) -> str:
+    """Return "pdf", "word" or "other": the parser a file goes through."""
+    name = name.lower()
+    if name.endswith(".pdf"):
+        return "pdf"
+    if name.endswith((".doc", ".docx")):
+        return "word"
+    return "other"
+
+
+def file_version(file: dict) -> str:
+    """Identifies what was ingested of a Drive file dict: changes when it is edited, renamed or moved."""
+    key = f"{file.get('modifiedTime')}|{file['folder']}|{file['name']}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def entry_version(entry: dict) -> str:
+    """file_version of the file a manifest entry was recorded from."""
+    return file_version({"modifiedTime": entry["modified_time"], "folder": entry["folder"], "name": entry["name"]})
+
+
+def manifest_entry(file: dict) -> dict:
+    """The manifest entry of a Drive file dict ("id", "name", "folder", optional "modifiedTime" and "size")."""
+    return {
+        "file_id": file["id"],
+        "name": file["name"],
+        "folder": file["folder"],
+        "modified_time": file.get("modifiedTime"),
+        "size": int(file.get("size", 0)),
+        "ingested_at": time.time(),
+    }
+
+
+def stats_row(file: dict, stats: dict, download_seconds: float, ingest_seconds: float) -> dict:
+    """The ingest_stats row of one ingestion of a Drive file, from stats as filled in by process_file."""
+    return {
+        "file_id": file["id"],
+        "kind": file_kind(file["name"]),
+        "bytes": int(file.get("size", 0)),
+        "pages": stats.get("pages", 0),
+        "chunks": stats.get("chunks", 0),
+        "characters": stats.get("characters", 0),
+        "points": stats.get("points", 0),
+        "download_seconds": download_seconds,
+        "ingest_seconds": ingest_seconds,
+        "finished_at": time.time(),
+    }
+
+
+def unrecorded_stats(stats: list[dict], latest: dict[str, dict]) -> list[dict]:
+    """The rows of stats that finished after the latest row recorded for their file, oldest first."""
+    rows = [row for row in stats if row["finished_at"] > latest.get(row["file_id"], {}).get("finished_at", float("-inf"))]
+    return sorted(rows, key=lambda row: row["finished_at"])
+
+
+class IngestManifest(ABC):
+    """
+    Record of the Drive files currently in the index, keyed by Drive file ID.
+
+    Incremental syncs use it to find the name, folder and version a file was
+    ingested under, so its old points can be removed when it changes, moves or is
+    deleted. It also keeps one ingest_stats row per ingestion of a file, which the
+    sync planner projects from.
+    """
+
+    @abstractmethod
+    def get(self, file_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def all(self) -> list[dict]:
+        ...
+
+    @abstractmethod
+    def record(self, file: dict):
+        """Record a Drive file dict ("id", "name", "folder", optional "modifiedTime" and "size") as ingested."""
+
+    @abstractmethod
+    def record_stats(self, file: dict, stats: dict, download_seconds: float, ingest_seconds: float):
+        """Record what ingesting a Drive file took: stats as filled in by process_file."""
+
+    @abstractmethod
+    def recent_stats(self, limit: int) -> list[dict]:
+        """Return the limit most recent ingest_stats rows, newest first."""
+
+    @abstractmethod
+    def latest_stats_by_file(self) -> dict[str, dict]:
+        """Return the latest ingest_stats row of every file that has one."""
+
+    @abstractmethod
+    def all_stats(self) -> list[dict]:
+        """Return every ingest_stats row, oldest first."""
+
+    @abstractmethod
+    def restore(self, entries: list[dict], stats: list[dict]):
+        """
+        Load entries and ingest_stats rows exported from another manifest, e.g. with a
+        snapshot bundle. Entries replace those of the same file; stats rows that are
+        not newer than the latest one recorded for their file are skipped.
+        """
+
+    @abstractmethod
+    def remove(self, file_id: str):
+        ...
+
+
+class SQLiteIngestManifest(IngestManifest):
+    """Ingest manifest in a local SQLite file, for one machine or a shared volume."""
+
+    def __init__(self, path: str = INGEST_MANIFEST_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "file_id TEXT PRIMARY KEY, name TEXT NOT NULL, folder TEXT NOT NULL, "
+                "modified_time TEXT, size INTEGER, ingested_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS ingest_stats ("
+                "file_id TEXT NOT NULL, kind TEXT NOT NULL, bytes INTEGER NOT NULL, pages INTEGER NOT NULL, "
+                "chunks INTEGER NOT NULL, characters INTEGER NOT NULL, points INTEGER NOT NULL, "
+                "download_seconds REAL NOT NULL, ingest_seconds REAL NOT NULL, finished_at REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, file_id: str) -> Optional[dict]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM files WHERE file_id = ?", (file_id,)).fetchone()
+        return dict(row) if row else None
+
+    def all(self) -> list[dict]:
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute("SELECT * FROM files")]
+
+    def record(self, file: dict):
+        entry = manifest_entry(file)
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO files ({', '.join(entry)}) VALUES ({', '.join('?' for _ in entry)})",
+                list(entry.values()),
+            )
+
+    def record_stats(self, file: dict, stats: dict, download_seconds: float, ingest_seconds: float):
+        row = stats_row(file, stats, download_seconds, ingest_seconds)
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT INTO ingest_stats ({', '.join(row)}) VALUES ({', '.join('?' for _ in row)})",
+                list(row.values()),
+            )
+
+    def recent_stats(self, limit: int) -> list[dict]:
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute("SELECT * FROM ingest_stats ORDER BY finished_at DESC LIMIT ?", (limit,))]
+
+    def latest_stats_by_file(self) -> dict[str, dict]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM ingest_stats ORDER BY finished_at").fetchall()
+        return {row["file_id"]: dict(row) for row in rows}
+
+    def all_stats(self) -> list[dict]:
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute("SELECT * FROM ingest_stats ORDER BY finished_at")]
+
+    def restore(self, entries: list[dict], stats: list[dict]):
+        rows = unrecorded_stats(stats, self.latest_stats_by_file())
+        with self._connect() as conn:
+            for entry in entries:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO files ({', '.join(entry)}) VALUES ({', '.join('?' for _ in entry)})",
+                    list(entry.values()),
+                )
+            for row in rows:
+                conn.execute(
+                    f"INSERT INTO ingest_stats ({', '.join(row)}) VALUES ({', '.join('?' for _ in row)})",
+                    list(row.values()),
+                )
+
+    def remove(self, file_id: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM files WHERE file_id = ?", (file_id,))
+
+
+class RedisIngestManifest(IngestManifest):
+    """Ingest manifest in Redis, shared by the server and workers on several machines."""
+
+    def __init__(self, url: str, prefix: str = "manifest"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("RedisIngestManifest requires the 'redis' package: pip install redis") from e
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.files_key = f"{prefix}:files"  # hash of file_id to entry
+        self.stats_key = f"{prefix}:stats"  # list of ingest_stats rows, oldest first
+        self.latest_stats_key = f"{prefix}:stats:latest"  # hash of file_id to its latest row
+
+    def get(self, file_id: str) -> Optional[dict]:
+        entry = self.redis.hget(self.files_key, file_id)
+        return json.loads(entry) if entry else None
+
+    def all(self) -> list[dict]:
+        return [json.loads(entry) for entry in self.redis.hvals(self.files_key)]
+
+    def record(self, file: dict):
+        self.redis.hset(self.files_key, file["id"], json.dumps(manifest_entry(file)))
+
+    def record_stats(self, file: dict, stats: dict, download_seconds: float, ingest_seconds: float):
+        row = json.dumps(stats_row(file, stats, download_seconds, ingest_seconds))
+        pipe = self.redis.pipeline()
+        pipe.rpush(self.stats_key, row)
+        pipe.hset(self.latest_stats_key, file["id"], row)
+        pipe.execute()
+
+    def recent_stats(self, limit: int) -> list[dict]:
+        if limit <= 0:
+            return []
+        return [json.loads(row) for row in reversed(self.redis.lrange(self.stats_key, -limit, -1))]
+
+    def latest_stats_by_file(self) -> dict[str, dict]:
+        return {file_id: json.loads(row) for file_id, row in self.redis.hgetall(self.latest_stats_key).items()}
+
+    def all_stats(self) -> list[dict]:
+        return [json.loads(row) for row in self.redis.lrange(self.stats_key, 0, -1)]
+
+    def restore(self, entries: list[dict], stats: list[dict]):
+        rows = unrecorded_stats(stats, self.latest_stats_by_file())
+        pipe = self.redis.pipeline()
+        for entry in entries:
+            pipe.hset(self.files_key, entry["file_id"], json.dumps(entry))
+        for row in rows:
+            pipe.rpush(self.stats_key, json.dumps(row))
+            pipe.hset(self.latest_stats_key, row["file_id"], json.dumps(row))
+        pipe.execute()
+
+    def remove(self, file_id: str):
+        self.redis.hdel(self.files_key, file_id)
+
+
+def get_ingest_manifest() -> IngestManifest:
+    """Return the process-wide ingest manifest selected by INGEST_MANIFEST_URL."""
+    global _ingest_manifest
+    with _ingest_manifest_lock:
+        if _ingest_manifest is None:
+            if INGEST_MANIFEST_URL.startswith(("redis://", "rediss://")):
+                _ingest_manifest = RedisIngestManifest(INGEST_MANIFEST_URL)
+            elif INGEST_MANIFEST_URL.startswith("sqlite:///"):
+                _ingest_manifest = SQLiteIngestManifest(INGEST_MANIFEST_URL[len("sqlite:///"):])
+            else:
+                raise ValueError(f"Unsupported INGEST_MANIFEST_URL '{INGEST_MANIFEST_URL}'")
+        return _ingest_manifest
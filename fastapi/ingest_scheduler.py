@@ -0,0 +1,139 @@
+import os
+import time
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from google_drive_downloader import GoogleDriveDownloader
+from profiling import profile_stage, submit_in_context
+from ingest_manifest import file_version, get_ingest_manifest
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_PRIORITY_WEIGHTS = {"recency": 1.0, "folder": 1.0, "size": 0.5}
+
+
+def _parse_weights(value: str) -> dict[str, float]:
+    """Parse "name=weight,..." pairs, falling back to DEFAULT_PRIORITY_WEIGHTS if the value is empty or malformed."""
+    weights = {}
+    try:
+        for item in value.split(","):
+            name, _, weight = item.partition("=")
+            weights[name.strip()] = float(weight)
+    except ValueError:
+        logger.warning(f"Ignoring malformed INGEST_PRIORITY_WEIGHTS '{value}', using {DEFAULT_PRIORITY_WEIGHTS}")
+        return dict(DEFAULT_PRIORITY_WEIGHTS)
+    return weights
+
+
+# Relative weight of each priority factor, e.g. "recency=1,folder=1,size=0.5"
+INGEST_PRIORITY_WEIGHTS = _parse_weights(os.getenv("INGEST_PRIORITY_WEIGHTS", "recency=1,folder=1,size=0.5"))
+# Folders in order of importance; folders not listed come last
+INGEST_FOLDER_PRIORITY = [f for f in os.getenv("INGEST_FOLDER_PRIORITY", ",".join(GoogleDriveDownloader.FOLDER_LIST)).split(",") if f]
+# A file this many days old scores half as much for recency as one modified now
+INGEST_RECENCY_HALF_LIFE_DAYS = float(os.getenv("INGEST_RECENCY_HALF_LIFE_DAYS", "30"))
+# A file of this size scores half as much for size as an empty one
+INGEST_SIZE_HALF_POINT_BYTES = float(os.getenv("INGEST_SIZE_HALF_POINT_BYTES", str(5 * 1024 * 1024)))
+
+
+def priority_score(file: dict, now: datetime = None) -> float:
+    """
+    Score a Drive file (with "modifiedTime", "size" and "folder") for ingestion order.
+    Each factor is between 0 and 1, and higher scores are ingested first.
+    """
+    now = now or datetime.now(timezone.utc)
+    modified = file.get("modifiedTime")
+    if modified:
+        age_days = max((now - datetime.fromisoformat(modified.replace("Z", "+00:00"))).total_seconds() / 86400, 0)
+        recency = 0.5 ** (age_days / INGEST_RECENCY_HALF_LIFE_DAYS)
+    else:
+        recency = 0.0
+    folder = file.get("folder")
+    if folder in INGEST_FOLDER_PRIORITY:
+        folder_score = 1 - INGEST_FOLDER_PRIORITY.index(folder) / len(INGEST_FOLDER_PRIORITY)
+    else:
+        folder_score = 0.0
+    size_score = 1 / (1 + int(file.get("size", 0)) / INGEST_SIZE_HALF_POINT_BYTES)
+    return (
+        INGEST_PRIORITY_WEIGHTS.get("recency", 0) * recency
+        + INGEST_PRIORITY_WEIGHTS.get("folder", 0) * folder_score
+        + INGEST_PRIORITY_WEIGHTS.get("size", 0) * size_score
+    )
+
+
+def prioritize(files: list[dict]) -> list[dict]:
+    """Return files with a "priority" key, highest priority first."""
+    now = datetime.now(timezone.utc)
+    scored = [{**file, "priority": priority_score(file, now)} for file in files]
+    return sorted(scored, key=lambda file: file["priority"], reverse=True)
+
+
+def record_ingested(file: dict, stats: dict, download_seconds: float, ingest_seconds: float):
+    """
+    Record a Drive file whose new version was fully inserted, and only then remove
+    the points of the version it replaces, so the file stays searchable throughout.
+    """
+    from qdrant import get_vector_db
+
+    manifest = get_ingest_manifest()
+    previous = manifest.get(file["id"])
+    if previous:
+        # Points ingested before they carried a file ID are matched by name and folder
+        legacy = {"filename": GoogleDriveDownloader.sanitize_filename(previous["name"]), "rfp_status": previous["folder"]}
+        get_vector_db().delete_file_points(file["id"], keep_version=file_version(file), **legacy)
+    manifest.record(file)
+    manifest.record_stats(file, stats, download_seconds, ingest_seconds)
+
+
+@profile_stage("ingest_in_priority_order")
+def ingest_in_priority_order(downloader: GoogleDriveDownloader, files: list[dict], processing_id: str, progress_callback: Callable[..., None], ingest_file: Callable[[str, str, Callable, dict], int], overwrite: bool = False) -> list[dict]:
+    """
+    Download and ingest files one by one in priority order, so the most relevant
+    documents become queryable first. Up to DOWNLOAD_WORKERS downloads run ahead
+    in parallel while the current file is being ingested. Every progress event
+    carries the names of the documents that are queryable so far. Set overwrite to
+    download files again even if a local copy exists, e.g. because they changed in
+    Drive. Returns the files that could not be downloaded or ingested.
+    """
+    downloader.ensure_download_directory()
+    files = prioritize(files)
+    queryable = []
+    failed = []
+
+    @profile_stage("download")
+    def download(file):
+        """Return the local path (None if the type is not supported), the seconds taken and the error, if any."""
+        started = time.perf_counter()
+        try:
+            return downloader.download_file(file["id"], file["name"], file["folder"], overwrite), time.perf_counter() - started, None
+        except Exception as e:
+            logger.error(f"Error downloading file {file['name']}: {e}")
+            return None, 0.0, e
+
+    pending = deque(files)
+    in_flight = deque()
+    with ThreadPoolExecutor(max_workers=downloader.DOWNLOAD_WORKERS) as executor:
+        for processed in range(1, len(files) + 1):
+            # Futures are consumed in submission order, i.e. priority order. Besides the
+            # file about to be ingested, only DOWNLOAD_WORKERS more are submitted ahead
+            while pending and len(in_flight) <= downloader.DOWNLOAD_WORKERS:
+                file = pending.popleft()
+                in_flight.append((file, submit_in_context(executor, download, file)))
+            file, future = in_flight.popleft()
+            file_path, download_seconds, error = future.result()
+            if error is not None:
+                failed.append(file)
+            elif file_path is not None:
+                try:
+                    stats = {}
+                    started = time.perf_counter()
+                    ingest_file(file_path, processing_id, lambda *args: None, stats, file_id=file["id"], version=file_version(file))
+                    record_ingested(file, stats, download_seconds, time.perf_counter() - started)
+                    queryable.append(file["name"])
+                except Exception as e:
+                    logger.error(f"Error processing file {file['name']}: {e}")
+                    failed.append(file)
+            progress_callback(processing_id, processed, len(files), f"Ingesting {file['name']}", queryable)
+    return failed
@@ -0,0 +1,93 @@
+"""
+One-off backfill for an index built before points carried their Drive file ID.
+Run with `python -m manifest_backfill [--prune]` from this folder.
+
+Lists the Drive folders and matches the points without a file ID to the Drive
+files by name and folder. Matched points get the file ID, and the version the
+ingest manifest records for the file. Files missing from the manifest, e.g. when
+it moved to Redis, are recorded without a modification time, so the next full
+sync re-ingests them. A name shared by several files of a folder cannot be told
+apart; those files are marked for re-ingestion too, which retires the old points.
+Points of files that are no longer in Drive are reported, and deleted with --prune.
+Local copies are moved into the per-file directories downloads now go to.
+"""
+import os
+import logging
+import argparse
+from pathlib import Path
+from dotenv import load_dotenv
+
+env_path = Path('.env')
+if env_path.exists():
+    load_dotenv(dotenv_path=env_path)
+
+from google_drive_downloader import GoogleDriveDownloader
+from ingest_manifest import IngestManifest, entry_version, get_ingest_manifest
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def file_identities(files: list[dict], manifest: IngestManifest) -> dict[tuple[str, str], tuple[str, str] | None]:
+    """
+    Map the (filename, rfp_status) that points of the listed Drive files were stored
+    under to their (file_id, version), or to None where several files share it.
+    Records the files the manifest is missing, and marks the ambiguous ones, for
+    re-ingestion.
+    """
+    by_key = {}
+    for file in files:
+        if file["name"].lower().endswith(GoogleDriveDownloader.SUPPORTED_EXTENSIONS):
+            by_key.setdefault((GoogleDriveDownloader.sanitize_filename(file["name"]), file["folder"]), []).append(file)
+
+    identities = {}
+    for key, key_files in by_key.items():
+        for file in key_files:
+            entry = manifest.get(file["id"])
+            if entry is None or len(key_files) > 1:
+                # No modification time never matches Drive's, so the next full sync re-ingests it
+                manifest.record({**file, "modifiedTime": None})
+                entry = manifest.get(file["id"])
+            identities[key] = (file["id"], entry_version(entry)) if len(key_files) == 1 else None
+    return identities
+
+
+def relocate_local_copies(downloader: GoogleDriveDownloader, files: list[dict], identities: dict[tuple[str, str], tuple[str, str] | None]):
+    """Move copies downloaded before each file got its own directory into it, dropping those of shared names."""
+    for file in files:
+        key = (GoogleDriveDownloader.sanitize_filename(file["name"]), file["folder"])
+        legacy_path = downloader.legacy_local_path(file["name"], file["folder"])
+        if key not in identities or not os.path.exists(legacy_path):
+            continue
+        if identities[key] is None:
+            os.remove(legacy_path)  # could be either file's; both are downloaded again
+            continue
+        os.makedirs(downloader.local_dir(file["id"]), exist_ok=True)
+        os.replace(legacy_path, downloader.local_path(file["id"], file["name"], file["folder"]))
+
+
+def backfill(downloader: GoogleDriveDownloader = None, manifest: IngestManifest = None, prune: bool = False) -> dict[str, int]:
+    """Tag the points of the live collection with their Drive file. Returns the counts of tag_legacy_points."""
+    from qdrant import get_vector_db
+
+    downloader = downloader or GoogleDriveDownloader()
+    manifest = manifest or get_ingest_manifest()
+    files = downloader.list_all_files()
+    identities = file_identities(files, manifest)
+    relocate_local_copies(downloader, files, identities)
+    return get_vector_db().tag_legacy_points(identities, prune)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tag points written before they carried a Drive file ID.")
+    parser.add_argument("--prune", action="store_true", help="Delete the points of files that are no longer in Drive")
+    args = parser.parse_args()
+    counts = backfill(prune=args.prune)
+    logger.info(f"Updated {counts['updated']} points and deleted {counts['deleted']}")
+    if counts["unresolved"]:
+        # Those of shared names go when their files are re-ingested, the others with --prune
+        logger.info(f"{counts['unresolved']} points still have no file ID")
+
+
+if __name__ == "__main__":
+    main()
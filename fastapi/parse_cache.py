@@ -0,0 +1,106 @@
+import os
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+import msgpack
+
+logger = logging.getLogger(__name__)
+
+PARSE_CACHE_DIR = os.getenv("PARSE_CACHE_DIR", "parse_cache")
+PARSE_CACHE_MAX_BYTES = int(os.getenv("PARSE_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+_parse_cache = None
+_parse_cache_lock = threading.Lock()
+
+
+def file_sha256(file_path: str) -> str:
+    """Hash a file's content in 1 MiB blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """
+    Cache of parsed pages keyed by file content hash and parser version.
+
+    Each entry is a msgpack stream of (text, metadata) records, one per page, so
+    entries can be written and read page by page. Reading an entry marks it as
+    recently used; the least recently used entries are removed once the cache
+    grows beyond max_bytes.
+    """
+
+    def __init__(self, directory: str = PARSE_CACHE_DIR, max_bytes: int = PARSE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, sha256: str, parser_version: str) -> str:
+        return os.path.join(self.directory, f"{sha256}-{parser_version}.msgpack")
+
+    def iter_pages(self, sha256: str, parser_version: str) -> Optional[Iterator[tuple[str, dict]]]:
+        """Return an iterator over the cached pages, or None on a cache miss."""
+        path = self._path(sha256, parser_version)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+
+        def pages():
+            with open(path, "rb") as file:
+                for text, metadata in msgpack.Unpacker(file, raw=False):
+                    yield text, metadata
+        return pages()
+
+    @contextmanager
+    def writer(self, sha256: str, parser_version: str):
+        """
+        Yield a function that appends one page to a new entry. The entry only
+        becomes visible once the block exits without an error.
+        """
+        path = self._path(sha256, parser_version)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        packer = msgpack.Packer(default=str)
+        try:
+            with open(tmp_path, "wb") as file:
+                yield lambda text, metadata: file.write(packer.pack((text, metadata)))
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.enforce_limit()
+
+    def enforce_limit(self):
+        """Remove the least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".msgpack"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+                total -= size
+                logger.info(f"Evicted {name} from the parse cache")
+            except FileNotFoundError:
+                pass
+
+
+def get_parse_cache() -> ParseCache:
+    """Return the process-wide parse cache, creating it on first use."""
+    global _parse_cache
+    with _parse_cache_lock:
+        if _parse_cache is None:
+            _parse_cache = ParseCache()
+        return _parse_cache
@@ -0,0 +1,74 @@
+import os
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator
+import fitz
+
+PDF_PAGES_PER_RANGE = int(os.getenv("PDF_PAGES_PER_RANGE", "50"))
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", str(os.cpu_count() or 2)))
+# Upper bound on parsed-but-not-yet-consumed text held for a single file
+PDF_MEMORY_CAP_BYTES = int(os.getenv("PDF_MEMORY_CAP_BYTES", str(64 * 1024 * 1024)))
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            # spawn rather than fork: the API process has threads running
+            _parse_pool = ProcessPoolExecutor(max_workers=PDF_PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _parse_pool
+
+
+def _document_metadata(doc: "fitz.Document") -> dict:
+    # Same fields as langchain's PyMuPDFLoader, which this replaces
+    return {k: v for k, v in doc.metadata.items() if type(v) in [str, int]}
+
+
+def parse_page_range(file_path: str, start: int, end: int) -> list[tuple[str, dict]]:
+    """Extract (text, metadata) for pages start..end-1 of a PDF."""
+    with fitz.open(file_path) as doc:
+        metadata = _document_metadata(doc)
+        return [
+            (doc[number].get_text(), {"page": number, "total_pages": len(doc), **metadata})
+            for number in range(start, end)
+        ]
+
+
+def iter_pdf_pages(file_path: str, pages_per_range: int = PDF_PAGES_PER_RANGE) -> Iterator[tuple[str, dict]]:
+    """
+    Yield (text, metadata) for every page of a PDF, in page order.
+
+    Small files are parsed in this process one page at a time. Larger ones are
+    split into page ranges parsed in parallel worker processes; only as many
+    ranges are in flight as fit in PDF_MEMORY_CAP_BYTES, judged by the size of
+    the ranges parsed so far, so memory stays flat however long the file is.
+    """
+    with fitz.open(file_path) as doc:
+        page_count = len(doc)
+        if page_count <= pages_per_range:
+            metadata = _document_metadata(doc)
+            for number in range(page_count):
+                yield doc[number].get_text(), {"page": number, "total_pages": page_count, **metadata}
+            return
+
+    pool = _get_parse_pool()
+    ranges = deque((start, min(start + pages_per_range, page_count)) for start in range(0, page_count, pages_per_range))
+    in_flight = deque()
+    max_in_flight = PDF_PARSE_WORKERS
+    try:
+        while ranges or in_flight:
+            while ranges and len(in_flight) < max_in_flight:
+                start, end = ranges.popleft()
+                in_flight.append(pool.submit(parse_page_range, file_path, start, end))
+            pages = in_flight.popleft().result()
+            range_bytes = max(sum(len(text) for text, _ in pages), 1)
+            max_in_flight = max(1, min(PDF_PARSE_WORKERS, PDF_MEMORY_CAP_BYTES // range_bytes))
+            yield from pages
+    finally:
+        for future in in_flight:
+            future.cancel()
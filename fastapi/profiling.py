@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import cProfile
+import functools
+import contextvars
+import threading
+import tracemalloc
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# Profile every sync instead of only those started with /auth?profile=true
+PROFILE_ALL_SYNCS = os.getenv("PROFILE_ALL_SYNCS", "false").lower() == "true"
+
+_current_profile: ContextVar[Optional["ProfileSession"]] = ContextVar("current_profile", default=None)
+# Thread whose outermost stage in this context is under cProfile; stages nested in it are only timed
+_profiled_thread: ContextVar[Optional[int]] = ContextVar("profiled_thread", default=None)
+# tracemalloc is process-wide, so it runs while at least one stage is being profiled
+_tracemalloc_users = 0
+_tracemalloc_lock = threading.Lock()
+TRACEMALLOC_TOP_ALLOCATIONS = 10
+
+
+def _take_snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+
+
+def _start_tracemalloc() -> tracemalloc.Snapshot:
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracemalloc_users += 1
+    return _take_snapshot()
+
+
+def _stop_tracemalloc(started: tracemalloc.Snapshot) -> dict:
+    """
+    Compare a snapshot with the one taken when the stage started. The peak is not
+    reported: it is process-wide, and resetting it would break other stages.
+    """
+    global _tracemalloc_users
+    differences = _take_snapshot().compare_to(started, "lineno")
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0:
+            tracemalloc.stop()
+    return {
+        "net_bytes": sum(stat.size_diff for stat in differences),
+        "top_allocations": [
+            {"location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}", "size_diff": stat.size_diff, "count_diff": stat.count_diff}
+            for stat in differences[:TRACEMALLOC_TOP_ALLOCATIONS]
+        ],
+    }
+
+
+def profile_directory(processing_id: str) -> str:
+    return os.path.join(PROFILE_DIR, os.path.basename(processing_id))
+
+
+class ProfileSession:
+    """
+    Collects per-stage profiles of one sync under PROFILE_DIR/<processing_id>.
+
+    Every stage writes <stem>.json with its wall time, CPU time and the memory it
+    left allocated (a tracemalloc snapshot diff, with the lines that allocated
+    most). The outermost stage of each thread also writes <stem>.prof with cProfile
+    stats of that thread, which include any stages nested in it. Stages from
+    several workers can share a processing_id without overwriting each other.
+    """
+
+    def __init__(self, processing_id: str):
+        self.processing_id = processing_id
+        self.directory = profile_directory(processing_id)
+        os.makedirs(self.directory, exist_ok=True)
+
+    @contextmanager
+    def stage(self, name: str):
+        started_at = time.time()
+        stem = f"{started_at:.6f}-{os.getpid()}-{threading.get_ident()}-{name}"
+        profiler, token = None, None
+        if _profiled_thread.get() != threading.get_ident():
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                token = _profiled_thread.set(threading.get_ident())
+            except ValueError:
+                # Another thread holds the profiler, which is process-wide from Python 3.12
+                profiler = None
+        memory_start = _start_tracemalloc()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = repr(e)
+            raise
+        finally:
+            wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+            memory = _stop_tracemalloc(memory_start)
+            if profiler is not None:
+                profiler.disable()
+                _profiled_thread.reset(token)
+                profiler.dump_stats(os.path.join(self.directory, f"{stem}.prof"))
+            with open(os.path.join(self.directory, f"{stem}.json"), "w") as stage_file:
+                json.dump({
+                    "stage": name,
+                    "started_at": started_at,
+                    "wall_seconds": wall,
+                    "cpu_seconds": cpu,  # process-wide, so it includes other threads running at the time
+                    # Also process-wide: allocations of other threads running at the time count too
+                    "tracemalloc_net_bytes": memory["net_bytes"],
+                    "tracemalloc_top_allocations": memory["top_allocations"],
+                    "cprofile": f"{stem}.prof" if profiler is not None else None,
+                    "error": error,
+                }, stage_file, indent=2)
+
+
+@contextmanager
+def profiling(processing_id: str, enabled: bool):
+    """
+    Profile the stages run in this context if enabled. asyncio.to_thread carries
+    the context into its thread; executor pools do not, so work submitted to them
+    must go through submit_in_context to be profiled.
+    """
+    if not enabled:
+        yield
+        return
+    token = _current_profile.set(ProfileSession(processing_id))
+    try:
+        yield
+    finally:
+        _current_profile.reset(token)
+
+
+def submit_in_context(executor: Executor, fn, *args, **kwargs) -> Future:
+    """Submit fn to an executor to run in a copy of the caller's context, profiling session included."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def profile_stage(name: str):
+    """Decorator that profiles a function as a stage when a profile is active, and does nothing otherwise."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            session = _current_profile.get()
+            if session is None:
+                return func(*args, **kwargs)
+            with session.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def load_profile(processing_id: str) -> Optional[list[dict]]:
+    """Return the recorded stages of a sync in start order, or None if it was not profiled."""
+    directory = profile_directory(processing_id)
+    if not os.path.isdir(directory):
+        return None
+    stages = []
+    for name in os.listdir(directory):
+        if name.endswith(".json"):
+            with open(os.path.join(directory, name)) as stage_file:
+                stages.append(json.load(stage_file))
+    return sorted(stages, key=lambda stage: stage["started_at"])
@@ -1,16 +1,48 @@
 import os
 import re
-from uuid import uuid4
-from typing import Callable
-from qdrant_client import QdrantClient
-from langchain_core.documents.base import Document
-from langchain_mistralai import MistralAIEmbeddings
+import json
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from uuid import UUID, uuid4, uuid5
+from typing import Callable, Optional, TYPE_CHECKING
+from profiling import profile_stage
+from corpus_version import bump_corpus_version
 from qdrant_client.models import (
     VectorParams,
     Distance,
-    PointStruct
+    PointStruct,
+    PayloadSchemaType,
+    Filter,
+    FieldCondition,
+    MatchValue,
+    PointIdsList,
+    IsEmptyCondition,
+    PayloadField,
 )
 
+if TYPE_CHECKING:
+    from langchain_core.documents.base import Document
+    from langchain_core.embeddings import Embeddings
+
+# "full" stores the whole chunk in the point payload, "compact" only the fields used
+# for filtering and citations, with the text kept in the local chunk store
+QDRANT_PAYLOAD_MODE = os.getenv("QDRANT_PAYLOAD_MODE", "full")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+SNAPSHOT_PAGE_SIZE = int(os.getenv("SNAPSHOT_PAGE_SIZE", "2000"))
+SNAPSHOT_IMPORT_BATCH_SIZE = int(os.getenv("SNAPSHOT_IMPORT_BATCH_SIZE", "500"))
+SNAPSHOT_IMPORT_PARALLEL = int(os.getenv("SNAPSHOT_IMPORT_PARALLEL", "4"))
+
+# Point IDs of chunks tagged with a file ID and version are derived from them in this namespace
+POINT_ID_NAMESPACE = UUID("6f0d2b7e-43c1-5a8e-9b2d-1c7e4f3a9d05")
+# Payload fields that tie a point, or one of its references, to the file version it came from
+IDENTITY_FIELDS = ("file_id", "version")
+
+_vector_db = None
+_vector_db_lock = threading.Lock()
+# Serialises reference updates when there is no dedup index to lock
+_local_references_lock = threading.Lock()
+
 def extract_file_details(file_path):
     # Extract the file name from the path
     file_name = os.path.basename(file_path)
@@ -25,80 +57,572 @@ def extract_file_details(file_path):
     return {"prefix": prefix, "filename": cleaned_file_name}
 
 
+def chunk_point_id(metadata: dict, collection: str) -> str:
+    """
+    The point ID of a chunk in collection, from its metadata. For chunks tagged by
+    process_file it is derived from the collection, file ID, version and chunk number,
+    so ingesting the same version of a file again overwrites its points instead of
+    adding new ones, while a re-index collection gets IDs of its own (the chunk
+    store is keyed by ID).
+    """
+    if "file_id" not in metadata:
+        return str(uuid4())
+    return str(uuid5(POINT_ID_NAMESPACE, f"{collection}:{metadata['file_id']}:{metadata['version']}:{metadata['chunk']}"))
+
+
+def chunk_reference(doc: "Document", file_details: dict) -> dict:
+    """The {"source", "page"} a chunk is cited by, with the file ID and version it came from."""
+    reference = {"source": file_details["filename"], "page": doc.metadata["page"]}
+    reference.update({key: doc.metadata[key] for key in IDENTITY_FIELDS if key in doc.metadata})
+    return reference
+
+
 class QdrantDB:
-    def __init__(self):
-        QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
-        QDRANT_URL = os.getenv("QDRANT_URL")
+    def __init__(self, collection_name: str = None):
         QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION")
-        MISTRALAI_API_KEY=os.getenv("MISTRALAI_API_KEY")
-        self.client = QdrantClient(
-            url=QDRANT_URL,
-            api_key=QDRANT_API_KEY,
-            https=True,
-            timeout=60,
-        )
-        
-        self.collection_name = QDRANT_COLLECTION
-        self.embedding_function: MistralAIEmbeddings = MistralAIEmbeddings(
-                model="mistral-embed",
-                api_key=MISTRALAI_API_KEY
-            )
-        self.vector_size = 1024  # Adjust vector size as needed
-        # self.vector_size = 1536
+        from rfp_common.clients import get_qdrant_client
+        from rfp_common.embeddings import get_embedding_backend
+        # Shared by every QdrantDB in the process, e.g. the live and re-index collections
+        self.client = get_qdrant_client()
+
+        # QDRANT_COLLECTION may name an alias that re-indexing points at a versioned collection
+        self.collection_name = collection_name or QDRANT_COLLECTION
+        # EMBEDDING_BACKEND picks the model; new collections take its vector size
+        backend = get_embedding_backend()
+        self.embedding_model = backend.name
+        self.embedding_function: "Embeddings" = backend.embeddings
+        self.vector_size = backend.vector_size
+        self.payload_mode = QDRANT_PAYLOAD_MODE
+        from chunk_dedup import CHUNK_DEDUP_ENABLED, get_chunk_deduplicator
+        self.deduplicator = get_chunk_deduplicator() if CHUNK_DEDUP_ENABLED else None
+
+    def resolve_collection(self) -> str:
+        """The collection behind collection_name, which may be an alias that re-indexing switches."""
+        for alias in self.client.get_aliases().aliases:
+            if alias.alias_name == self.collection_name:
+                return alias.collection_name
+        return self.collection_name
+
+    def collection_or_alias_exists(self, name: str) -> bool:
+        if self.client.collection_exists(name):
+            return True
+        return any(alias.alias_name == name for alias in self.client.get_aliases().aliases)
 
     def create_collection(self):
         """
         Creates a collection if it does not exist.
         """
-        if not self.client.collection_exists(self.collection_name):
+        if not self.collection_or_alias_exists(self.collection_name):
             self.client.create_collection(
                 collection_name=self.collection_name,
                 vectors_config=VectorParams(
                     size=self.vector_size, distance=Distance.COSINE
                 ),
             )
+            if self.payload_mode == "compact":
+                self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name="rfp_status",
+                    field_schema=PayloadSchemaType.KEYWORD,
+                )
+            # Re-ingesting or deleting a file looks its points up by file ID
+            self.client.create_payload_index(
+                collection_name=self.collection_name,
+                field_name="file_id",
+                field_schema=PayloadSchemaType.KEYWORD,
+            )
+            if self.deduplicator is not None:
+                # Left over if a collection of the same name was deleted outside reindex
+                self.deduplicator.index.drop_collection(self.collection_name)
             # return False
         else:
             print(f"Collection {self.collection_name} already exists.")
             # return True
 
-    def add_documents(self, documents: list[Document], processing_id: str, progress_callback: Callable[[str, int, int, str], None]):
+    def embed_texts(self, texts: list[str], on_batch: Callable[[int], None] = None) -> list[list[float]]:
+        """
+        Embed texts in batches, reusing cached embeddings of texts seen before.
+        on_batch is called with the number of texts embedded so far.
+        """
+        from embedding_cache import get_embedding_cache, text_hash
+
+        cache = get_embedding_cache()
+        vectors = []
+        for start in range(0, len(texts), EMBED_BATCH_SIZE):
+            batch = texts[start:start + EMBED_BATCH_SIZE]
+            cached = cache.get_many(self.embedding_model, batch)
+            missing = list({text_hash(text): text for text in batch if text_hash(text) not in cached}.values())
+            if missing:
+                missing_vectors = self.embedding_function.embed_documents(missing)
+                cache.put_many(self.embedding_model, missing, missing_vectors)
+                cached.update({text_hash(text): vector for text, vector in zip(missing, missing_vectors)})
+            vectors.extend(cached[text_hash(text)] for text in batch)
+            if on_batch:
+                on_batch(len(vectors))
+        return vectors
+
+    @profile_stage("add_documents")
+    def add_documents(self, documents: "list[Document]", processing_id: str, progress_callback: Callable[[str, int, int, str], None]) -> int:
         """
         Add a list of documents with unique IDs to the collection.
-        Each document should be embedded and stored with its metadata.
-        """
-        vector_metadata_content = []
-        embedded_count = 0
-        for doc in documents:
-            doc_vector = self.embedding_function.embed_query(doc.page_content)
-            file_details = extract_file_details(doc.metadata["source"])
-            id = str(uuid4())
-            doc.metadata["metadata"] = {
-                "id": id,
-                "source": file_details["filename"],
-                "rfp_status": file_details["prefix"],
-                "page": doc.metadata["page"],
-                "page_content": doc.page_content
-            }
-            embedded_count += 1
-            vector_metadata_content.append([doc_vector, doc.metadata, id])
-            progress_callback(processing_id, embedded_count, len(documents), "Embedding Documents")
-
-        # Upsert the documents to the collection
-        self.client.upsert(
-            collection_name=self.collection_name,
-            points=[
-                PointStruct(
-                    id=vector_metadata[2], vector=vector_metadata[0], payload=vector_metadata[1]
+        Each document should be embedded and stored with its metadata. A near-duplicate
+        of a stored chunk, or of an earlier one in the list, is not embedded but added
+        to the "references" of the point it duplicates. Chunks stored by an earlier
+        attempt at the same file version are left as they are. Returns the number of
+        points holding the documents' own chunks, stored before or now.
+        """
+        collection = self.resolve_collection()
+        ids = [chunk_point_id(doc.metadata, collection) for doc in documents]
+        details = [extract_file_details(doc.metadata["source"]) for doc in documents]
+        chunks = [(id, file_details["prefix"], doc.page_content) for id, file_details, doc in zip(ids, details, documents)]
+        # Embedded outside the references lock: the chunks that are not duplicates as the index stands now
+        duplicates = self.deduplicator.find_duplicates(collection, chunks)[0] if self.deduplicator is not None else {}
+        to_embed = [i for i, id in enumerate(ids) if id not in duplicates]
+        vectors = dict(zip(
+            (ids[i] for i in to_embed),
+            self.embed_texts(
+                [documents[i].page_content for i in to_embed],
+                lambda count: progress_callback(processing_id, count, len(to_embed), "Embedding Documents"),
+            ),
+        ))
+
+        # Looking up, storing and recording the new points is atomic across processes sharing the dedup index
+        with self._references_lock() if self.deduplicator is not None else nullcontext():
+            new_entries = []
+            if self.deduplicator is not None:
+                # Looked up again: another process may have stored a copy in the meantime
+                duplicates, new_entries = self.deduplicator.find_duplicates(collection, chunks)
+                self._collapse_into_stored_points(ids, details, documents, duplicates, new_entries, collection)
+
+            # Copies collapsed into points of this batch, as chunk_reference dicts
+            unique = [i for i, id in enumerate(ids) if id not in duplicates]
+            unique_ids = {ids[i] for i in unique}
+            references = {}
+            for id, file_details, doc in zip(ids, details, documents):
+                if duplicates.get(id) in unique_ids:
+                    references.setdefault(duplicates[id], []).append(chunk_reference(doc, file_details))
+
+            # First copies of points that turned out to be gone
+            late = [i for i in unique if ids[i] not in vectors]
+            if late:
+                vectors.update(zip((ids[i] for i in late), self.embed_texts([documents[i].page_content for i in late])))
+
+            vector_metadata_content = []
+            stored_chunks = []
+            for i in unique:
+                doc, file_details, id = documents[i], details[i], ids[i]
+                if self.payload_mode == "compact":
+                    payload = {
+                        "source": file_details["filename"],
+                        "rfp_status": file_details["prefix"],
+                        "page": doc.metadata["page"],
+                        **{key: doc.metadata[key] for key in IDENTITY_FIELDS if key in doc.metadata},
+                    }
+                    stored_chunks.append((id, doc.page_content, doc.metadata))
+                else:
+                    doc.metadata["metadata"] = {
+                        "id": id,
+                        "source": file_details["filename"],
+                        "rfp_status": file_details["prefix"],
+                        "page": doc.metadata["page"],
+                        "page_content": doc.page_content
+                    }
+                    payload = doc.metadata
+                if id in references:
+                    payload["references"] = _merge_references([chunk_reference(doc, file_details)], references.pop(id))
+                vector_metadata_content.append([vectors[id], payload, id])
+
+            if stored_chunks:
+                from rfp_common.chunk_store import get_chunk_store
+                get_chunk_store().put_many(stored_chunks)
+
+            # Upsert the documents to the collection
+            if vector_metadata_content:
+                self.client.upsert(
+                    collection_name=self.collection_name,
+                    points=[
+                        PointStruct(
+                            id=vector_metadata[2], vector=vector_metadata[0], payload=vector_metadata[1]
+                        )
+                        for idx, vector_metadata in enumerate(vector_metadata_content)
+                    ],
                 )
-                for idx, vector_metadata in enumerate(vector_metadata_content)
-            ],
+            if new_entries:
+                self.deduplicator.record(collection, new_entries)
+        # Retire the chat UI's cached answers for the affected statuses
+        bump_corpus_version({file_details["prefix"] for file_details in details})
+        progress_callback(processing_id, len(documents), len(documents), "Inserting Documents in DB")
+        return len(unique) + sum(1 for id, target in duplicates.items() if id == target)
+
+    def _primary_reference(self, payload: dict) -> dict:
+        fields = payload if self.payload_mode == "compact" else payload["metadata"]
+        reference = {"source": fields["source"], "page": fields["page"]}
+        reference.update({key: payload[key] for key in IDENTITY_FIELDS if key in payload})
+        return reference
+
+    def _rfp_status(self, payload: dict) -> str:
+        return (payload if self.payload_mode == "compact" else payload["metadata"])["rfp_status"]
+
+    def _collapse_into_stored_points(self, ids: list[str], details: list[dict], documents: "list[Document]", duplicates: dict[str, str], new_entries: list, collection: str):
+        """
+        Add the chunks that duplicate stored points to those points' references. A
+        point that is gone although the index still lists it, e.g. because its
+        collection was recreated, is forgotten, and its first copy becomes a point
+        again with the other copies collapsed into it. Updates duplicates and
+        new_entries in place. Called under the references lock.
+        """
+        from chunk_dedup import minhash_signature
+
+        batch_points = {id for id in ids if id not in duplicates}
+        stored = {}
+        for id, file_details, doc in zip(ids, details, documents):
+            if id in duplicates and duplicates[id] not in batch_points:
+                stored.setdefault(duplicates[id], []).append(chunk_reference(doc, file_details))
+        if not stored:
+            return
+        missing = self._add_references(stored)
+        if not missing:
+            return
+        self.deduplicator.forget(collection, list(missing))
+        replacements = {}
+        for i, id in enumerate(ids):
+            target = duplicates.get(id)
+            if target not in missing:
+                continue
+            if target in replacements:
+                duplicates[id] = replacements[target]
+            else:
+                replacements[target] = id
+                del duplicates[id]
+                new_entries.append((id, details[i]["prefix"], minhash_signature(documents[i].page_content)))
+
+    def _references_lock(self):
+        """Serialises read-modify-writes of point references, across processes when they share a dedup index."""
+        return self.deduplicator.index.lock() if self.deduplicator is not None else _local_references_lock
+
+    def _add_references(self, references: dict[str, list[dict]]) -> set[str]:
+        """Add references to stored points, under the references lock. Returns the IDs of those no longer in the collection."""
+        points = self.client.retrieve(collection_name=self.collection_name, ids=list(references), with_payload=True)
+        for point in points:
+            existing = point.payload.get("references") or [self._primary_reference(point.payload)]
+            merged = _merge_references(existing, references[str(point.id)])
+            if len(merged) == len(existing):
+                continue  # e.g. a retried ingestion adding the same copies again
+            self.client.set_payload(
+                collection_name=self.collection_name,
+                payload={"references": merged},
+                points=[point.id],
+            )
+        return set(references) - {str(point.id) for point in points}
+
+    def _set_references(self, point, references: list[dict]):
+        """Replace a point's references, making the first one its source, page, file ID and version."""
+        primary = references[0]
+        payload = {"references": references, **{key: primary[key] for key in IDENTITY_FIELDS if key in primary}}
+        if self.payload_mode == "compact":
+            payload.update(source=primary["source"], page=primary["page"])
+        else:
+            payload["metadata"] = {**point.payload["metadata"], "source": primary["source"], "page": primary["page"]}
+        self.client.set_payload(collection_name=self.collection_name, payload=payload, points=[point.id])
+
+    def delete_file_points(self, file_id: str, keep_version: str = None, filename: str = None, rfp_status: str = None) -> int:
+        """
+        Remove a file from the collection, or only its versions other than keep_version.
+        Points only it contributed are deleted, with their chunk texts in compact mode;
+        points it shares with other files only lose its references. Points written
+        before chunks carried a file ID are matched by filename and rfp_status, if
+        given. Returns the number of points deleted.
+        """
+        prefix = "" if self.payload_mode == "compact" else "metadata."
+        conditions = [
+            FieldCondition(key="file_id", match=MatchValue(value=file_id)),
+            FieldCondition(key="references[].file_id", match=MatchValue(value=file_id)),
+        ]
+        if filename is not None:
+            conditions.append(Filter(
+                must=[
+                    FieldCondition(key=f"{prefix}rfp_status", match=MatchValue(value=rfp_status)),
+                    IsEmptyCondition(is_empty=PayloadField(key="file_id")),
+                ],
+                should=[
+                    FieldCondition(key=f"{prefix}source", match=MatchValue(value=filename)),
+                    FieldCondition(key="references[].source", match=MatchValue(value=filename)),
+                ],
+            ))
+
+        def removed(reference: dict, point_rfp_status: str) -> bool:
+            if "file_id" in reference:
+                return reference["file_id"] == file_id and reference.get("version") != keep_version
+            return filename is not None and reference["source"] == filename and point_rfp_status == rfp_status
+
+        point_ids = []
+        offset = None
+        with self._references_lock():
+            while True:
+                points, offset = self.client.scroll(
+                    collection_name=self.collection_name, scroll_filter=Filter(should=conditions), limit=1000, offset=offset, with_payload=True
+                )
+                for point in points:
+                    references = point.payload.get("references") or [self._primary_reference(point.payload)]
+                    point_rfp_status = self._rfp_status(point.payload)
+                    remaining = [reference for reference in references if not removed(reference, point_rfp_status)]
+                    if len(remaining) == len(references):
+                        continue  # only holds the version being kept
+                    if remaining:
+                        self._set_references(point, remaining)
+                    else:
+                        point_ids.append(str(point.id))
+                if offset is None:
+                    break
+            self._delete_points(point_ids)
+        self._forget_points(point_ids)
+        if rfp_status is not None:
+            bump_corpus_version({rfp_status})
+        return len(point_ids)
+
+    def _delete_points(self, point_ids: list[str]):
+        """
+        Delete points from the collection. Called under the references lock, so no
+        copy can be collapsed into a point between deciding to delete it and deleting it.
+        """
+        if point_ids:
+            self.client.delete(collection_name=self.collection_name, points_selector=PointIdsList(points=point_ids))
+
+    def _forget_points(self, point_ids: list[str]):
+        """Drop the chunk texts in compact mode and the dedup signatures of deleted points, once the references lock is released."""
+        if not point_ids:
+            return
+        if self.payload_mode == "compact":
+            from rfp_common.chunk_store import get_chunk_store
+            get_chunk_store().delete_many(point_ids)
+        if self.deduplicator is not None:
+            self.deduplicator.forget(self.resolve_collection(), point_ids)
+
+    def tag_legacy_points(self, identities: dict[tuple[str, str], Optional[tuple[str, str]]], prune: bool = False) -> dict[str, int]:
+        """
+        Give the points written before chunks carried a file ID the ID and version of
+        their file. identities maps (filename, rfp_status) to (file_id, version), or
+        to None for a name that cannot be attributed to one file. References to names
+        missing from identities are left alone, or removed with prune, deleting the
+        points left without any. Returns the number of points "updated", "deleted"
+        and still "unresolved".
+        """
+        counts = {"updated": 0, "deleted": 0, "unresolved": 0}
+        legacy = Filter(must=[IsEmptyCondition(is_empty=PayloadField(key="file_id"))])
+        point_ids, pruned_statuses = [], set()
+        offset = None
+        with self._references_lock():
+            while True:
+                points, offset = self.client.scroll(
+                    collection_name=self.collection_name, scroll_filter=legacy, limit=1000, offset=offset, with_payload=True
+                )
+                for point in points:
+                    references = point.payload.get("references") or [self._primary_reference(point.payload)]
+                    point_rfp_status = self._rfp_status(point.payload)
+                    updated = []
+                    for reference in references:
+                        key = (reference["source"], point_rfp_status)
+                        if "file_id" not in reference and identities.get(key):
+                            file_id, version = identities[key]
+                            reference = {**reference, "file_id": file_id, "version": version}
+                        elif "file_id" not in reference and key not in identities and prune:
+                            pruned_statuses.add(point_rfp_status)
+                            continue
+                        updated.append(reference)
+                    if not updated:
+                        point_ids.append(str(point.id))
+                        continue
+                    if updated != references:
+                        self._set_references(point, updated)
+                        counts["updated"] += 1
+                    if "file_id" not in updated[0]:
+                        counts["unresolved"] += 1
+                if offset is None:
+                    break
+            self._delete_points(point_ids)
+        self._forget_points(point_ids)
+        counts["deleted"] = len(point_ids)
+        if pruned_statuses:
+            bump_corpus_version(pruned_statuses)
+        return counts
+
+    def export_snapshot(self, directory: str, page_size: int = SNAPSHOT_PAGE_SIZE) -> int:
+        """
+        Export the collection to a bundle in directory: vectors.npy (float16 matrix),
+        payloads.jsonl (one {"id", "payload"} line per row, plus "chunk" with the
+        stored text in compact mode), ingest_manifest.json (the ingest manifest's
+        entries and stats, so the next sync only fetches what changed since) and
+        manifest.json. Returns the number of points.
+        """
+        import numpy as np
+        from rfp_common.chunk_store import get_chunk_store
+        from ingest_manifest import get_ingest_manifest
+
+        os.makedirs(directory, exist_ok=True)
+        vectors_config = self.client.get_collection(self.collection_name).config.params.vectors
+        capacity = self.client.count(collection_name=self.collection_name, exact=True).count
+        vectors = np.lib.format.open_memmap(
+            os.path.join(directory, "vectors.npy"), mode="w+", dtype=np.float16, shape=(capacity, vectors_config.size)
         )
-        progress_callback(processing_id, embedded_count, len(documents), "Inserting Documents in DB")
+
+        exported = 0
+        offset = None
+        with open(os.path.join(directory, "payloads.jsonl"), "w") as payload_file:
+            while exported < capacity:
+                points, offset = self.client.scroll(
+                    collection_name=self.collection_name,
+                    limit=page_size,
+                    offset=offset,
+                    with_payload=True,
+                    with_vectors=True,
+                )
+                # Points added while exporting are left out rather than overflowing the matrix
+                points = points[:capacity - exported]
+                vectors[exported:exported + len(points)] = np.asarray([p.vector for p in points], dtype=np.float16)
+                chunks = get_chunk_store().get_many([str(p.id) for p in points]) if self.payload_mode == "compact" else {}
+                for point in points:
+                    record = {"id": point.id, "payload": point.payload}
+                    if str(point.id) in chunks:
+                        record["chunk"] = chunks[str(point.id)]
+                    payload_file.write(json.dumps(record) + "\n")
+                exported += len(points)
+                if offset is None:
+                    break
+        vectors.flush()
+
+        ingest_manifest = get_ingest_manifest()
+        with open(os.path.join(directory, "ingest_manifest.json"), "w") as ingest_manifest_file:
+            json.dump({"files": ingest_manifest.all(), "stats": ingest_manifest.all_stats()}, ingest_manifest_file)
+        with open(os.path.join(directory, "manifest.json"), "w") as manifest_file:
+            json.dump({
+                "collection": self.collection_name,
+                "count": exported,
+                "vector_size": vectors_config.size,
+                "distance": vectors_config.distance,
+                "dtype": "float16",
+                "embedding_model": self.embedding_model,
+                "payload_mode": self.payload_mode,
+            }, manifest_file, indent=2)
+        return exported
+
+    def import_snapshot(self, directory: str, batch_size: int = SNAPSHOT_IMPORT_BATCH_SIZE, parallel: int = SNAPSHOT_IMPORT_PARALLEL) -> int:
+        """
+        Upload a bundle written by export_snapshot into this collection, creating it
+        if needed, with several batches in flight at once. Point IDs are derived
+        again for this collection, the chunk texts and their vectors seed the
+        embedding cache and the dedup index, and the bundle's ingest manifest is
+        loaded once the points are in. Returns the number of points.
+        """
+        import numpy as np
+        from chunk_dedup import minhash_signature
+        from rfp_common.chunk_store import get_chunk_store
+        from embedding_cache import get_embedding_cache
+        from ingest_manifest import get_ingest_manifest
+
+        with open(os.path.join(directory, "manifest.json")) as manifest_file:
+            manifest = json.load(manifest_file)
+        self._check_snapshot_config(manifest)
+        self.vector_size = manifest["vector_size"]
+        self.create_collection()
+        collection = self.resolve_collection()
+        vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+
+        def upload(start: int, records: list[dict]):
+            points, chunks, texts, text_vectors, dedup_entries = [], [], [], [], []
+            for record, vector in zip(records, vectors[start:start + len(records)].astype(np.float32).tolist()):
+                payload, chunk = record["payload"], record.get("chunk")
+                if chunk:
+                    metadata, text = chunk["metadata"], chunk["text"]
+                elif "metadata" in payload:
+                    metadata, text = payload, payload["metadata"]["page_content"]
+                else:  # a compact point whose text was missing from the chunk store
+                    metadata, text = {}, None
+                # Points of untagged chunks keep their random ID
+                point_id = chunk_point_id(metadata, collection) if "file_id" in metadata and "chunk" in metadata else record["id"]
+                if chunk:
+                    chunks.append((point_id, text, metadata))
+                elif "metadata" in payload:
+                    payload["metadata"]["id"] = point_id
+                points.append(PointStruct(id=point_id, vector=vector, payload=payload))
+                if text:
+                    texts.append(text)
+                    text_vectors.append(vector)
+                    if self.deduplicator is not None:
+                        dedup_entries.append((point_id, self._rfp_status(payload), minhash_signature(text)))
+            if chunks:
+                get_chunk_store().put_many(chunks)
+            self.client.upsert(collection_name=self.collection_name, points=points)
+            # Re-ingesting unchanged text then embeds nothing, and new boilerplate collapses into these points
+            get_embedding_cache().put_many(self.embedding_model, texts, text_vectors)
+            if dedup_entries:
+                self.deduplicator.record(collection, dedup_entries)
+
+        imported = 0
+        with ThreadPoolExecutor(max_workers=parallel) as executor, open(os.path.join(directory, "payloads.jsonl")) as payload_file:
+            futures = []
+            records = []
+            for line in payload_file:
+                records.append(json.loads(line))
+                if len(records) == batch_size:
+                    futures.append(executor.submit(upload, imported, records))
+                    imported += len(records)
+                    records = []
+                # Keep memory bounded by not queueing far ahead of the uploads
+                if len(futures) >= parallel * 2:
+                    futures.pop(0).result()
+            if records:
+                futures.append(executor.submit(upload, imported, records))
+                imported += len(records)
+            for future in futures:
+                future.result()
+
+        ingest_manifest_path = os.path.join(directory, "ingest_manifest.json")
+        if os.path.exists(ingest_manifest_path):  # bundles exported before it was added lack it
+            with open(ingest_manifest_path) as ingest_manifest_file:
+                state = json.load(ingest_manifest_file)
+            get_ingest_manifest().restore(state["files"], state["stats"])
+        return imported
+
+    def _check_snapshot_config(self, manifest: dict):
+        """Raise ValueError before anything is written if a bundle cannot go into this collection."""
+        if manifest["embedding_model"] != self.embedding_model:
+            raise ValueError(f"Snapshot was embedded with {manifest['embedding_model']}, not {self.embedding_model}")
+        if manifest["payload_mode"] != self.payload_mode:
+            raise ValueError(f"Snapshot has {manifest['payload_mode']} payloads, not {self.payload_mode}; set QDRANT_PAYLOAD_MODE to match")
+        if self.collection_or_alias_exists(self.collection_name):
+            vectors_config = self.client.get_collection(self.collection_name).config.params.vectors
+            size, distance = vectors_config.size, vectors_config.distance
+        else:
+            size, distance = manifest["vector_size"], Distance.COSINE  # as create_collection makes it
+        if (size, distance) != (manifest["vector_size"], manifest["distance"]):
+            raise ValueError(
+                f"Collection {self.collection_name} has {size}-dimensional {distance} vectors, "
+                f"the snapshot {manifest['vector_size']}-dimensional {manifest['distance']} ones"
+            )
+
+def _merge_references(existing: list[dict], added: list[dict]) -> list[dict]:
+    """Append the references that are not already listed, keeping the order."""
+    merged = list(existing)
+    for reference in added:
+        if reference not in merged:
+            merged.append(reference)
+    return merged
+
+
+def get_vector_db() -> QdrantDB:
+    """Return the process-wide QdrantDB, creating it on first use."""
+    global _vector_db
+    with _vector_db_lock:
+        if _vector_db is None:
+            _vector_db = QdrantDB()
+        return _vector_db
 
 def initialiseVectorDatabase():
-    qdrant_class = QdrantDB()
+    qdrant_class = get_vector_db()
     qdrant_class.create_collection()
+    if qdrant_class.deduplicator is not None and qdrant_class.resolve_collection() != qdrant_class.collection_name:
+        # The dedup index used to be keyed by the alias; those entries may point at any collection it named
+        qdrant_class.deduplicator.index.drop_collection(qdrant_class.collection_name)
 
 
 
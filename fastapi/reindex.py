@@ -0,0 +1,186 @@
+"""
+Zero-downtime re-index. Run with `python -m reindex` from this folder.
+
+Builds a new versioned collection (QDRANT_COLLECTION + "_v<timestamp>") from the
+files downloaded to the assets folder, reusing the parse cache and the embedding cache,
+validates it, and then atomically points the QDRANT_COLLECTION alias at it. The
+API and the chat UI both address QDRANT_COLLECTION, so they switch over without
+a restart. Collections from older runs are garbage-collected afterwards.
+
+Files ingested by a sync while the re-index is running land in the old collection;
+run the re-index when no sync is in progress.
+"""
+import os
+import logging
+import argparse
+from datetime import datetime, timezone
+from pathlib import Path
+from dotenv import load_dotenv
+
+env_path = Path('.env')
+if env_path.exists():
+    load_dotenv(dotenv_path=env_path)
+
+from qdrant_client.models import (
+    CreateAlias,
+    CreateAliasOperation,
+    DeleteAlias,
+    DeleteAliasOperation,
+)
+from qdrant import QdrantDB
+from file_embedding import iter_asset_files, process_file
+from ingest_manifest import entry_version, get_ingest_manifest
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+REINDEX_KEEP_PREVIOUS = int(os.getenv("REINDEX_KEEP_PREVIOUS", "1"))
+# Queries that must return results from the new collection before it goes live, separated by "|"
+REINDEX_SAMPLE_QUERIES = [q for q in os.getenv("REINDEX_SAMPLE_QUERIES", "").split("|") if q]
+
+
+class ReindexError(Exception):
+    pass
+
+
+def versioned_collection_name(alias: str) -> str:
+    return f"{alias}_v{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}"
+
+
+def get_alias_target(db: QdrantDB, alias: str):
+    for existing in db.client.get_aliases().aliases:
+        if existing.alias_name == alias:
+            return existing.collection_name
+    return None
+
+
+def build_collection(db: QdrantDB) -> int:
+    """Fill db's collection from the assets folder and return the number of points written."""
+    db.create_collection()
+    manifest = get_ingest_manifest()
+    written = 0
+    for file_path, file_id in iter_asset_files():
+        file_name = os.path.basename(file_path)
+        # Drive files keep the version the manifest records for them
+        entry = manifest.get(file_id)
+        version = entry_version(entry) if entry else None
+        try:
+            written += process_file(file_path, "reindex", lambda *args: None, file_id=file_id, version=version, db=db)
+        except Exception as e:
+            logger.error(f"Error processing file {file_name}: {e}")
+            # Take out the batches inserted before the error, which written does not count
+            db.delete_file_points(file_id)
+            continue
+        logger.info(f"Indexed {file_name} ({written} points so far)")
+    return written
+
+
+def validate_collection(db: QdrantDB, expected_points: int, sample_queries: list[str], live_collection: str = None):
+    """Check the point count and that every sample query returns results."""
+    count = db.client.count(collection_name=db.collection_name, exact=True).count
+    if count != expected_points:
+        raise ReindexError(f"Collection {db.collection_name} has {count} points, expected {expected_points}")
+    if count == 0:
+        raise ReindexError(f"Collection {db.collection_name} is empty")
+
+    for query in sample_queries:
+        vector = db.embedding_function.embed_query(query)
+        points = db.client.query_points(collection_name=db.collection_name, query=vector, limit=3).points
+        if not points:
+            raise ReindexError(f"Sample query '{query}' returned no results from {db.collection_name}")
+        if live_collection:
+            # Only informative: a new embedding model or chunking may legitimately change the ranking
+            live_points = db.client.query_points(collection_name=live_collection, query=vector, limit=3).points
+            overlap = len({p.id for p in points} & {p.id for p in live_points})
+            logger.info(f"Sample query '{query}': {len(points)} results, {overlap} shared with {live_collection}")
+
+
+def is_plain_collection(db: QdrantDB, alias: str) -> bool:
+    return db.client.collection_exists(alias) and get_alias_target(db, alias) is None
+
+
+def check_replaceable(db: QdrantDB, alias: str, replace_collection: bool):
+    """Refuse to turn a plain collection named alias into an alias unless replace_collection is set."""
+    if is_plain_collection(db, alias) and not replace_collection:
+        raise ReindexError(
+            f"'{alias}' is a collection, not an alias. Re-run with --replace-collection to delete it "
+            "and create the alias (chat requests fail for the moment in between)."
+        )
+
+
+def switch_alias(db: QdrantDB, alias: str, new_collection: str, replace_collection: bool = False):
+    """Atomically point alias at new_collection."""
+    check_replaceable(db, alias, replace_collection)
+    if is_plain_collection(db, alias):
+        logger.warning(f"Deleting collection {alias} to replace it with an alias")
+        delete_collection(db, alias)
+
+    operations = []
+    if get_alias_target(db, alias) is not None:
+        operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=alias)))
+    operations.append(CreateAliasOperation(create_alias=CreateAlias(collection_name=new_collection, alias_name=alias)))
+    db.client.update_collection_aliases(change_aliases_operations=operations)
+    logger.info(f"Alias {alias} now points at {new_collection}")
+
+
+def delete_collection(db: QdrantDB, name: str):
+    """Delete a collection together with its chunk texts in the chunk store."""
+    if db.payload_mode == "compact":
+        from rfp_common.chunk_store import get_chunk_store
+        offset = None
+        while True:
+            points, offset = db.client.scroll(collection_name=name, limit=1000, offset=offset, with_payload=False)
+            get_chunk_store().delete_many([str(p.id) for p in points])
+            if offset is None:
+                break
+    db.client.delete_collection(name)
+    if db.deduplicator is not None:
+        db.deduplicator.index.drop_collection(name)
+
+
+def collect_garbage(db: QdrantDB, alias: str, keep_previous: int = REINDEX_KEEP_PREVIOUS):
+    """Delete versioned collections of alias beyond the live one and keep_previous older ones."""
+    live = get_alias_target(db, alias)
+    versions = sorted(
+        (c.name for c in db.client.get_collections().collections if c.name.startswith(f"{alias}_v") and c.name != live),
+        reverse=True,
+    )
+    for name in versions[keep_previous:]:
+        delete_collection(db, name)
+        logger.info(f"Deleted old collection {name}")
+
+
+def reindex(replace_collection: bool = False, keep_previous: int = REINDEX_KEEP_PREVIOUS, sample_queries: list[str] = REINDEX_SAMPLE_QUERIES) -> str:
+    """Build, validate and switch to a new collection. Returns its name."""
+    alias = os.getenv("QDRANT_COLLECTION")
+    new_collection = versioned_collection_name(alias)
+    db = QdrantDB(collection_name=new_collection)
+    live_collection = get_alias_target(db, alias) or (alias if db.client.collection_exists(alias) else None)
+    # Before building, so a refused switch does not leave a collection behind
+    check_replaceable(db, alias, replace_collection)
+
+    logger.info(f"Building {new_collection}")
+    try:
+        written = build_collection(db)
+        validate_collection(db, written, sample_queries, live_collection)
+    except Exception:
+        logger.error(f"Re-index failed, {alias} still points at {live_collection}; deleting {new_collection}")
+        delete_collection(db, new_collection)
+        raise
+
+    switch_alias(db, alias, new_collection, replace_collection)
+    collect_garbage(db, alias, keep_previous)
+    return new_collection
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the vector collection and switch to it without downtime.")
+    parser.add_argument("--replace-collection", action="store_true", help="Replace a plain collection named QDRANT_COLLECTION with an alias")
+    parser.add_argument("--keep-previous", type=int, default=REINDEX_KEEP_PREVIOUS, help="Old collections to keep for rollback")
+    parser.add_argument("--query", action="append", default=None, help="Sample query that must return results (repeatable)")
+    args = parser.parse_args()
+    reindex(args.replace_collection, args.keep_previous, args.query or REINDEX_SAMPLE_QUERIES)
+
+
+if __name__ == "__main__":
+    main()
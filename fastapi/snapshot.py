@@ -0,0 +1,49 @@
+"""
+Export or import the vector corpus as a local bundle, so a new environment can be
+stood up without re-running OAuth, re-downloading Drive or re-embedding.
+
+    python -m snapshot export ./corpus-bundle
+    python -m snapshot import ./corpus-bundle [--collection name]
+"""
+import time
+import logging
+import argparse
+from pathlib import Path
+from dotenv import load_dotenv
+
+env_path = Path('.env')
+if env_path.exists():
+    load_dotenv(dotenv_path=env_path)
+
+from qdrant import QdrantDB, SNAPSHOT_IMPORT_BATCH_SIZE, SNAPSHOT_IMPORT_PARALLEL, SNAPSHOT_PAGE_SIZE
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import the vector corpus.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Write the collection to a bundle")
+    export_parser.add_argument("directory")
+    export_parser.add_argument("--collection", default=None, help="Defaults to QDRANT_COLLECTION")
+    export_parser.add_argument("--page-size", type=int, default=SNAPSHOT_PAGE_SIZE)
+    import_parser = subparsers.add_parser("import", help="Load a bundle into a collection")
+    import_parser.add_argument("directory")
+    import_parser.add_argument("--collection", default=None, help="Defaults to QDRANT_COLLECTION")
+    import_parser.add_argument("--batch-size", type=int, default=SNAPSHOT_IMPORT_BATCH_SIZE)
+    import_parser.add_argument("--parallel", type=int, default=SNAPSHOT_IMPORT_PARALLEL)
+    args = parser.parse_args()
+
+    db = QdrantDB(collection_name=args.collection)
+    started = time.perf_counter()
+    if args.command == "export":
+        count = db.export_snapshot(args.directory, args.page_size)
+        logger.info(f"Exported {count} points from {db.collection_name} in {time.perf_counter() - started:.1f}s")
+    else:
+        count = db.import_snapshot(args.directory, args.batch_size, args.parallel)
+        logger.info(f"Imported {count} points into {db.collection_name} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Dry run of a sync: compares the Drive folders with the ingest manifest and reports
+the files a sync would add, update, move and delete, what that means in bytes,
+pages, embedding tokens and Qdrant points, and how long it would take at the
+throughput measured over the last SYNC_PLAN_STATS_WINDOW ingested files.
+
+    python -m sync_plan [--workers N] [--json]
+
+The same plan is served at GET /sync/plan.
+"""
+import os
+import json
+import math
+import argparse
+from pathlib import Path
+from dotenv import load_dotenv
+
+env_path = Path('.env')
+if env_path.exists():
+    load_dotenv(dotenv_path=env_path)
+
+from google_drive_downloader import GoogleDriveDownloader
+from ingest_manifest import IngestManifest, file_kind, get_ingest_manifest
+
+SYNC_PLAN_STATS_WINDOW = int(os.getenv("SYNC_PLAN_STATS_WINDOW", "200"))
+# USD per million embedding tokens; mistral-embed is 0.10, a local backend costs nothing
+EMBEDDING_COST_PER_MILLION_TOKENS = float(os.getenv("EMBEDDING_COST_PER_MILLION_TOKENS", "0.1"))
+# Used until files of a kind have been ingested and measured
+DEFAULT_THROUGHPUT = {
+    "bytes_per_page": 50_000,
+    "characters_per_page": 3_000,
+    "download_bytes_per_second": 5 * 1024 * 1024,
+    "ingest_pages_per_second": 2.0,
+}
+CHARACTERS_PER_TOKEN = 4
+
+
+def plan_sync(files: list[dict], manifest_entries: list[dict]) -> dict[str, list]:
+    """
+    Compare the listed Drive files with the manifest. Returns the files to "add",
+    "update" (content changed) and "move" (renamed or moved between folders), each
+    changed one with its manifest entry under "previous"; the manifest entries to
+    "delete"; and the "unchanged" and "unsupported" files.
+    """
+    previous_by_id = {entry["file_id"]: entry for entry in manifest_entries}
+    plan = {"add": [], "update": [], "move": [], "delete": [], "unchanged": [], "unsupported": []}
+    for file in files:
+        if not file["name"].lower().endswith(GoogleDriveDownloader.SUPPORTED_EXTENSIONS):
+            plan["unsupported"].append(file)
+            continue
+        previous = previous_by_id.pop(file["id"], None)
+        if previous is None:
+            plan["add"].append(file)
+        elif (previous["name"], previous["folder"]) != (file["name"], file["folder"]):
+            plan["move"].append({**file, "previous": previous})
+        elif previous["modified_time"] != file.get("modifiedTime"):
+            plan["update"].append({**file, "previous": previous})
+        else:
+            plan["unchanged"].append(file)
+    plan["delete"] = list(previous_by_id.values())
+    return plan
+
+
+def files_to_ingest(plan: dict[str, list]) -> list[dict]:
+    return [
+        {key: value for key, value in file.items() if key != "previous"}
+        for file in plan["add"] + plan["update"] + plan["move"]
+    ]
+
+
+def entries_to_remove(plan: dict[str, list]) -> list[dict]:
+    """
+    Manifest entries of the files that left Drive, removed before anything is
+    ingested. The versions that updated and moved files replace are only removed
+    once the new ones are in.
+    """
+    return plan["delete"]
+
+
+def measure_throughput(rows: list[dict]) -> dict:
+    """Per-kind page density and overall stage rates from ingest_stats rows, falling back to DEFAULT_THROUGHPUT."""
+    from file_embedding import CHUNK_OVERLAP, CHUNK_SIZE
+
+    default_points_per_page = max(DEFAULT_THROUGHPUT["characters_per_page"] / (CHUNK_SIZE - CHUNK_OVERLAP), 1.0)
+    throughput = {"measured_files": len(rows), "kinds": {}}
+    for kind in ("pdf", "word"):
+        kind_rows = [row for row in rows if row["kind"] == kind and row["pages"] > 0]
+        total = {key: sum(row[key] for row in kind_rows) for key in ("bytes", "pages", "characters", "points")}
+        measured = total["pages"] > 0 and total["bytes"] > 0
+        throughput["kinds"][kind] = {
+            "source": "measured" if measured else "default",
+            "bytes_per_page": total["bytes"] / total["pages"] if measured else DEFAULT_THROUGHPUT["bytes_per_page"],
+            "characters_per_page": total["characters"] / total["pages"] if measured else DEFAULT_THROUGHPUT["characters_per_page"],
+            # Below the chunk count when near-duplicate chunks were collapsed
+            "points_per_page": total["points"] / total["pages"] if measured else default_points_per_page,
+        }
+    download_seconds = sum(row["download_seconds"] for row in rows)
+    ingest_seconds = sum(row["ingest_seconds"] for row in rows)
+    downloaded_bytes = sum(row["bytes"] for row in rows if row["download_seconds"] > 0)
+    ingested_pages = sum(row["pages"] for row in rows)
+    throughput["download_bytes_per_second"] = (
+        downloaded_bytes / download_seconds if download_seconds > 0 and downloaded_bytes > 0 else DEFAULT_THROUGHPUT["download_bytes_per_second"]
+    )
+    throughput["ingest_pages_per_second"] = (
+        ingested_pages / ingest_seconds if ingest_seconds > 0 and ingested_pages > 0 else DEFAULT_THROUGHPUT["ingest_pages_per_second"]
+    )
+    return throughput
+
+
+def estimate_file(file: dict, throughput: dict, previous_stats: dict[str, dict]) -> dict:
+    """Estimate the pages, embedding tokens and points of ingesting a file, scaling its last ingestion if there was one."""
+    size = int(file.get("size", 0))
+    previous = previous_stats.get(file["id"])
+    if previous and previous["bytes"] > 0 and previous["pages"] > 0:
+        scale = size / previous["bytes"]
+        pages, characters, points = previous["pages"] * scale, previous["characters"] * scale, previous["points"] * scale
+    else:
+        kind = throughput["kinds"].get(file_kind(file["name"]), throughput["kinds"]["pdf"])
+        pages = size / kind["bytes_per_page"]
+        characters = pages * kind["characters_per_page"]
+        points = pages * kind["points_per_page"]
+    tokens = characters / CHARACTERS_PER_TOKEN
+    if file.get("previous") and file["previous"]["modified_time"] == file.get("modifiedTime"):
+        tokens = 0  # moved without changing: every chunk is in the embedding cache
+    return {"bytes": size, "pages": math.ceil(pages), "tokens": math.ceil(tokens), "points": math.ceil(points)}
+
+
+def estimate(plan: dict[str, list], throughput: dict, previous_stats: dict[str, dict], download_workers: int = GoogleDriveDownloader.DOWNLOAD_WORKERS, ingest_workers: int = 1) -> dict:
+    """
+    Totals for the files to ingest and the projected wall time. Downloads run
+    download_workers at a time ahead of ingestion, so the slower stage sets the pace.
+    """
+    per_file = [estimate_file(file, throughput, previous_stats) for file in plan["add"] + plan["update"] + plan["move"]]
+    totals = {key: sum(file[key] for file in per_file) for key in ("bytes", "pages", "tokens", "points")}
+    download_seconds = totals["bytes"] / (throughput["download_bytes_per_second"] * download_workers)
+    ingest_seconds = totals["pages"] / (throughput["ingest_pages_per_second"] * ingest_workers)
+    replaced = [file["previous"] for file in plan["update"] + plan["move"]]
+    points_to_delete = sum(previous_stats.get(entry["file_id"], {}).get("points", 0) for entry in replaced + entries_to_remove(plan))
+    return {
+        "download_bytes": totals["bytes"],
+        "pages": totals["pages"],
+        "embedding_tokens": totals["tokens"],
+        "embedding_cost_usd": round(totals["tokens"] / 1_000_000 * EMBEDDING_COST_PER_MILLION_TOKENS, 4),
+        "points_to_write": totals["points"],
+        # Only known for files whose ingestion was measured
+        "points_to_delete": points_to_delete,
+        "download_seconds": round(download_seconds, 1),
+        "ingest_seconds": round(ingest_seconds, 1),
+        "wall_seconds": round(max(download_seconds, ingest_seconds), 1),
+    }
+
+
+def build_sync_plan(downloader: GoogleDriveDownloader = None, manifest: IngestManifest = None, ingest_workers: int = 1) -> dict:
+    """List Drive, compare it with the manifest and return the plan with its estimates, without changing anything."""
+    downloader = downloader or GoogleDriveDownloader()
+    manifest = manifest or get_ingest_manifest()
+    plan = plan_sync(downloader.list_all_files(), manifest.all())
+    throughput = measure_throughput(manifest.recent_stats(SYNC_PLAN_STATS_WINDOW))
+    previous_stats = manifest.latest_stats_by_file()
+
+    def describe(file):
+        described = {key: file.get(key) for key in ("id", "name", "folder", "size", "modifiedTime")}
+        if "previous" in file:
+            described["from"] = f"{file['previous']['folder']}/{file['previous']['name']}"
+        return described
+
+    return {
+        "summary": {action: len(files) for action, files in plan.items()},
+        "estimates": estimate(plan, throughput, previous_stats, downloader.DOWNLOAD_WORKERS, ingest_workers),
+        "throughput": throughput,
+        "files": {
+            "add": [describe(file) for file in plan["add"]],
+            "update": [describe(file) for file in plan["update"]],
+            "move": [describe(file) for file in plan["move"]],
+            "delete": [{"id": entry["file_id"], "name": entry["name"], "folder": entry["folder"]} for entry in plan["delete"]],
+        },
+    }
+
+
+def format_plan(result: dict) -> str:
+    summary, estimates = result["summary"], result["estimates"]
+    lines = [
+        f"add {summary['add']}, update {summary['update']}, move {summary['move']}, delete {summary['delete']} "
+        f"({summary['unchanged']} unchanged, {summary['unsupported']} unsupported)",
+    ]
+    for action in ("add", "update", "move"):
+        for file in result["files"][action]:
+            origin = f" (from {file['from']})" if "from" in file else ""
+            lines.append(f"  {action:<6} {file['folder']}/{file['name']}{origin}")
+    for file in result["files"]["delete"]:
+        lines.append(f"  delete {file['folder']}/{file['name']}")
+    lines += [
+        f"download: {estimates['download_bytes'] / 1024 / 1024:.1f} MB",
+        f"embed: ~{estimates['pages']} pages, ~{estimates['embedding_tokens']} tokens (~${estimates['embedding_cost_usd']:.2f})",
+        f"qdrant: ~{estimates['points_to_write']} points written, {estimates['points_to_delete']} deleted",
+        f"time: ~{estimates['wall_seconds'] / 60:.1f} min (download {estimates['download_seconds'] / 60:.1f} min, "
+        f"ingest {estimates['ingest_seconds'] / 60:.1f} min, from {result['throughput']['measured_files']} measured files)",
+    ]
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show what a sync would do without running it.")
+    parser.add_argument("--workers", type=int, default=1, help="Ingestion workers the sync will run with")
+    parser.add_argument("--json", action="store_true", help="Print the plan as JSON")
+    args = parser.parse_args()
+
+    result = build_sync_plan(ingest_workers=args.workers)
+    print(json.dumps(result, indent=2) if args.json else format_plan(result))
+
+
+if __name__ == "__main__":
+    main()
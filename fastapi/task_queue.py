@@ -0,0 +1,366 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from uuid import uuid4
+from typing import Optional
+
+TASK_QUEUE_URL = os.getenv("TASK_QUEUE_URL", "sqlite:///task_queue.sqlite3")
+TASK_MAX_ATTEMPTS = int(os.getenv("TASK_MAX_ATTEMPTS", "3"))
+TASK_RETRY_DELAY = float(os.getenv("TASK_RETRY_DELAY", "10"))
+
+_task_queue = None
+_task_queue_lock = threading.Lock()
+
+
+class TaskQueue(ABC):
+    """
+    A queue of per-file ingestion tasks shared by the API and the workers.
+
+    A task is a dict with "id", "processing_id", "payload" and "attempts". Workers
+    claim a task for a lease, extend the lease with heartbeats while they work,
+    and then complete or fail it. A task whose lease runs out is handed to another
+    worker; a failed task is retried until it has used up its attempts.
+    """
+
+    @abstractmethod
+    def enqueue(self, processing_id: str, payloads: list[dict], priorities: list[float] = None) -> list[str]:
+        """Queue one task per payload. Tasks with a higher priority are claimed first."""
+
+    @abstractmethod
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def heartbeat(self, task_id: str, worker_id: str, lease_seconds: float) -> bool:
+        ...
+
+    @abstractmethod
+    def complete(self, task_id: str, worker_id: str):
+        ...
+
+    @abstractmethod
+    def fail(self, task_id: str, worker_id: str, error: str):
+        ...
+
+    @abstractmethod
+    def progress(self, processing_id: str) -> dict:
+        """Return task counts per status ("queued", "leased", "done", "failed") and the "total"."""
+
+    @abstractmethod
+    def done_payloads(self, processing_id: str) -> list[dict]:
+        """Return the payloads of the finished tasks of a sync, in the order they finished."""
+
+
+class SQLiteTaskQueue(TaskQueue):
+    """Task queue in a local SQLite file, for one machine or a shared volume."""
+
+    def __init__(self, path: str, max_attempts: int = TASK_MAX_ATTEMPTS, retry_delay: float = TASK_RETRY_DELAY):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id TEXT PRIMARY KEY,
+                    processing_id TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker_id TEXT,
+                    lease_expires REAL,
+                    available_at REAL NOT NULL,
+                    error TEXT,
+                    priority REAL NOT NULL DEFAULT 0,
+                    finished_at REAL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(tasks)")}
+            for column, definition in (("priority", "REAL NOT NULL DEFAULT 0"), ("finished_at", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE tasks ADD COLUMN {column} {definition}")
+            conn.execute("CREATE INDEX IF NOT EXISTS tasks_ready ON tasks (status, available_at, priority, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS tasks_processing ON tasks (processing_id, status)")
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call keeps the queue safe to share across threads
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, processing_id: str, payloads: list[dict], priorities: list[float] = None) -> list[str]:
+        now = time.time()
+        priorities = priorities or [0.0] * len(payloads)
+        rows = [(str(uuid4()), processing_id, json.dumps(payload), priority, now, now) for payload, priority in zip(payloads, priorities)]
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO tasks (id, processing_id, payload, status, priority, available_at, created_at) "
+                "VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                rows,
+            )
+        return [row[0] for row in rows]
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[dict]:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._claim_next(conn, worker_id, now, lease_seconds)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return {"id": row[0], "processing_id": row[1], "payload": json.loads(row[2]), "attempts": row[3] + 1}
+
+    def _claim_next(self, conn: sqlite3.Connection, worker_id: str, now: float, lease_seconds: float):
+        # Leases that ran out on their last attempt will not be retried
+        conn.execute(
+            "UPDATE tasks SET status = 'failed', error = 'lease expired' "
+            "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+            (now, self.max_attempts),
+        )
+        row = conn.execute(
+            "SELECT id, processing_id, payload, attempts FROM tasks "
+            "WHERE (status = 'queued' AND available_at <= ?) OR (status = 'leased' AND lease_expires < ?) "
+            "ORDER BY priority DESC, created_at LIMIT 1",
+            (now, now),
+        ).fetchone()
+        if row is not None:
+            conn.execute(
+                "UPDATE tasks SET status = 'leased', worker_id = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE id = ?",
+                (worker_id, now + lease_seconds, row[0]),
+            )
+        return row
+
+    def heartbeat(self, task_id: str, worker_id: str, lease_seconds: float) -> bool:
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET lease_expires = ? WHERE id = ? AND worker_id = ? AND status = 'leased'",
+                (time.time() + lease_seconds, task_id, worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, task_id: str, worker_id: str):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE tasks SET status = 'done', lease_expires = NULL, finished_at = ? WHERE id = ? AND worker_id = ?",
+                (time.time(), task_id, worker_id),
+            )
+
+    def fail(self, task_id: str, worker_id: str, error: str):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+                "available_at = ?, lease_expires = NULL, error = ? WHERE id = ? AND worker_id = ?",
+                (self.max_attempts, time.time() + self.retry_delay, error, task_id, worker_id),
+            )
+
+    def progress(self, processing_id: str) -> dict:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT status, COUNT(*) FROM tasks WHERE processing_id = ? GROUP BY status",
+                (processing_id,),
+            ).fetchall()
+        counts = {"queued": 0, "leased": 0, "done": 0, "failed": 0}
+        counts.update(dict(rows))
+        counts["total"] = sum(counts.values())
+        return counts
+
+    def done_payloads(self, processing_id: str) -> list[dict]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT payload FROM tasks WHERE processing_id = ? AND status = 'done' ORDER BY finished_at",
+                (processing_id,),
+            ).fetchall()
+        return [json.loads(payload) for (payload,) in rows]
+
+
+class RedisTaskQueue(TaskQueue):
+    """Task queue in Redis (or anything that speaks its protocol), for several machines."""
+
+    # Each script changes a task's lease, status and per-sync status in one step, so
+    # a worker that crashes part way cannot leave a task in two states or in none.
+    # Moves retries whose delay has passed and expired leases back to the ready set
+    # (or fails them on their last attempt), then pops the next ready task and leases it.
+    CLAIM_SCRIPT = """
+    local ready, leases, delayed = KEYS[1], KEYS[2], KEYS[3]
+    local now, lease_expires, worker_id = ARGV[1], ARGV[2], ARGV[3]
+    local max_attempts, task_prefix, status_prefix = tonumber(ARGV[4]), ARGV[5], ARGV[6]
+    local function set_status(id, status)
+        local key = task_prefix .. id
+        redis.call('HSET', key, 'status', status)
+        redis.call('HSET', status_prefix .. redis.call('HGET', key, 'processing_id'), id, status)
+    end
+    for _, id in ipairs(redis.call('ZRANGEBYSCORE', delayed, 0, now)) do
+        redis.call('ZREM', delayed, id)
+        redis.call('ZADD', ready, redis.call('HGET', task_prefix .. id, 'priority') or 0, id)
+    end
+    for _, id in ipairs(redis.call('ZRANGEBYSCORE', leases, 0, now)) do
+        redis.call('ZREM', leases, id)
+        local key = task_prefix .. id
+        if tonumber(redis.call('HGET', key, 'attempts') or 0) >= max_attempts then
+            redis.call('HSET', key, 'error', 'lease expired')
+            set_status(id, 'failed')
+        else
+            set_status(id, 'queued')
+            redis.call('ZADD', ready, redis.call('HGET', key, 'priority') or 0, id)
+        end
+    end
+    local popped = redis.call('ZPOPMAX', ready)
+    if #popped == 0 then return nil end
+    local id = popped[1]
+    redis.call('ZADD', leases, lease_expires, id)
+    redis.call('HSET', task_prefix .. id, 'worker_id', worker_id)
+    redis.call('HINCRBY', task_prefix .. id, 'attempts', 1)
+    set_status(id, 'leased')
+    return id
+    """
+
+    HEARTBEAT_SCRIPT = """
+    local key = ARGV[4] .. ARGV[1]
+    if redis.call('HGET', key, 'worker_id') ~= ARGV[2] or redis.call('HGET', key, 'status') ~= 'leased' then
+        return 0
+    end
+    return redis.call('ZADD', KEYS[1], 'XX', 'CH', ARGV[3], ARGV[1])
+    """
+
+    # Retried tasks wait in the delayed set until their retry delay has passed
+    FINISH_SCRIPT = """
+    local leases, ready, delayed = KEYS[1], KEYS[2], KEYS[3]
+    local id, worker_id, outcome, error = ARGV[1], ARGV[2], ARGV[3], ARGV[4]
+    local max_attempts, available_at, task_prefix, status_prefix = tonumber(ARGV[5]), ARGV[6], ARGV[7], ARGV[8]
+    local key = task_prefix .. id
+    if redis.call('HGET', key, 'worker_id') ~= worker_id then return 0 end
+    redis.call('ZREM', leases, id)
+    redis.call('ZREM', ready, id)
+    local status = 'done'
+    if outcome == 'failed' then
+        redis.call('HSET', key, 'error', error)
+        if tonumber(redis.call('HGET', key, 'attempts') or 0) >= max_attempts then
+            status = 'failed'
+        else
+            status = 'queued'
+            redis.call('ZADD', delayed, available_at, id)
+        end
+    end
+    local status_key = status_prefix .. redis.call('HGET', key, 'processing_id')
+    redis.call('HSET', key, 'status', status)
+    redis.call('HSET', status_key, id, status)
+    if status == 'done' then redis.call('RPUSH', status_key .. ':done', id) end
+    return 1
+    """
+
+    def __init__(self, url: str, prefix: str = "ingest", max_attempts: int = TASK_MAX_ATTEMPTS, retry_delay: float = TASK_RETRY_DELAY):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("RedisTaskQueue requires the 'redis' package: pip install redis") from e
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.ready_key = f"{prefix}:ready"  # sorted set scored by priority
+        self.leases_key = f"{prefix}:leases"
+        self.delayed_key = f"{prefix}:delayed"
+        self.task_prefix = f"{prefix}:task:"
+        self.status_prefix = f"{prefix}:processing:"
+        self._claim = self.redis.register_script(self.CLAIM_SCRIPT)
+        self._heartbeat = self.redis.register_script(self.HEARTBEAT_SCRIPT)
+        self._finish = self.redis.register_script(self.FINISH_SCRIPT)
+
+    def _task_key(self, task_id: str) -> str:
+        return f"{self.task_prefix}{task_id}"
+
+    def _status_key(self, processing_id: str) -> str:
+        return f"{self.status_prefix}{processing_id}"
+
+    def enqueue(self, processing_id: str, payloads: list[dict], priorities: list[float] = None) -> list[str]:
+        task_ids = []
+        priorities = priorities or [0.0] * len(payloads)
+        pipe = self.redis.pipeline()
+        for payload, priority in zip(payloads, priorities):
+            task_id = str(uuid4())
+            pipe.hset(self._task_key(task_id), mapping={
+                "processing_id": processing_id,
+                "payload": json.dumps(payload),
+                "attempts": 0,
+                "priority": priority,
+                "status": "queued",
+            })
+            pipe.hset(self._status_key(processing_id), task_id, "queued")
+            pipe.zadd(self.ready_key, {task_id: priority})
+            task_ids.append(task_id)
+        pipe.execute()
+        return task_ids
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[dict]:
+        now = time.time()
+        task_id = self._claim(
+            keys=[self.ready_key, self.leases_key, self.delayed_key],
+            args=[now, now + lease_seconds, worker_id, self.max_attempts, self.task_prefix, self.status_prefix],
+        )
+        if task_id is None:
+            return None
+        task = self.redis.hgetall(self._task_key(task_id))
+        return {
+            "id": task_id,
+            "processing_id": task["processing_id"],
+            "payload": json.loads(task["payload"]),
+            "attempts": int(task["attempts"]),
+        }
+
+    def heartbeat(self, task_id: str, worker_id: str, lease_seconds: float) -> bool:
+        return self._heartbeat(keys=[self.leases_key], args=[task_id, worker_id, time.time() + lease_seconds, self.task_prefix]) == 1
+
+    def _finish_task(self, task_id: str, worker_id: str, outcome: str, error: str = ""):
+        self._finish(
+            keys=[self.leases_key, self.ready_key, self.delayed_key],
+            args=[task_id, worker_id, outcome, error, self.max_attempts, time.time() + self.retry_delay, self.task_prefix, self.status_prefix],
+        )
+
+    def complete(self, task_id: str, worker_id: str):
+        self._finish_task(task_id, worker_id, "done")
+
+    def fail(self, task_id: str, worker_id: str, error: str):
+        self._finish_task(task_id, worker_id, "failed", error)
+
+    def progress(self, processing_id: str) -> dict:
+        counts = {"queued": 0, "leased": 0, "done": 0, "failed": 0}
+        for status in self.redis.hvals(self._status_key(processing_id)):
+            counts[status] = counts.get(status, 0) + 1
+        counts["total"] = sum(counts.values())
+        return counts
+
+    def done_payloads(self, processing_id: str) -> list[dict]:
+        task_ids = self.redis.lrange(f"{self._status_key(processing_id)}:done", 0, -1)
+        pipe = self.redis.pipeline()
+        for task_id in task_ids:
+            pipe.hget(self._task_key(task_id), "payload")
+        return [json.loads(payload) for payload in pipe.execute() if payload]
+
+
+def get_task_queue() -> TaskQueue:
+    """Return the process-wide task queue selected by TASK_QUEUE_URL."""
+    global _task_queue
+    with _task_queue_lock:
+        if _task_queue is None:
+            if TASK_QUEUE_URL.startswith(("redis://", "rediss://")):
+                _task_queue = RedisTaskQueue(TASK_QUEUE_URL)
+            elif TASK_QUEUE_URL.startswith("sqlite:///"):
+                _task_queue = SQLiteTaskQueue(TASK_QUEUE_URL[len("sqlite:///"):])
+            else:
+                raise ValueError(f"Unsupported TASK_QUEUE_URL '{TASK_QUEUE_URL}'")
+        return _task_queue
@@ -0,0 +1,119 @@
+"""
+Ingestion worker. Run one or more with `python -m worker` from this folder.
+
+Each worker claims per-file tasks from the shared task queue (see TASK_QUEUE_URL),
+downloads the file from Google Drive, then chunks, embeds and inserts it into Qdrant.
+Add worker processes, on this machine or others pointed at the same queue, to ingest
+a large Drive tree faster.
+"""
+import os
+import socket
+import logging
+import argparse
+import threading
+import time
+from uuid import uuid4
+from pathlib import Path
+from dotenv import load_dotenv
+
+env_path = Path('.env')
+if env_path.exists():
+    load_dotenv(dotenv_path=env_path)
+
+from task_queue import TaskQueue, get_task_queue
+from profiling import profiling
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+WORKER_LEASE_SECONDS = float(os.getenv("WORKER_LEASE_SECONDS", "120"))
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "2"))
+
+
+def ingest_drive_file(task: dict):
+    """Download, chunk, embed and insert the Drive file described by a task payload."""
+    from google_drive_downloader import GoogleDriveDownloader
+    from file_embedding import process_file
+    from ingest_manifest import file_version
+    from ingest_scheduler import record_ingested
+
+    file = task["payload"]
+    downloader = GoogleDriveDownloader()
+    downloader.ensure_download_directory()
+    started = time.perf_counter()
+    file_path = downloader.download_file(file["id"], file["name"], file["folder"], file.get("overwrite", False))
+    download_seconds = time.perf_counter() - started
+    if file_path is None:
+        return
+    stats = {}
+    started = time.perf_counter()
+    # A retried task writes the same point IDs, overwriting what a failed attempt inserted
+    process_file(file_path, task["processing_id"], lambda *args: None, stats, file_id=file["id"], version=file_version(file))
+    record_ingested(file, stats, download_seconds, time.perf_counter() - started)
+
+
+class Heartbeat:
+    """Keeps extending a task's lease from a background thread while the task runs."""
+
+    def __init__(self, queue: TaskQueue, task_id: str, worker_id: str, lease_seconds: float):
+        self.queue = queue
+        self.task_id = task_id
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stopped.wait(self.lease_seconds / 3):
+            try:
+                if not self.queue.heartbeat(self.task_id, self.worker_id, self.lease_seconds):
+                    logger.warning(f"Lost the lease on task {self.task_id}")
+                    return
+            except Exception as e:
+                logger.error(f"Heartbeat for task {self.task_id} failed: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+
+
+def run_worker(queue: TaskQueue, worker_id: str, lease_seconds: float = WORKER_LEASE_SECONDS, poll_interval: float = WORKER_POLL_INTERVAL, once: bool = False):
+    """Claim and run tasks until interrupted, or until the queue is empty if once is set."""
+    logger.info(f"Worker {worker_id} started")
+    while True:
+        task = queue.claim(worker_id, lease_seconds)
+        if task is None:
+            if once:
+                return
+            time.sleep(poll_interval)
+            continue
+
+        logger.info(f"Worker {worker_id} processing {task['payload'].get('name')} (attempt {task['attempts']})")
+        try:
+            with Heartbeat(queue, task["id"], worker_id, lease_seconds), profiling(task["processing_id"], task["payload"].get("profile", False)):
+                ingest_drive_file(task)
+            queue.complete(task["id"], worker_id)
+        except Exception as e:
+            logger.error(f"Task {task['id']} failed: {e}")
+            queue.fail(task["id"], worker_id, str(e))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an ingestion worker.")
+    parser.add_argument("--worker-id", default=f"{socket.gethostname()}-{os.getpid()}-{uuid4().hex[:6]}")
+    parser.add_argument("--lease-seconds", type=float, default=WORKER_LEASE_SECONDS)
+    parser.add_argument("--poll-interval", type=float, default=WORKER_POLL_INTERVAL)
+    parser.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+    args = parser.parse_args()
+
+    from qdrant import initialiseVectorDatabase
+    initialiseVectorDatabase()
+    run_worker(get_task_queue(), args.worker_id, args.lease_seconds, args.poll_interval, args.once)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Optional
+import numpy as np
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(24 * 3600)))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+# Written by the ingestion service whenever documents are added
+CORPUS_STATE_PATH = os.getenv("CORPUS_STATE_PATH", "../data/corpus_state.sqlite3")
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+
+def read_corpus_version(scope: str, path: str = CORPUS_STATE_PATH) -> int:
+    """Return the ingestion version of a scope ("all" or an rfp_status), 0 if never ingested."""
+    if not os.path.exists(path):
+        return 0
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        row = conn.execute("SELECT version FROM corpus_versions WHERE scope = ?", (scope,)).fetchone()
+    except sqlite3.OperationalError:
+        return 0  # table not created yet
+    finally:
+        conn.close()
+    return row[0] if row else 0
+
+
+class AnswerCache:
+    """
+    In-memory cache of answers keyed by the question's embedding.
+
+    A question hits when its cosine similarity to a cached question is at least
+    threshold, within the same scope (rfp_status filter or "all") and corpus
+    version. Ingesting documents bumps the version of their scopes, which retires
+    the entries answered from the older corpus. Entries also expire after
+    ttl_seconds, and the least recently used are evicted beyond max_entries.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS, max_entries: int = ANSWER_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict[int, dict] = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / max(np.linalg.norm(vector), 1e-12)
+
+    def _evict_stale(self, scope: str, version: int, now: float):
+        stale = [
+            entry_id for entry_id, entry in self._entries.items()
+            if now - entry["created_at"] > self.ttl_seconds or (entry["scope"] == scope and entry["version"] != version)
+        ]
+        for entry_id in stale:
+            del self._entries[entry_id]
+
+    def lookup(self, vector, scope: str, version: int) -> Optional[dict]:
+        """
+        Return {"answer", "citations"} of the closest cached question, or None.
+        version is the scope's read_corpus_version, read before the question is
+        answered and passed on to store, so an answer from an older corpus is
+        never stored under a newer version.
+        """
+        now = time.time()
+        with self._lock:
+            self._evict_stale(scope, version, now)
+            candidates = [(entry_id, entry) for entry_id, entry in self._entries.items() if entry["scope"] == scope]
+            if not candidates:
+                return None
+            similarities = np.stack([entry["vector"] for _, entry in candidates]) @ self._normalize(vector)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+            entry_id, entry = candidates[best]
+            self._entries.move_to_end(entry_id)
+            return {"answer": entry["answer"], "citations": entry["citations"]}
+
+    def store(self, vector, scope: str, version: int, answer: str, citations: str):
+        with self._lock:
+            self._entries[self._next_id] = {
+                "vector": self._normalize(vector),
+                "scope": scope,
+                "version": version,
+                "answer": answer,
+                "citations": citations,
+                "created_at": time.time(),
+            }
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    """Return the process-wide answer cache, or None if ANSWER_CACHE_ENABLED is off."""
+    global _answer_cache
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            _answer_cache = AnswerCache()
+        return _answer_cache
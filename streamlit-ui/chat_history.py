@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Sequence
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, message_to_dict, messages_from_dict
+
+CHAT_HISTORY_PATH = os.getenv("CHAT_HISTORY_PATH", "chat_history.sqlite3")
+CHAT_HISTORY_MAX_TOKENS = int(os.getenv("CHAT_HISTORY_MAX_TOKENS", "1500"))
+CHAT_HISTORY_MAX_SESSIONS = int(os.getenv("CHAT_HISTORY_MAX_SESSIONS", "1000"))
+CHAT_HISTORY_TTL_SECONDS = float(os.getenv("CHAT_HISTORY_TTL_SECONDS", str(7 * 24 * 3600)))
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token), good enough for budgeting."""
+    return len(text) // 4 + 1
+
+
+class SQLiteChatHistoryStore:
+    """
+    Persists chat histories per session in SQLite.
+
+    Only the most recent messages that fit in max_tokens are kept. Older messages
+    are folded into a rolling summary when a summarizer is given, and dropped
+    otherwise, so the history sent to the LLM stays the same size however long
+    the conversation runs. Sessions idle for longer than ttl_seconds, and the
+    least recently used ones beyond max_sessions, are evicted.
+    """
+
+    def __init__(self, path: str = CHAT_HISTORY_PATH, max_tokens: int = CHAT_HISTORY_MAX_TOKENS, max_sessions: int = CHAT_HISTORY_MAX_SESSIONS, ttl_seconds: float = CHAT_HISTORY_TTL_SECONDS, summarizer: Optional[Callable[[str, List[BaseMessage]], str]] = None):
+        self.path = path
+        self.max_tokens = max_tokens
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.summarizer = summarizer
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, summary TEXT NOT NULL DEFAULT '', updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, message TEXT NOT NULL, tokens INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated_at)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get_session_history(self, session_id: str) -> "SQLiteChatMessageHistory":
+        self.evict()
+        return SQLiteChatMessageHistory(self, session_id)
+
+    def evict(self):
+        """Drop expired sessions and the least recently used ones beyond max_sessions."""
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM sessions WHERE updated_at < ? OR session_id NOT IN "
+                "(SELECT session_id FROM sessions ORDER BY updated_at DESC LIMIT ?)",
+                (time.time() - self.ttl_seconds, self.max_sessions),
+            )
+            conn.execute("DELETE FROM messages WHERE session_id NOT IN (SELECT session_id FROM sessions)")
+
+    def load(self, session_id: str) -> tuple[str, List[BaseMessage]]:
+        """Return the session's summary and its messages, oldest first."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT summary FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            rows = conn.execute(
+                "SELECT message FROM messages WHERE session_id = ? ORDER BY id", (session_id,)
+            ).fetchall()
+        messages = messages_from_dict([json.loads(message) for (message,) in rows])
+        return (row[0] if row else ""), messages
+
+    def append(self, session_id: str, messages: Sequence[BaseMessage]):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO sessions (session_id, updated_at) VALUES (?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET updated_at = excluded.updated_at",
+                (session_id, time.time()),
+            )
+            conn.executemany(
+                "INSERT INTO messages (session_id, message, tokens) VALUES (?, ?, ?)",
+                [(session_id, json.dumps(message_to_dict(m)), estimate_tokens(str(m.content))) for m in messages],
+            )
+        self.trim(session_id)
+
+    def trim(self, session_id: str):
+        """
+        Keep the newest messages that fit in max_tokens, summarizing or dropping the
+        rest. The latest exchange is always kept, cut short if it alone is over the budget.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, message, tokens FROM messages WHERE session_id = ? ORDER BY id", (session_id,)
+            ).fetchall()
+            if not rows:
+                return
+            keep_from = self._keep_from(conn, rows)
+            dropped = [json.loads(message) for message_id, message, _ in rows if message_id < keep_from]
+            if not dropped:
+                return
+            if self.summarizer is None:
+                conn.execute("DELETE FROM messages WHERE session_id = ? AND id < ?", (session_id, keep_from))
+                return
+            summary = conn.execute("SELECT summary FROM sessions WHERE session_id = ?", (session_id,)).fetchone()[0]
+        # The model is called outside any transaction, so other sessions can write meanwhile
+        updated = self.summarizer(summary, messages_from_dict(dropped))
+        with self._connect() as conn:
+            current = conn.execute("SELECT summary FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            remaining = conn.execute(
+                "SELECT COUNT(*) FROM messages WHERE session_id = ? AND id < ?", (session_id, keep_from)
+            ).fetchone()[0]
+            if current is None or current[0] != summary or remaining != len(dropped):
+                return  # cleared, or trimmed by a concurrent call in the meantime
+            conn.execute("UPDATE sessions SET summary = ? WHERE session_id = ?", (updated, session_id))
+            conn.execute("DELETE FROM messages WHERE session_id = ? AND id < ?", (session_id, keep_from))
+
+    def _keep_from(self, conn: sqlite3.Connection, rows: list[tuple]) -> int:
+        """Return the ID of the oldest message to keep out of rows (id, message, tokens), oldest first."""
+        types = [json.loads(message).get("type") for _, message, _ in rows]
+        # The latest exchange starts at the last human turn
+        latest = start = max((i for i, kind in enumerate(types) if kind == "human"), default=len(rows) - 1)
+        used = sum(tokens for _, _, tokens in rows[latest:])
+        if used > self.max_tokens:
+            self._truncate(conn, rows[latest:])
+            return rows[latest][0]
+        while start > 0 and used + rows[start - 1][2] <= self.max_tokens:
+            start -= 1
+            used += rows[start][2]
+        # The window must open on a human turn so the LLM never sees a dangling answer
+        while start < latest and types[start] != "human":
+            start += 1
+        return rows[start][0]
+
+    def _truncate(self, conn: sqlite3.Connection, exchange: list[tuple]):
+        """Cut the messages of an exchange short so they fit in max_tokens together, the longest ones first."""
+        remaining = self.max_tokens
+        by_length = sorted(exchange, key=lambda row: row[2])
+        for i, (message_id, message, tokens) in enumerate(by_length):
+            allowance = min(tokens, remaining // (len(by_length) - i))
+            remaining -= allowance
+            if allowance == tokens:
+                continue
+            data = json.loads(message)
+            data["data"]["content"] = str(data["data"]["content"])[:max(allowance - 2, 0) * 4] + " [...]"
+            conn.execute(
+                "UPDATE messages SET message = ?, tokens = ? WHERE id = ?",
+                (json.dumps(data), estimate_tokens(data["data"]["content"]), message_id),
+            )
+
+    def clear(self, session_id: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+
+class SQLiteChatMessageHistory(BaseChatMessageHistory):
+    """Chat history of one session, backed by a SQLiteChatHistoryStore."""
+
+    def __init__(self, store: SQLiteChatHistoryStore, session_id: str):
+        self.store = store
+        self.session_id = session_id
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        summary, messages = self.store.load(self.session_id)
+        if summary:
+            return [SystemMessage(content=f"Summary of the earlier conversation: {summary}")] + messages
+        return messages
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self.store.append(self.session_id, messages)
+
+    def clear(self) -> None:
+        self.store.clear(self.session_id)
+
+
+def summarize_with_llm(llm) -> Callable[[str, List[BaseMessage]], str]:
+    """Build a summarizer that folds dropped messages into the running summary with the given chat model."""
+    def summarize(summary: str, messages: List[BaseMessage]) -> str:
+        transcript = "\n".join(
+            f"{'User' if isinstance(m, HumanMessage) else 'Assistant'}: {m.content}" for m in messages
+        )
+        prompt = (
+            "Update the summary of a conversation about RFP documents with the new messages below. "
+            "Keep names, figures and open questions, and answer with the summary only.\n\n"
+            f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"
+        )
+        return str(llm.invoke(prompt).content)
+    return summarize
+
+
+def get_chat_history_store(summarizer: Optional[Callable[[str, List[BaseMessage]], str]] = None) -> SQLiteChatHistoryStore:
+    """Return the process-wide history store, creating it on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SQLiteChatHistoryStore(summarizer=summarizer)
+        return _store
@@ -0,0 +1,158 @@
+import os
+from typing import Any, Dict, List, Optional
+import numpy as np
+from pydantic import Field
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from qdrant_client import QdrantClient
+from rfp_common.chunk_store import ChunkStore
+
+CONTEXT_FETCH_K = int(os.getenv("CONTEXT_FETCH_K", "20"))
+CONTEXT_TOP_K = int(os.getenv("CONTEXT_TOP_K", "3"))
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "3000"))
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+CONTEXT_DUPLICATE_THRESHOLD = float(os.getenv("CONTEXT_DUPLICATE_THRESHOLD", "0.95"))
+# Longest text overlap looked for when gluing two chunks of the same page together
+MAX_MERGE_OVERLAP = 1000
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token), good enough for budgeting."""
+    return len(text) // 4 + 1
+
+
+def select_diverse(query_vector: np.ndarray, vectors: np.ndarray, k: int, lambda_mult: float = CONTEXT_MMR_LAMBDA, duplicate_threshold: float = CONTEXT_DUPLICATE_THRESHOLD) -> list[int]:
+    """
+    Pick up to k rows of vectors by maximal marginal relevance to query_vector.
+
+    Candidates whose cosine similarity to an already selected row exceeds
+    duplicate_threshold are dropped as near-duplicates. Returns row indices in
+    selection order.
+    """
+    if len(vectors) == 0:
+        return []
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query_vector = query_vector / max(np.linalg.norm(query_vector), 1e-12)
+    relevance = vectors @ query_vector
+    similarity = vectors @ vectors.T
+
+    selected: list[int] = []
+    available = np.ones(len(vectors), dtype=bool)
+    # Highest similarity of every candidate to anything selected so far
+    redundancy = np.full(len(vectors), -np.inf)
+    while len(selected) < k and available.any():
+        if selected:
+            scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        else:
+            scores = relevance.copy()
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+        available &= redundancy <= duplicate_threshold
+    return selected
+
+
+def _join_overlapping(first: str, second: str) -> str:
+    """Concatenate two chunks, dropping the text they share if one continues the other."""
+    if second in first:
+        return first
+    if first in second:
+        return second
+    for a, b in ((first, second), (second, first)):
+        for size in range(min(len(a), len(b), MAX_MERGE_OVERLAP), 20, -1):
+            if a.endswith(b[:size]):
+                return a + b[size:]
+    return f"{first}\n...\n{second}"
+
+
+def merge_adjacent(documents: List[Document]) -> List[Document]:
+    """Merge chunks that come from the same page of the same file, keeping the order of first appearance."""
+    merged: dict[tuple, Document] = {}
+    for doc in documents:
+        key = (doc.metadata.get("source"), doc.metadata.get("rfp_status"), doc.metadata.get("page"))
+        if key in merged:
+            existing = merged[key]
+            existing.page_content = _join_overlapping(existing.page_content, doc.page_content)
+        else:
+            merged[key] = Document(page_content=doc.page_content, metadata=dict(doc.metadata))
+    return list(merged.values())
+
+
+def pack_to_budget(documents: List[Document], max_tokens: int = CONTEXT_MAX_TOKENS) -> List[Document]:
+    """Keep documents in order of relevance while they fit in max_tokens, always keeping the first."""
+    packed: List[Document] = []
+    used = 0
+    for doc in documents:
+        tokens = estimate_tokens(doc.page_content)
+        if packed and used + tokens > max_tokens:
+            continue
+        packed.append(doc)
+        used += tokens
+    return packed
+
+
+def document_from_payload(payload: dict) -> Document:
+    """Build a Document from a point payload written by the ingestion service."""
+    metadata = dict(payload.get("metadata") or payload)
+    page_content = metadata.pop("page_content", None) or payload.get("page_content", "")
+    if "references" in payload:
+        # Every source and page the chunk appears in, when near-duplicates were collapsed into it
+        metadata["references"] = payload["references"]
+    return Document(page_content=page_content, metadata=metadata)
+
+
+class PackedQdrantRetriever(BaseRetriever):
+    """
+    Retriever that over-fetches from Qdrant, removes near-duplicate chunks by MMR on
+    the returned vectors, merges chunks of the same page and packs the result into
+    a token budget before it reaches the QA prompt.
+    """
+    client: QdrantClient
+    collection_name: str
+    embeddings: Embeddings
+    search_filter: Optional[Any] = None
+    fetch_k: int = CONTEXT_FETCH_K
+    k: int = CONTEXT_TOP_K
+    lambda_mult: float = CONTEXT_MMR_LAMBDA
+    duplicate_threshold: float = CONTEXT_DUPLICATE_THRESHOLD
+    max_tokens: int = CONTEXT_MAX_TOKENS
+    # Source of chunk text for collections written with compact payloads
+    chunk_store: Optional[ChunkStore] = None
+    # Embeddings of queries the caller already computed, e.g. for the answer cache, used once instead of embedding again
+    query_vectors: Dict[str, List[float]] = Field(default_factory=dict)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        query_vector = self.query_vectors.pop(query, None)
+        if query_vector is None:
+            query_vector = self.embeddings.embed_query(query)
+        points = self.client.query_points(
+            collection_name=self.collection_name,
+            query=query_vector,
+            query_filter=self.search_filter,
+            limit=self.fetch_k,
+            with_payload=True,
+            with_vectors=True,
+        ).points
+        if not points:
+            return []
+
+        vectors = np.asarray([point.vector for point in points], dtype=np.float32)
+        selected = select_diverse(np.asarray(query_vector, dtype=np.float32), vectors, self.k, self.lambda_mult, self.duplicate_threshold)
+        documents = [document_from_payload(points[i].payload) for i in selected]
+        self._hydrate(documents, [points[i].id for i in selected])
+        return pack_to_budget(merge_adjacent(documents), self.max_tokens)
+
+    def _hydrate(self, documents: List[Document], point_ids: list):
+        """Fill in the text of compact-payload documents from the chunk store."""
+        missing = [str(point_id) for doc, point_id in zip(documents, point_ids) if not doc.page_content]
+        if not missing or self.chunk_store is None:
+            return
+        chunks = self.chunk_store.get_many(missing)
+        for doc, point_id in zip(documents, point_ids):
+            chunk = chunks.get(str(point_id))
+            if chunk and not doc.page_content:
+                doc.page_content = chunk["text"]
@@ -0,0 +1,151 @@
+"""
+Load test for the chat path. Drives concurrent sessions through ChatAssistant with
+stub chat and embedding models and an in-memory Qdrant, and reports latency
+percentiles and throughput:
+
+    python loadtest.py --sessions 50 --turns 3 --llm-ttft 0.4 --llm-tokens-per-second 60
+
+No API keys or network access are needed. Run it before and after a change to
+retrieval or prompt construction to catch regressions.
+"""
+import os
+import time
+import zlib
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterator, List, Optional
+import numpy as np
+
+os.environ.setdefault("QDRANT_COLLECTION", "loadtest")
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, PointStruct, VectorParams
+from chat_history import SQLiteChatHistoryStore
+from rag_chain import QDRANT_COLLECTION, ChatAssistant
+
+
+class StubChatModel(BaseChatModel):
+    """Chat model that waits ttft seconds, then streams answer_tokens tokens at tokens_per_second."""
+    ttft: float = 0.5
+    tokens_per_second: float = 50.0
+    answer_tokens: int = 150
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        text = "".join(chunk.text for chunk in self._stream(messages, stop, run_manager, **kwargs))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.ttft)
+        for i in range(self.answer_tokens):
+            if i:
+                time.sleep(1 / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=f"tok{i} "))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+class StubEmbeddings(Embeddings):
+    """Deterministic pseudo-random embeddings that take latency seconds per call."""
+
+    def __init__(self, size: int = 1024, latency: float = 0.05):
+        self.size = size
+        self.latency = latency
+
+    def _vector(self, text: str) -> List[float]:
+        rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+        return rng.standard_normal(self.size).astype(np.float32).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency)
+        return self._vector(text)
+
+
+def build_corpus(client: QdrantClient, embeddings: StubEmbeddings, size: int):
+    """Fill an in-memory collection with synthetic chunks in the ingestion service's payload format."""
+    client.create_collection(QDRANT_COLLECTION, vectors_config=VectorParams(size=embeddings.size, distance=Distance.COSINE))
+    points = []
+    for i in range(size):
+        text = f"RFP {i % 50} section {i}: pricing, scope and delivery terms for project {i % 7}. " * 20
+        points.append(PointStruct(
+            id=i,
+            vector=embeddings._vector(text),
+            payload={"metadata": {"source": f"rfp-{i % 50}.pdf", "rfp_status": "new", "page": i % 30, "page_content": text}},
+        ))
+    client.upsert(QDRANT_COLLECTION, points=points)
+
+
+def run_session(assistant: ChatAssistant, chain, session_id: str, turns: int, results: list, lock: threading.Lock):
+    for turn in range(turns):
+        started = time.perf_counter()
+        first_token = None
+        for _ in assistant.Response(chain, f"What was our pricing for project {turn}?", session_id):
+            if first_token is None:
+                first_token = time.perf_counter()
+        finished = time.perf_counter()
+        with lock:
+            results.append((first_token - started, finished - started))
+
+
+def report(results: list, wall_time: float):
+    ttft = np.array([r[0] for r in results])
+    total = np.array([r[1] for r in results])
+    print(f"turns: {len(results)}  wall time: {wall_time:.2f}s  throughput: {len(results) / wall_time:.2f} turns/s")
+    for name, values in (("time to first token", ttft), ("total latency", total)):
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        print(f"{name:>20}: p50 {p50 * 1000:.0f}ms  p95 {p95 * 1000:.0f}ms  p99 {p99 * 1000:.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the chat path with stubbed models.")
+    parser.add_argument("--sessions", type=int, default=20, help="Concurrent chat sessions")
+    parser.add_argument("--turns", type=int, default=3, help="Questions per session")
+    parser.add_argument("--llm-ttft", type=float, default=0.5, help="Stub LLM seconds to first token")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--answer-tokens", type=int, default=150)
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="Stub embedding seconds per call")
+    parser.add_argument("--vector-size", type=int, default=1024)
+    parser.add_argument("--corpus-size", type=int, default=2000, help="Synthetic chunks in the in-memory collection")
+    parser.add_argument("--answer-cache", action="store_true", help="Serve repeated questions from the answer cache")
+    args = parser.parse_args()
+
+    embeddings = StubEmbeddings(args.vector_size, args.embedding_latency)
+    client = QdrantClient(":memory:")
+    build_corpus(client, embeddings, args.corpus_size)
+    llm = StubChatModel(ttft=args.llm_ttft, tokens_per_second=args.llm_tokens_per_second, answer_tokens=args.answer_tokens)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        history_store = SQLiteChatHistoryStore(path=os.path.join(tmp_dir, "history.sqlite3"))
+        assistant = ChatAssistant(llm=llm, qdrant_client=client, embeddings=embeddings, history_store=history_store, use_answer_cache=args.answer_cache)
+        chain = assistant.generate_response()
+
+        results = []
+        lock = threading.Lock()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.sessions) as executor:
+            futures = [
+                executor.submit(run_session, assistant, chain, f"session-{i}", args.turns, results, lock)
+                for i in range(args.sessions)
+            ]
+            for future in futures:
+                future.result()
+        report(results, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import os
+import re
+from typing import List, Optional, Dict, Any
+from langchain_core.documents import Document
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as qdrant_models
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.runnables.history import RunnableWithMessageHistory
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain.chains.combine_documents import create_stuff_documents_chain
+from langchain.chains import create_history_aware_retriever, create_retrieval_chain
+from context_packing import PackedQdrantRetriever
+from rfp_common.chunk_store import ChunkStore, get_chunk_store
+from chat_history import SQLiteChatHistoryStore, get_chat_history_store, summarize_with_llm
+from answer_cache import get_answer_cache, read_corpus_version
+from rfp_common.embeddings import get_embedding_backend
+from rfp_common.clients import get_chat_model, get_qdrant_client
+
+QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION")
+CHAT_HISTORY_SUMMARIZE = os.getenv("CHAT_HISTORY_SUMMARIZE", "false").lower() == "true"
+
+
+def retrieve_as_retriever(metadata_filter: Optional[Dict[str, Any]] = None, qdrant_client: Optional[QdrantClient] = None, embeddings: Optional[Embeddings] = None, chunk_store: Optional[ChunkStore] = None) -> BaseRetriever:
+    """Load the existing vectorstore and retrieve the relevant documents, deduplicated and packed into the context budget."""
+    try:
+        if qdrant_client is None:
+            qdrant_client = get_qdrant_client()
+        if embeddings is None:
+            # Must be the EMBEDDING_BACKEND the ingestion service used
+            embeddings = get_embedding_backend().embeddings
+        filter = None
+        if metadata_filter:
+            filter = qdrant_models.Filter(
+                    must=[
+                        qdrant_models.FieldCondition(
+                            key="rfp_status",
+                            match=qdrant_models.MatchValue(value=metadata_filter["rfp_status"])
+                        )
+                    ]
+                )
+
+        # Over-fetch, drop near-duplicates and pack into CONTEXT_MAX_TOKENS
+        return PackedQdrantRetriever(
+            client=qdrant_client,
+            collection_name=QDRANT_COLLECTION,
+            embeddings=embeddings,
+            search_filter=filter,
+            chunk_store=chunk_store or get_chunk_store(),
+        )
+    except Exception as e:
+        print(f"Error during document retrieval: {e}")
+        raise e
+
+def format_docs_with_id(docs: List[Document]) -> str:
+    formatted = set([
+        f"Source: {os.path.basename(os.path.normpath(reference['source']))} \n Page Number: {reference['page']}"
+        for doc in docs
+        for reference in doc.metadata.get("references") or [doc.metadata]
+    ])
+    return "\n\n" + "\n\n".join(formatted)
+
+
+class ChatAssistant:    
+    def __init__(self, top_k: int = 5, llm: Optional[BaseChatModel] = None, qdrant_client: Optional[QdrantClient] = None, embeddings: Optional[Embeddings] = None, history_store: Optional[SQLiteChatHistoryStore] = None, use_answer_cache: bool = True):
+        # The optional clients let the load test swap in stubs; the UI uses the process-wide ones
+        self.top_k = top_k
+        self.llm = llm or get_chat_model()
+        self.qdrant_client = qdrant_client
+        self.embeddings = embeddings or get_embedding_backend().embeddings
+        self.history_store = history_store
+        self.answer_cache = get_answer_cache() if use_answer_cache else None
+        # Set by generate_response: answers are only shared between chains with the same filter
+        self.cache_scope = "all"
+        self._session_store = None
+        self._retriever = None
+
+
+    def generate_response(self, metadata_filter: Optional[Dict[str, Any]] = None) -> RunnableWithMessageHistory:
+        retriever = retrieve_as_retriever(metadata_filter, self.qdrant_client, self.embeddings)
+        self._retriever = retriever
+
+        ### Contextualize question ###
+        contextualize_q_system_prompt = """Given a chat history and the latest user question \
+        which might reference context in the chat history, formulate a standalone question \
+        which can be understood without the chat history. Do NOT answer the question, \
+        just reformulate it if needed and otherwise return it as is."""
+        contextualize_q_prompt = ChatPromptTemplate.from_messages(
+            [
+                ("system", contextualize_q_system_prompt),
+                MessagesPlaceholder("chat_history"),
+                ("human", "{input}"),
+            ]
+        )
+        history_aware_retriever = create_history_aware_retriever(
+            self.llm, retriever, contextualize_q_prompt
+        )
+
+
+        ### Answer question ###
+        qa_system_prompt = """You are an intelligent assistant designed to help \
+        users interact with documents related to the company's Requests for Proposals (RFPs) \
+        and their responses. Use the retrieved context from the document database to provide \
+        accurate, concise, and helpful answers to questions. \
+        Ensure you prioritize factual information from the documents and clarify if the information is not available. \
+        Maintain professionalism and be concise. \
+        If a user asks a question outside the scope of the documents, politely inform them.
+
+        {context}"""
+        qa_prompt = ChatPromptTemplate.from_messages(
+            [
+                ("system", qa_system_prompt),
+                MessagesPlaceholder("chat_history"),
+                ("human", "{input}"),
+            ]
+        )
+        question_answer_chain = create_stuff_documents_chain(self.llm, qa_prompt)
+
+        rag_chain = create_retrieval_chain(history_aware_retriever, question_answer_chain)
+
+        # Persistent per-session history, trimmed to CHAT_HISTORY_MAX_TOKENS
+        summarizer = summarize_with_llm(self.llm) if CHAT_HISTORY_SUMMARIZE else None
+        store = self.history_store or get_chat_history_store(summarizer)
+        self._session_store = store
+        self.cache_scope = metadata_filter["rfp_status"] if metadata_filter else "all"
+
+        def get_session_history(session_id: str) -> BaseChatMessageHistory:
+            return store.get_session_history(session_id)
+
+        conversational_rag_chain: RunnableWithMessageHistory = RunnableWithMessageHistory(
+            rag_chain,
+            get_session_history,
+            input_messages_key="input",
+            history_messages_key="chat_history",
+            output_messages_key="answer",
+        )
+
+        return conversational_rag_chain
+
+
+    def Response(self, conversational_rag_chain: RunnableWithMessageHistory, query, session_id):
+
+        # response = conversational_rag_chain.invoke(
+        #         {"input": query},
+        #         config={
+        #             "configurable": {"session_id": session_id}
+        #         },
+        #     )
+
+        #response_with_references = f"{response['answer']}\n````` {format_docs_with_id(response['context'])}"
+        # response = response["answer"]
+        # return response_with_references
+
+        # Only answers to questions asked without prior history are cached, since
+        # follow-up questions are rewritten from the conversation before retrieval
+        history = self._session_store.get_session_history(session_id) if self._session_store else None
+        cacheable = self.answer_cache is not None and history is not None and not history.messages
+        if cacheable:
+            query_vector = self.embeddings.embed_query(query)
+            # Read before answering: documents ingested meanwhile must retire this answer
+            corpus_version = read_corpus_version(self.cache_scope)
+            cached = self.answer_cache.lookup(query_vector, self.cache_scope, corpus_version)
+            if cached is not None:
+                history.add_user_message(query)
+                history.add_ai_message(cached["answer"])
+                for word in re.split(r"(?<=\s)", cached["answer"]):
+                    if word:
+                        yield word
+                yield cached["citations"]
+                return
+            # Without history the chain retrieves with the question as asked, so it can reuse this embedding
+            self._retriever.query_vectors[query] = query_vector
+
+        context = None
+        answer = []
+        for response in  conversational_rag_chain.stream(
+            {"input": query},
+            config={
+                "configurable": {"session_id": session_id}
+            },
+        ):
+            if 'context' in response:
+                context = response['context']
+            if 'answer' in response:
+                answer.append(str(response['answer']))
+                yield str(response['answer'])
+
+        citations = f"\n````` {format_docs_with_id(context)}"
+        if cacheable:
+            self.answer_cache.store(query_vector, self.cache_scope, corpus_version, "".join(answer), citations)
+        yield citations
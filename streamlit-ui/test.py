@@ -1,6 +1,7 @@
 # Example: Fetch stored points directly from Qdrant
 from qdrant_client.http import models
 from qdrant_client import QdrantClient
+from rfp_common.clients import get_qdrant_client
 import os
 from pathlib import Path
 from dotenv import load_dotenv
@@ -16,10 +17,7 @@ QDRANT_URL = os.getenv("QDRANT_URL")
 QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION")
 MISTRALAI_API_KEY=os.getenv("MISTRALAI_API_KEY")
 
-qdrant_client = QdrantClient(
-    url=QDRANT_URL,
-    api_key=QDRANT_API_KEY
-)
+qdrant_client = get_qdrant_client()
 
 # Retrieve points from the collection
 points = qdrant_client.search(
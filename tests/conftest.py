@@ -0,0 +1,56 @@
+import sys
+import hashlib
+from pathlib import Path
+import pytest
+from langchain_core.embeddings import Embeddings
+
+ROOT = Path(__file__).resolve().parent.parent
+# The server's modules import each other as top-level modules, as when run from fastapi/
+sys.path.insert(0, str(ROOT / "fastapi"))
+# So do the chat UI's; modules named like a server module (app.py) resolve to the server's
+sys.path.append(str(ROOT / "streamlit-ui"))
+# Both apps install the shared package from common/ (-e ../common)
+sys.path.append(str(ROOT / "common"))
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic stand-in for the embedding model, so tests need no API key or model download."""
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        return [byte / 255 for byte in hashlib.sha256(text.encode("utf-8")).digest()[:8]]
+
+
+@pytest.fixture
+def manifest(tmp_path, monkeypatch):
+    """An empty SQLite ingest manifest, installed as the process-wide one."""
+    import ingest_manifest
+
+    manifest = ingest_manifest.SQLiteIngestManifest(str(tmp_path / "manifest.sqlite3"))
+    monkeypatch.setattr(ingest_manifest, "_ingest_manifest", manifest)
+    return manifest
+
+
+@pytest.fixture
+def vector_db(tmp_path, monkeypatch):
+    """A QdrantDB on an in-memory Qdrant with its stores under tmp_path, installed as the process-wide one."""
+    from qdrant_client import QdrantClient
+    from rfp_common import clients, embeddings
+    import chunk_dedup
+    from rfp_common import chunk_store
+    import qdrant
+
+    monkeypatch.setenv("QDRANT_COLLECTION", "test")
+    monkeypatch.setitem(clients._clients, "qdrant", QdrantClient(":memory:"))
+    monkeypatch.setattr(embeddings, "_backend", embeddings.EmbeddingBackend("hash", HashEmbeddings(), 8))
+    monkeypatch.setattr(chunk_dedup, "_deduplicator", chunk_dedup.ChunkDeduplicator(chunk_dedup.DedupIndex(str(tmp_path / "dedup.sqlite3"))))
+    monkeypatch.setattr(chunk_store, "_chunk_store", chunk_store.ChunkStore(str(tmp_path / "chunks.sqlite3")))
+    monkeypatch.setattr(qdrant, "bump_corpus_version", lambda rfp_statuses: None)
+    db = qdrant.QdrantDB()
+    # Skips the embedding cache, which lives outside tmp_path
+    monkeypatch.setattr(db, "embed_texts", lambda texts, on_batch=None: db.embedding_function.embed_documents(texts))
+    db.create_collection()
+    monkeypatch.setattr(qdrant, "_vector_db", db)
+    return db
@@ -0,0 +1,20 @@
+from answer_cache import AnswerCache
+
+
+def test_answer_is_stored_under_the_version_it_was_answered_from():
+    cache = AnswerCache(threshold=0.9)
+    assert cache.lookup([1.0, 0.0], "new", version=1) is None
+    # Documents are ingested while the answer is generated
+    cache.store([1.0, 0.0], "new", 1, "EU hosting", "[1]")
+
+    assert cache.lookup([1.0, 0.01], "new", version=2) is None
+    assert cache.lookup([1.0, 0.0], "new", version=1) is None
+
+
+def test_similar_question_hits_within_its_scope_only():
+    cache = AnswerCache(threshold=0.9)
+    cache.store([1.0, 0.0], "new", 3, "EU hosting", "[1]")
+
+    assert cache.lookup([1.0, 0.1], "new", version=3) == {"answer": "EU hosting", "citations": "[1]"}
+    assert cache.lookup([1.0, 0.1], "submitted", version=3) is None
+    assert cache.lookup([0.0, 1.0], "new", version=3) is None
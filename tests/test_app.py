@@ -0,0 +1,42 @@
+import anyio
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def app_module(monkeypatch):
+    import app
+    import drive_sync
+
+    monkeypatch.setattr(drive_sync, "DRIVE_SYNC_ENABLED", False)
+    monkeypatch.setattr(app, "readiness", {"vector_db": False, "error": None})
+    return app
+
+
+def test_readyz_is_503_until_qdrant_is_reachable(app_module, monkeypatch):
+    import qdrant
+
+    def unreachable():
+        raise ConnectionError("qdrant is down")
+
+    monkeypatch.setattr(qdrant, "initialiseVectorDatabase", unreachable)
+    # Startup does not wait for Qdrant
+    with TestClient(app_module.app) as client:
+        assert client.get("/healthz").status_code == 200
+        response = client.get("/readyz")
+        assert response.status_code == 503
+        assert response.json()["checks"]["vector_db"] is False
+
+
+def test_readyz_is_200_once_the_collection_exists(app_module, vector_db, monkeypatch):
+    from rfp_common import clients
+
+    monkeypatch.setattr(clients, "warm_up_clients", lambda mistral=True: None)
+    with TestClient(app_module.app) as client:
+        for _ in range(100):
+            if app_module.readiness["vector_db"]:
+                break
+            client.portal.call(anyio.sleep, 0.05)  # lets the readiness task run
+        response = client.get("/readyz")
+        assert response.status_code == 200
+        assert response.json()["status"] == "ready"
@@ -0,0 +1,53 @@
+import sqlite3
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from chat_history import SQLiteChatHistoryStore, estimate_tokens
+
+
+def exchange(question, answer):
+    return [HumanMessage(content=question), AIMessage(content=answer)]
+
+
+def test_older_exchanges_are_dropped_to_fit_the_budget(tmp_path):
+    store = SQLiteChatHistoryStore(str(tmp_path / "history.sqlite3"), max_tokens=60)
+    history = store.get_session_history("user")
+    for n in range(4):
+        history.add_messages(exchange(f"question {n} " + "x" * 80, f"answer {n}"))
+
+    messages = history.messages
+    assert [m.content.split()[1] for m in messages] == ["2", "2", "3", "3"]
+    assert isinstance(messages[0], HumanMessage)
+
+
+def test_latest_exchange_over_the_budget_is_kept_cut_short(tmp_path):
+    store = SQLiteChatHistoryStore(str(tmp_path / "history.sqlite3"), max_tokens=100)
+    history = store.get_session_history("user")
+    history.add_messages(exchange("Earlier question?", "Earlier answer."))
+    history.add_messages(exchange("Summarize the whole tender?", "Section. " * 500))
+
+    messages = history.messages
+    assert messages[0].content == "Summarize the whole tender?"
+    assert messages[1].content.startswith("Section. ") and messages[1].content.endswith("[...]")
+    assert sum(estimate_tokens(m.content) for m in messages) <= 100
+
+
+def test_summarizer_runs_without_blocking_other_writers(tmp_path):
+    path = str(tmp_path / "history.sqlite3")
+    calls = []
+
+    def summarize(summary, messages):
+        # Another session writes while the model is running
+        with sqlite3.connect(path, timeout=0.1) as conn:
+            conn.execute("INSERT INTO sessions (session_id, updated_at) VALUES ('other', 0)")
+        calls.append([m.content for m in messages])
+        return "talked about deadlines"
+
+    store = SQLiteChatHistoryStore(path, max_tokens=30, summarizer=summarize)
+    history = store.get_session_history("user")
+    history.add_messages(exchange("When is the deadline? " + "x" * 80, "Friday."))
+    history.add_messages(exchange("And the budget?", "Two million."))
+
+    assert calls == [["When is the deadline? " + "x" * 80, "Friday."]]
+    messages = history.messages
+    assert messages[0] == SystemMessage(content="Summary of the earlier conversation: talked about deadlines")
+    assert [m.content for m in messages[1:]] == ["And the budget?", "Two million."]
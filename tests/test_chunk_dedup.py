@@ -0,0 +1,132 @@
+import sqlite3
+import threading
+from langchain_core.documents.base import Document
+from qdrant_client.models import CreateAlias, CreateAliasOperation, PointIdsList
+
+from chunk_dedup import DedupIndex, band_hashes, minhash_signature
+
+BOILERPLATE = " ".join(f"standard terms clause{i}" for i in range(60))
+
+
+def chunk(name, text=BOILERPLATE, folder="new"):
+    return Document(page_content=text, metadata={"source": f"assets/{folder}_{name}", "page": 0})
+
+
+def points(db):
+    return db.client.scroll(collection_name=db.collection_name, limit=100, with_payload=True)[0]
+
+
+def indexed_collections(db):
+    with sqlite3.connect(db.deduplicator.index.path) as conn:
+        return {collection for (collection,) in conn.execute("SELECT collection FROM signatures")}
+
+
+def test_copies_of_a_point_that_is_gone_become_a_point_again(vector_db):
+    vector_db.add_documents([chunk("a.pdf")], "test", lambda *args: None)
+    # Deleted behind the index's back, e.g. with a collection that was recreated
+    stale_id = str(points(vector_db)[0].id)
+    vector_db.client.delete(collection_name=vector_db.collection_name, points_selector=PointIdsList(points=[stale_id]))
+
+    vector_db.add_documents([chunk("b.pdf"), chunk("c.pdf")], "test", lambda *args: None)
+
+    stored = points(vector_db)
+    assert len(stored) == 1
+    assert [reference["source"] for reference in stored[0].payload["references"]] == ["b.pdf", "c.pdf"]
+    assert stale_id not in vector_db.deduplicator.index.candidates(vector_db.collection_name, "new", band_hashes(minhash_signature(BOILERPLATE)))
+
+
+def test_index_is_keyed_by_the_collection_behind_an_alias(vector_db, monkeypatch):
+    from qdrant import QdrantDB
+
+    vector_db.client.update_collection_aliases(change_aliases_operations=[
+        CreateAliasOperation(create_alias=CreateAlias(collection_name=vector_db.collection_name, alias_name="live")),
+    ])
+    live = QdrantDB(collection_name="live")
+    monkeypatch.setattr(live, "embed_texts", vector_db.embed_texts)
+    live.add_documents([chunk("a.pdf")], "test", lambda *args: None)
+
+    assert live.resolve_collection() == vector_db.collection_name
+    assert indexed_collections(vector_db) == {vector_db.collection_name}
+    # A copy added through the collection's own name collapses into the same point
+    vector_db.add_documents([chunk("b.pdf")], "test", lambda *args: None)
+    assert len(points(vector_db)) == 1
+
+
+def test_signatures_keyed_by_point_alone_are_migrated(tmp_path):
+    path = str(tmp_path / "dedup.sqlite3")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE signatures (point_id TEXT PRIMARY KEY, collection TEXT NOT NULL, signature BLOB NOT NULL)")
+        conn.execute("INSERT INTO signatures VALUES ('p1', 'docs_v1', ?)", (minhash_signature(BOILERPLATE).tobytes(),))
+
+    index = DedupIndex(path)
+    # The same point ID can now be indexed in a second collection
+    index.add_many("docs_v2", [("p1", "new", minhash_signature(BOILERPLATE))])
+    with sqlite3.connect(path) as conn:
+        assert sorted(conn.execute("SELECT collection, point_id FROM signatures")) == [("docs_v1", "p1"), ("docs_v2", "p1")]
+
+
+def test_reference_lock_is_shared_by_indexes_on_the_same_file(tmp_path):
+    path = str(tmp_path / "dedup.sqlite3")
+    first, second = DedupIndex(path), DedupIndex(path)
+    acquired = threading.Event()
+
+    def take_second():
+        with second.lock():
+            acquired.set()
+
+    with first.lock():
+        thread = threading.Thread(target=take_second)
+        thread.start()
+        assert not acquired.wait(0.3)
+    assert acquired.wait(5)
+    thread.join()
+
+
+def test_concurrent_copies_of_a_chunk_are_stored_once(vector_db):
+    from chunk_dedup import ChunkDeduplicator
+    from qdrant import QdrantDB
+
+    # A second process, with its own handle on the same index file
+    other = QdrantDB()
+    other.deduplicator = ChunkDeduplicator(DedupIndex(vector_db.deduplicator.index.path))
+    # Both look the chunk up before either has stored it
+    both_embedding = threading.Barrier(2, timeout=5)
+
+    def embed_texts(db):
+        def embed(texts, on_batch=None):
+            if texts:
+                both_embedding.wait()
+            return db.embedding_function.embed_documents(texts)
+        return embed
+
+    vector_db.embed_texts, other.embed_texts = embed_texts(vector_db), embed_texts(other)
+    threads = [
+        threading.Thread(target=db.add_documents, args=([chunk(name)], "test", lambda *args: None))
+        for db, name in ((vector_db, "a.pdf"), (other, "b.pdf"))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stored = points(vector_db)
+    assert len(stored) == 1
+    assert sorted(reference["source"] for reference in stored[0].payload["references"]) == ["a.pdf", "b.pdf"]
+
+
+def test_index_is_writable_while_points_are_deleted(vector_db, monkeypatch):
+    vector_db.add_documents([chunk("a.pdf")], "test", lambda *args: None)
+    scroll = vector_db.client.scroll
+
+    def scroll_and_write(*args, **kwargs):
+        # Fails at once if the references lock held an SQLite write transaction
+        conn = sqlite3.connect(vector_db.deduplicator.index.path, timeout=0, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("ROLLBACK")
+        finally:
+            conn.close()
+        return scroll(*args, **kwargs)
+
+    monkeypatch.setattr(vector_db.client, "scroll", scroll_and_write)
+    assert vector_db.delete_file_points("unknown", filename="a.pdf", rfp_status="new") == 1
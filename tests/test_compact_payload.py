@@ -0,0 +1,44 @@
+import pytest
+from langchain_core.documents.base import Document
+
+
+@pytest.fixture
+def compact_db(request, monkeypatch):
+    import qdrant
+
+    monkeypatch.setattr(qdrant, "QDRANT_PAYLOAD_MODE", "compact")
+    return request.getfixturevalue("vector_db")
+
+
+def chunk(text, number):
+    metadata = {"source": "assets/new_scope.pdf", "page": number, "file_id": "scope", "version": "v1", "chunk": number}
+    return Document(page_content=text, metadata=metadata)
+
+
+TEXTS = [
+    " ".join(f"hosting requirement{i}" for i in range(40)),
+    " ".join(f"pricing schedule{i}" for i in range(40)),
+]
+
+
+def test_compact_points_round_trip_through_the_chunk_store(compact_db):
+    from rfp_common.chunk_store import get_chunk_store
+    from context_packing import PackedQdrantRetriever
+
+    compact_db.add_documents([chunk(text, number) for number, text in enumerate(TEXTS)], "test", lambda *args: None)
+
+    points = compact_db.client.scroll(collection_name=compact_db.collection_name, with_payload=True)[0]
+    assert all(set(point.payload) == {"source", "rfp_status", "page", "file_id", "version"} for point in points)
+    assert sorted(chunk["text"] for chunk in get_chunk_store().get_many([str(p.id) for p in points]).values()) == sorted(TEXTS)
+
+    retriever = PackedQdrantRetriever(
+        client=compact_db.client, collection_name=compact_db.collection_name, embeddings=compact_db.embedding_function,
+        chunk_store=get_chunk_store(), k=2,
+    )
+    documents = retriever.invoke(TEXTS[1])
+    assert sorted(doc.page_content for doc in documents) == sorted(TEXTS)
+    assert {doc.metadata["source"] for doc in documents} == {"scope.pdf"}
+
+    # Deleting the file drops its texts too
+    compact_db.delete_file_points("scope")
+    assert get_chunk_store().get_many([str(p.id) for p in points]) == {}
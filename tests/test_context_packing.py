@@ -0,0 +1,36 @@
+import numpy as np
+from langchain_core.documents import Document
+
+from context_packing import estimate_tokens, merge_adjacent, pack_to_budget, select_diverse
+
+
+def doc(text, page=0, source="rfp.pdf"):
+    return Document(page_content=text, metadata={"source": source, "rfp_status": "new", "page": page})
+
+
+def test_select_diverse_drops_near_duplicates_of_selected_chunks():
+    query = np.array([1.0, 0.0, 0.0])
+    vectors = np.array([
+        [0.9, 0.1, 0.0],
+        [0.9, 0.1, 0.001],  # the same chunk again
+        [0.6, 0.0, 0.8],
+    ])
+    assert select_diverse(query, vectors, k=3) == [0, 2]
+
+
+def test_chunks_of_one_page_are_merged_without_repeating_their_overlap():
+    opening = "The supplier shall provide round-the-clock support for all systems. "
+    closing = "Response times are four hours for critical incidents."
+    merged = merge_adjacent([doc(opening + closing[:30]), doc("Other page", page=1), doc(closing)])
+
+    assert [d.page_content for d in merged] == [opening + closing, "Other page"]
+
+
+def test_pack_to_budget_keeps_the_most_relevant_chunks_that_fit():
+    documents = [doc("a" * 400), doc("b" * 4000, page=1), doc("c" * 400, page=2)]
+    packed = pack_to_budget(documents, max_tokens=250)
+
+    assert [d.page_content[0] for d in packed] == ["a", "c"]
+    assert sum(estimate_tokens(d.page_content) for d in packed) <= 250
+    # The first chunk is kept even if it alone is over the budget
+    assert [d.page_content[0] for d in pack_to_budget(documents[1:], max_tokens=10)] == ["b"]
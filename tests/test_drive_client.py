@@ -0,0 +1,76 @@
+import json
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from google.oauth2.credentials import Credentials
+
+from drive_client import DriveClientFactory
+
+
+def write_token(path, expiry):
+    path.write_text(json.dumps({
+        "token": "access", "refresh_token": "refresh", "client_id": "id", "client_secret": "secret",
+        "expiry": expiry.strftime("%Y-%m-%dT%H:%M:%SZ"),
+    }))
+
+
+@pytest.fixture
+def refreshes(monkeypatch):
+    calls = []
+
+    def refresh(creds, request):
+        calls.append(threading.get_ident())
+        creds.token = f"access-{len(calls)}"
+        creds.expiry = datetime.utcnow() + timedelta(hours=1)
+
+    monkeypatch.setattr(Credentials, "refresh", refresh)
+    return calls
+
+
+def test_each_thread_gets_its_own_service_until_credentials_are_reset(tmp_path, refreshes):
+    token_file = tmp_path / "token.json"
+    write_token(token_file, datetime.utcnow() + timedelta(hours=1))
+    factory = DriveClientFactory(token_file=str(token_file))
+
+    services = {}
+
+    def get(name):
+        services[name] = factory.get_service()
+
+    threads = [threading.Thread(target=get, args=(name,)) for name in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    mine = factory.get_service()
+    assert factory.get_service() is mine
+    assert len({id(service) for service in (services["a"], services["b"], mine)}) == 3
+    factory.reset_credentials()
+    assert factory.get_service() is not mine
+    assert refreshes == []
+
+
+def test_token_near_expiry_is_refreshed_once_across_threads(tmp_path, refreshes):
+    token_file = tmp_path / "token.json"
+    # Inside the refresh margin
+    write_token(token_file, datetime.utcnow() + timedelta(minutes=1))
+    factory = DriveClientFactory(token_file=str(token_file))
+
+    threads = [threading.Thread(target=factory.get_credentials) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(refreshes) == 1
+    assert json.loads(token_file.read_text())["token"] == "access-1"
+
+
+def test_missing_token_requires_authentication(tmp_path):
+    factory = DriveClientFactory(token_file=str(tmp_path / "token.json"))
+    with pytest.raises(HTTPException) as error:
+        factory.get_service()
+    assert error.value.status_code == 401
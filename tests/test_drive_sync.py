@@ -0,0 +1,291 @@
+import pytest
+from langchain_core.documents.base import Document
+
+import drive_sync
+import profiling
+from drive_sync import DriveSync, SimulatedChangeSource, remove_indexed_files, resolve_changes
+from google_drive_downloader import GoogleDriveDownloader
+from ingest_manifest import entry_version, file_version
+from manifest_backfill import backfill
+from ingest_scheduler import ingest_in_priority_order, record_ingested
+
+TRACKED = {"folder-new": "new", "folder-submitted": "submitted"}
+
+
+def drive_file(file_id, name, folder, modified_time="2024-01-01T00:00:00.000Z"):
+    return {"id": file_id, "name": name, "folder": folder, "modifiedTime": modified_time, "size": "100"}
+
+
+def change(file_id, name=None, parent=None, modified_time="2024-01-01T00:00:00.000Z", removed=False, mime_type="application/pdf"):
+    if removed:
+        return {"changeType": "file", "fileId": file_id, "removed": True}
+    return {"changeType": "file", "fileId": file_id, "removed": False, "file": {
+        "id": file_id, "name": name, "mimeType": mime_type, "parents": [parent], "trashed": False,
+        "modifiedTime": modified_time, "size": "100",
+    }}
+
+
+def ingest(db, file, texts):
+    """Insert the chunks of a version of a Drive file as the scheduler would."""
+    path = f"assets/{file['folder']}_{GoogleDriveDownloader.sanitize_filename(file['name'])}"
+    documents = [
+        Document(page_content=text, metadata={"source": path, "page": 0, "file_id": file["id"], "version": file_version(file), "chunk": number})
+        for number, text in enumerate(texts)
+    ]
+    return db.add_documents(documents, "test", lambda *args: None)
+
+
+def points(db):
+    return db.client.scroll(collection_name=db.collection_name, limit=100, with_payload=True)[0]
+
+
+def text(label):
+    return " ".join(f"{label} word{i}" for i in range(50))
+
+
+def test_resolve_changes_classifies_latest_change_per_file(manifest):
+    for file in [
+        drive_file("shared", "shared.pdf", "new"),
+        drive_file("edited", "edited.pdf", "new"),
+        drive_file("moved", "moved.pdf", "new"),
+        drive_file("deleted", "deleted.pdf", "new"),
+        drive_file("untracked", "untracked.pdf", "new"),
+    ]:
+        manifest.record(file)
+
+    upserts, removals = resolve_changes([
+        change("added", "added.pdf", "folder-new", modified_time="2024-01-01T00:00:00.000Z"),
+        change("added", "added.pdf", "folder-new", modified_time="2024-02-01T00:00:00.000Z"),
+        change("shared", "shared.pdf", "folder-new"),  # e.g. shared with someone
+        change("edited", "edited.pdf", "folder-new", modified_time="2024-03-01T00:00:00.000Z"),
+        change("moved", "moved.pdf", "folder-submitted"),
+        change("deleted", removed=True),
+        change("untracked", "untracked.pdf", "folder-elsewhere"),
+        change("never-indexed", removed=True),
+        change("folder", "subfolder", "folder-new", mime_type=drive_sync.FOLDER_MIME_TYPE),
+    ], TRACKED, manifest)
+
+    assert {file["id"]: (file["folder"], file["modifiedTime"]) for file in upserts} == {
+        "added": ("new", "2024-02-01T00:00:00.000Z"),
+        "edited": ("new", "2024-03-01T00:00:00.000Z"),
+        "moved": ("submitted", "2024-01-01T00:00:00.000Z"),
+    }
+    # Changed and moved files keep their points until the new version is in
+    assert sorted(entry["file_id"] for entry in removals) == ["deleted", "untracked"]
+
+
+@pytest.fixture
+def sync(tmp_path, manifest):
+    source = SimulatedChangeSource()
+    applied = []
+    failing = set()
+
+    def apply_changes(upserts, removals, processing_id):
+        applied.append(([file["id"] for file in upserts], [entry["file_id"] for entry in removals]))
+        return [file for file in upserts if file["id"] in failing]
+
+    sync = DriveSync(source, apply_changes, manifest=manifest, state_file=str(tmp_path / "state.json"), max_attempts=3)
+    sync.sync_once()  # takes the starting page token
+    return sync, source, applied, failing
+
+
+def test_sync_once_retries_failed_files_up_to_max_attempts(sync):
+    sync, source, applied, failing = sync
+    failing.add("a")
+    source.emit("a", "a.pdf", "new")
+    source.emit("b", "b.pdf", "new")
+
+    assert sync.sync_once() == {"upserts": 2, "deletes": 0, "failed": 1}
+    # The page token moves on; the failure is kept for the next rounds instead
+    assert sync.load_state()["page_token"] == source.start_page_token()
+    assert sync.load_state()["failed"][0]["attempts"] == 1
+
+    assert sync.sync_once() == {"upserts": 1, "deletes": 0, "failed": 1}
+    assert applied[-1] == (["a"], [])
+    sync.sync_once()
+    assert sync.load_state()["failed"] == []  # given up after the third attempt
+    sync.sync_once()
+    assert len(applied) == 3
+
+
+def test_sync_once_drops_retry_superseded_by_newer_change(sync):
+    sync, source, applied, failing = sync
+    failing.add("a")
+    source.emit("a", "a.pdf", "new")
+    sync.sync_once()
+
+    failing.clear()
+    source.emit("a", "a.pdf", None)  # deleted before the retry
+    assert sync.sync_once() == {"upserts": 0, "deletes": 0, "failed": 0}
+    assert applied == [(["a"], [])]
+    assert sync.load_state()["failed"] == []
+
+
+def test_record_ingested_retires_replaced_version_only(vector_db, manifest):
+    old = drive_file("a", "report.pdf", "new")
+    ingest(vector_db, old, [text("old"), text("kept")])
+    record_ingested(old, {}, 0.0, 0.0)
+
+    new = drive_file("a", "report.pdf", "submitted", modified_time="2024-05-01T00:00:00.000Z")
+    ingest(vector_db, new, [text("new"), text("kept")])
+    # Both versions are searchable until the new one is recorded
+    assert {point.payload["version"] for point in points(vector_db)} == {file_version(old), file_version(new)}
+
+    record_ingested(new, {}, 0.0, 0.0)
+    assert {point.payload["version"] for point in points(vector_db)} == {file_version(new)}
+    assert len(points(vector_db)) == 2
+    assert manifest.get("a")["folder"] == "submitted"
+
+
+def test_record_ingested_retires_points_without_file_id(vector_db, manifest):
+    old = drive_file("a", "report.pdf", "new")
+    vector_db.add_documents([Document(page_content=text("legacy"), metadata={"source": "assets/new_report.pdf", "page": 0})], "test", lambda *args: None)
+    manifest.record(old)
+
+    new = drive_file("a", "report.pdf", "new", modified_time="2024-05-01T00:00:00.000Z")
+    ingest(vector_db, new, [text("new")])
+    record_ingested(new, {}, 0.0, 0.0)
+    assert [point.payload["file_id"] for point in points(vector_db)] == ["a"]
+
+
+def test_point_ids_repeat_within_a_collection_only(vector_db):
+    from qdrant import chunk_point_id
+
+    file = drive_file("a", "report.pdf", "new")
+    ingest(vector_db, file, [text("first")])
+    ingest(vector_db, file, [text("first")])  # a retry overwrites its points
+    assert len(points(vector_db)) == 1
+    # A re-index collection must not share IDs, and so chunk store rows, with the live one
+    document = Document(page_content="", metadata={"file_id": "a", "version": file_version(file), "chunk": 0})
+    assert chunk_point_id(document.metadata, "docs_v1") != chunk_point_id(document.metadata, "docs_v2")
+
+
+def test_remove_indexed_files_keeps_points_shared_with_other_files(vector_db, manifest, tmp_path, monkeypatch):
+    monkeypatch.setattr(GoogleDriveDownloader, "DOWNLOAD_DIR", str(tmp_path / "assets"))
+    a, b = drive_file("a", "a.pdf", "new"), drive_file("b", "b.pdf", "new")
+    ingest(vector_db, a, [text("boilerplate"), text("only a")])
+    ingest(vector_db, b, [text("boilerplate")])
+    for file in (a, b):
+        record_ingested(file, {}, 0.0, 0.0)
+
+    remove_indexed_files([manifest.get("a")])
+    remaining = points(vector_db)
+    assert len(remaining) == 1
+    assert [reference["file_id"] for reference in remaining[0].payload["references"]] == ["b"]
+    assert manifest.get("a") is None
+
+
+class FakeDownloader:
+    DOWNLOAD_WORKERS = 2
+
+    def __init__(self, broken: set[str]):
+        self.broken = broken
+
+    def ensure_download_directory(self):
+        pass
+
+    def download_file(self, file_id, file_name, folder, overwrite=False):
+        if file_id in self.broken:
+            raise IOError("download failed")
+        return f"assets/{folder}_{file_name}"
+
+
+def test_ingest_in_priority_order_returns_failed_files(vector_db, manifest):
+    files = [drive_file(file_id, f"{file_id}.pdf", "new") for file_id in ("ok", "no-download", "bad-file")]
+
+    def ingest_file(file_path, processing_id, progress_callback, stats, file_id, version):
+        if file_id == "bad-file":
+            raise ValueError("could not parse")
+        return ingest(vector_db, next(file for file in files if file["id"] == file_id), [text(file_id)])
+
+    failed = ingest_in_priority_order(FakeDownloader({"no-download"}), files, "test", lambda *args: None, ingest_file)
+    assert sorted(file["id"] for file in failed) == ["bad-file", "no-download"]
+    assert [entry["file_id"] for entry in manifest.all()] == ["ok"]
+
+
+class CountingDownloader(FakeDownloader):
+    def __init__(self):
+        super().__init__(set())
+        self.started = []
+
+    def download_file(self, file_id, file_name, folder, overwrite=False):
+        self.started.append(file_id)
+        return super().download_file(file_id, file_name, folder, overwrite)
+
+
+def test_downloads_run_at_most_download_workers_ahead(vector_db, manifest, tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    files = [drive_file(f"f{number}", f"f{number}.pdf", "new") for number in range(6)]
+    downloader = CountingDownloader()
+    ahead = []
+
+    def ingest_file(file_path, processing_id, progress_callback, stats, file_id, version):
+        ahead.append(len(downloader.started) - len(ahead) - 1)
+        return 0
+
+    with profiling.profiling("sync", enabled=True):
+        ingest_in_priority_order(downloader, files, "sync", lambda *args: None, ingest_file)
+    assert len(ahead) == 6 and max(ahead) <= FakeDownloader.DOWNLOAD_WORKERS
+    # Downloads run in pool threads and are still profiled as stages of the sync
+    stages = [stage["stage"] for stage in profiling.load_profile("sync")]
+    assert stages.count("download") == 6 and "ingest_in_priority_order" in stages
+
+
+class FakeListing(GoogleDriveDownloader):
+    def __init__(self, files: list[dict], download_dir: str):
+        super().__init__()
+        self.files = files
+        self.DOWNLOAD_DIR = download_dir
+
+    def list_all_files(self):
+        return self.files
+
+
+def test_backfill_tags_legacy_points_with_their_drive_file(vector_db, manifest, tmp_path):
+    def legacy_point(name, label):
+        document = Document(page_content=text(label), metadata={"source": f"assets/new_{name}", "page": 0})
+        vector_db.add_documents([document], "test", lambda *args: None)
+
+    for name in ("report.pdf", "fresh.pdf", "twin.pdf", "gone.pdf"):
+        legacy_point(name, name)
+    report = drive_file("report", "report.pdf", "new")
+    manifest.record(report)
+    fresh = drive_file("fresh", "fresh.pdf", "new")
+    # Same name in two subfolders of "new": their points cannot be told apart
+    twins = [drive_file("twin-1", "twin.pdf", "new"), drive_file("twin-2", "twin.pdf", "new")]
+
+    listing = FakeListing([report, fresh, *twins], str(tmp_path / "assets"))
+    listing.ensure_download_directory()
+    for name in ("report.pdf", "twin.pdf"):
+        open(listing.legacy_local_path(name, "new"), "w").close()
+
+    counts = backfill(listing, manifest, prune=True)
+
+    assert counts == {"updated": 2, "deleted": 1, "unresolved": 1}
+    by_source = {point.payload["metadata"]["source"]: point.payload for point in points(vector_db)}
+    assert by_source["report.pdf"]["version"] == file_version(report)
+    assert by_source["fresh.pdf"]["version"] == entry_version(manifest.get("fresh"))
+    assert "file_id" not in by_source["twin.pdf"]
+    assert "gone.pdf" not in by_source
+    # Re-ingested by the next full sync, which retires the untagged points
+    assert [manifest.get(file_id)["modified_time"] for file_id in ("fresh", "twin-1", "twin-2")] == [None, None, None]
+    # Local copies move into per-file directories; a shared name's copy is dropped
+    assert sorted(path.relative_to(tmp_path / "assets").as_posix() for path in (tmp_path / "assets").rglob("*.pdf")) == ["report/new_report.pdf"]
+
+
+def test_same_named_files_get_separate_local_copies(tmp_path):
+    from file_embedding import iter_asset_files
+    from qdrant import extract_file_details
+
+    downloader = GoogleDriveDownloader()
+    downloader.DOWNLOAD_DIR = str(tmp_path)
+    paths = [downloader.local_path(file_id, "scope.pdf", "new") for file_id in ("one", "two")]
+    for path in paths:
+        (tmp_path / path).parent.mkdir()
+        (tmp_path / path).touch()
+    (tmp_path / "manual.pdf").touch()
+
+    assert paths[0] != paths[1]
+    assert [extract_file_details(path) for path in paths] == [{"prefix": "new", "filename": "scope.pdf"}] * 2
+    # The re-index gives each its Drive file ID back
+    assert [file_id for _, file_id in iter_asset_files(str(tmp_path))] == ["local:manual.pdf", "one", "two"]
@@ -0,0 +1,71 @@
+import sys
+import types
+import pytest
+import langchain_mistralai
+
+from rfp_common import clients, embeddings
+import qdrant
+
+
+class FakeSentenceTransformer:
+    """Stands in for sentence_transformers.SentenceTransformer: 384-dimensional, encoding the text length."""
+
+    def __init__(self, model, device, **kwargs):
+        self.model, self.device, self.kwargs = model, device, kwargs
+
+    def get_sentence_embedding_dimension(self):
+        return 384
+
+    def encode(self, texts, **kwargs):
+        import numpy as np
+        return np.array([[float(len(text))] + [0.0] * 383 for text in texts])
+
+
+@pytest.fixture
+def sentence_transformers(monkeypatch):
+    monkeypatch.setitem(sys.modules, "torch", types.SimpleNamespace(set_num_threads=lambda threads: None))
+    monkeypatch.setitem(sys.modules, "sentence_transformers", types.SimpleNamespace(SentenceTransformer=FakeSentenceTransformer))
+
+
+def test_mistral_backend_uses_the_shared_pool_and_1024_dimensions(monkeypatch):
+    monkeypatch.setenv("MISTRALAI_API_KEY", "test-key")
+    pool = object()
+    monkeypatch.setitem(clients._clients, "mistral_http", pool)
+    monkeypatch.setattr(langchain_mistralai, "MistralAIEmbeddings", lambda **kwargs: kwargs)
+    backend = embeddings.create_embedding_backend("mistral", None)
+
+    assert (backend.name, backend.vector_size) == ("mistral-embed", 1024)
+    assert backend.embeddings["model"] == "mistral-embed" and backend.embeddings["client"] is pool
+
+
+def test_local_backend_takes_its_vector_size_from_the_model(sentence_transformers):
+    backend = embeddings.create_embedding_backend("local", None)
+
+    assert (backend.name, backend.vector_size) == (f"local:{embeddings.LOCAL_EMBEDDING_DEFAULT_MODEL}", 384)
+    assert backend.embeddings.model.device == "cpu" and backend.embeddings.model.kwargs == {}
+    backend.embeddings.query_prefix = "query: "
+    assert backend.embeddings.embed_query("scope")[0] == len("query: scope")
+    assert backend.embeddings.embed_documents(["scope"])[0][0] == len("scope")
+
+
+def test_onnx_runtime_is_passed_to_sentence_transformers(sentence_transformers):
+    assert embeddings.LocalEmbeddings("model", runtime="onnx").model.kwargs == {"backend": "onnx"}
+
+
+def test_local_backend_without_sentence_transformers_says_what_to_install(monkeypatch):
+    monkeypatch.setitem(sys.modules, "sentence_transformers", None)
+    with pytest.raises(RuntimeError, match="requirements-local-embeddings.txt"):
+        embeddings.create_embedding_backend("local", "model")
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError, match="openai"):
+        embeddings.create_embedding_backend("openai", None)
+
+
+def test_new_collection_takes_the_backend_vector_size(vector_db, sentence_transformers, monkeypatch):
+    monkeypatch.setattr(embeddings, "_backend", embeddings.create_embedding_backend("local", None))
+    db = qdrant.QdrantDB(collection_name="local")
+    db.create_collection()
+
+    assert db.client.get_collection("local").config.params.vectors.size == 384
@@ -0,0 +1,43 @@
+import threading
+
+from qdrant_client import QdrantClient
+
+# Imported first: it names the collection before rag_chain reads QDRANT_COLLECTION
+import loadtest
+from chat_history import SQLiteChatHistoryStore
+from rag_chain import ChatAssistant
+
+
+def test_concurrent_sessions_stream_answers_with_citations(tmp_path, capsys):
+    embeddings = loadtest.StubEmbeddings(size=16, latency=0)
+    client = QdrantClient(":memory:")
+    loadtest.build_corpus(client, embeddings, size=50)
+    llm = loadtest.StubChatModel(ttft=0.01, tokens_per_second=1000, answer_tokens=5)
+    assistant = ChatAssistant(
+        llm=llm, qdrant_client=client, embeddings=embeddings,
+        history_store=SQLiteChatHistoryStore(str(tmp_path / "history.sqlite3")), use_answer_cache=False,
+    )
+    chain = assistant.generate_response()
+
+    results, lock = [], threading.Lock()
+    sessions = [
+        threading.Thread(target=loadtest.run_session, args=(assistant, chain, f"session-{n}", 2, results, lock))
+        for n in range(4)
+    ]
+    for session in sessions:
+        session.start()
+    for session in sessions:
+        session.join()
+
+    assert len(results) == 8
+    assert all(0 < first_token <= total for first_token, total in results)
+    # Every turn of every session is in its own history
+    assert all(len(assistant._session_store.load(f"session-{n}")[1]) == 4 for n in range(4))
+    loadtest.report(results, wall_time=1.0)
+    assert "throughput: 8.00 turns/s" in capsys.readouterr().out
+
+
+def test_stub_embeddings_are_deterministic():
+    embeddings = loadtest.StubEmbeddings(size=8, latency=0)
+    assert embeddings.embed_query("pricing") == embeddings.embed_documents(["pricing"])[0]
+    assert embeddings.embed_query("pricing") != embeddings.embed_query("scope")
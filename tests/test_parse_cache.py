@@ -0,0 +1,62 @@
+import os
+import shutil
+import fitz
+import pytest
+
+import file_embedding
+from parse_cache import ParseCache
+
+
+def write_pdf(path, texts):
+    with fitz.open() as doc:
+        for text in texts:
+            doc.new_page().insert_text((72, 72), text)
+        doc.save(str(path))
+
+
+@pytest.fixture
+def parses(tmp_path, monkeypatch):
+    """Count the PDFs actually parsed, with a parse cache under tmp_path."""
+    monkeypatch.setattr(file_embedding, "get_parse_cache", lambda: ParseCache(str(tmp_path / "cache")))
+    calls = []
+    parse = file_embedding.iter_pdf_pages
+
+    def counting_parse(file_path):
+        calls.append(file_path)
+        return parse(file_path)
+
+    monkeypatch.setattr(file_embedding, "iter_pdf_pages", counting_parse)
+    return calls
+
+
+def texts(file_path):
+    return [page.page_content.strip() for page in file_embedding.iter_file_pages(str(file_path))]
+
+
+def test_file_is_parsed_again_only_when_its_content_changes(tmp_path, parses):
+    path = tmp_path / "scope.pdf"
+    write_pdf(path, ["Scope of work", "Deliverables"])
+
+    assert texts(path) == ["Scope of work", "Deliverables"]
+    assert texts(path) == ["Scope of work", "Deliverables"]
+    assert len(parses) == 1
+
+    # Touched, e.g. by a fresh download, with the same content: still cached
+    os.utime(path, (0, 0))
+    texts(path)
+    assert len(parses) == 1
+
+    write_pdf(path, ["Scope of work, revised", "Deliverables"])
+    assert texts(path) == ["Scope of work, revised", "Deliverables"]
+    assert len(parses) == 2
+
+
+def test_cached_pages_carry_the_current_path(tmp_path, parses):
+    first, second = tmp_path / "first.pdf", tmp_path / "second.pdf"
+    write_pdf(first, ["Same content"])
+    shutil.copy(first, second)
+
+    texts(first)
+    pages = list(file_embedding.iter_file_pages(str(second)))
+    assert len(parses) == 1
+    assert pages[0].metadata["source"] == str(second)
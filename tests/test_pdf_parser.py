@@ -0,0 +1,49 @@
+import fitz
+
+import pdf_parser
+
+PAGES = [f"Section {number} of the tender" for number in range(8)]
+
+
+def write_pdf(path):
+    with fitz.open() as doc:
+        for text in PAGES:
+            doc.new_page().insert_text((72, 72), text)
+        doc.save(str(path))
+
+
+class CountingPool:
+    def __init__(self, pool):
+        self.pool = pool
+        self.submitted = 0
+
+    def submit(self, *args):
+        self.submitted += 1
+        return self.pool.submit(*args)
+
+
+def parse(path, monkeypatch, memory_cap):
+    """Parse in ranges of two pages with three workers, noting how many ranges were submitted at each page."""
+    pool = CountingPool(pdf_parser._get_parse_pool())
+    monkeypatch.setattr(pdf_parser, "_get_parse_pool", lambda: pool)
+    monkeypatch.setattr(pdf_parser, "PDF_PARSE_WORKERS", 3)
+    monkeypatch.setattr(pdf_parser, "PDF_MEMORY_CAP_BYTES", memory_cap)
+    return [(text.strip(), metadata["page"], pool.submitted) for text, metadata in pdf_parser.iter_pdf_pages(str(path), pages_per_range=2)]
+
+
+def test_ranges_are_yielded_in_page_order(tmp_path, monkeypatch):
+    write_pdf(tmp_path / "tender.pdf")
+    pages = parse(tmp_path / "tender.pdf", monkeypatch, memory_cap=64 * 1024 * 1024)
+
+    assert [(text, page) for text, page, _ in pages] == [(text, page) for page, text in enumerate(PAGES)]
+    # Uncapped, the fourth range is submitted as soon as the first is consumed
+    assert pages[2][2] == 4
+
+
+def test_memory_cap_holds_back_ranges_until_earlier_ones_are_consumed(tmp_path, monkeypatch):
+    write_pdf(tmp_path / "tender.pdf")
+    pages = parse(tmp_path / "tender.pdf", monkeypatch, memory_cap=1)
+
+    assert [text for text, _, _ in pages] == PAGES
+    # One range fits under the cap: nothing new is submitted while two are still in flight
+    assert [submitted for _, _, submitted in pages] == [3, 3, 3, 3, 3, 3, 4, 4]
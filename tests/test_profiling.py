@@ -0,0 +1,27 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import profiling
+from profiling import load_profile, profile_stage, submit_in_context
+
+
+@profile_stage("parse")
+def parse(text):
+    return text.upper()
+
+
+def test_stages_in_pool_threads_are_profiled_only_when_submitted_in_context(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    with profiling.profiling("sync-1", enabled=True), ThreadPoolExecutor(max_workers=2) as executor:
+        assert submit_in_context(executor, parse, "scope").result() == "SCOPE"
+        executor.submit(parse, "pricing").result()
+
+    stages = load_profile("sync-1")
+    assert [stage["stage"] for stage in stages] == ["parse"]
+    assert stages[0]["cprofile"] is not None and stages[0]["error"] is None
+
+
+def test_nothing_is_recorded_when_profiling_is_disabled(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    with profiling.profiling("sync-2", enabled=False), ThreadPoolExecutor(max_workers=1) as executor:
+        submit_in_context(executor, parse, "scope").result()
+    assert load_profile("sync-2") is None
@@ -0,0 +1,63 @@
+import itertools
+import fitz
+import pytest
+
+import file_embedding
+import qdrant
+import reindex
+from parse_cache import ParseCache
+from reindex import ReindexError, get_alias_target
+
+
+@pytest.fixture
+def assets(tmp_path, monkeypatch, vector_db, manifest):
+    """One downloaded PDF under tmp_path/assets, with QDRANT_COLLECTION "test" as a plain collection."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "assets" / "scope").mkdir(parents=True)
+    with fitz.open() as doc:
+        for text in ("Hosting must be in the EU", "Support is round the clock"):
+            doc.new_page().insert_text((72, 72), text)
+        doc.save(str(tmp_path / "assets" / "scope" / "new_scope.pdf"))
+    parse_cache = ParseCache(str(tmp_path / "parse_cache"))
+    monkeypatch.setattr(file_embedding, "get_parse_cache", lambda: parse_cache)
+    # Skips the embedding cache, which lives outside tmp_path
+    monkeypatch.setattr(qdrant.QdrantDB, "embed_texts", lambda self, texts, on_batch=None: self.embedding_function.embed_documents(texts))
+    versions = itertools.count(1)
+    monkeypatch.setattr(reindex, "versioned_collection_name", lambda alias: f"{alias}_v{next(versions)}")
+    return vector_db
+
+
+def collections(db):
+    return sorted(c.name for c in db.client.get_collections().collections)
+
+
+def test_plain_collection_is_only_replaced_when_asked(assets):
+    with pytest.raises(ReindexError):
+        reindex.reindex(sample_queries=["hosting"])
+    # The failed build is cleaned up and the live collection is untouched
+    assert collections(assets) == ["test"]
+
+    assert reindex.reindex(replace_collection=True, sample_queries=["hosting"]) == "test_v2"
+    assert get_alias_target(assets, "test") == "test_v2"
+    assert assets.client.count(collection_name="test").count == 2
+
+
+def test_alias_moves_to_the_new_collection_and_old_ones_are_collected(assets):
+    reindex.reindex(replace_collection=True)
+    reindex.reindex(keep_previous=1)
+    assert get_alias_target(assets, "test") == "test_v2"
+    assert collections(assets) == ["test_v1", "test_v2"]
+
+    reindex.reindex(keep_previous=0)
+    assert get_alias_target(assets, "test") == "test_v3"
+    assert collections(assets) == ["test_v3"]
+
+
+def test_empty_build_never_goes_live(assets, tmp_path):
+    reindex.reindex(replace_collection=True)
+    (tmp_path / "assets" / "scope" / "new_scope.pdf").unlink()
+
+    with pytest.raises(ReindexError):
+        reindex.reindex()
+    assert get_alias_target(assets, "test") == "test_v1"
+    assert collections(assets) == ["test_v1"]
@@ -0,0 +1,70 @@
+import pytest
+from langchain_core.documents.base import Document
+
+import embedding_cache
+import ingest_manifest
+from qdrant import QdrantDB, chunk_point_id
+
+TEXTS = [" ".join(f"{topic} clause{i}" for i in range(40)) for topic in ("hosting", "pricing", "support")]
+
+
+def chunks():
+    return [
+        Document(page_content=text, metadata={"source": "assets/new_scope.pdf", "page": 0, "file_id": "scope", "version": "v1", "chunk": number})
+        for number, text in enumerate(TEXTS)
+    ]
+
+
+@pytest.fixture
+def exported(vector_db, manifest, tmp_path, monkeypatch):
+    """A bundle of the "test" collection, then fresh caches and manifest as in a new environment."""
+    vector_db.add_documents(chunks(), "test", lambda *args: None)
+    manifest.record({"id": "scope", "name": "scope.pdf", "folder": "new", "modifiedTime": "2024-01-01T00:00:00.000Z", "size": "100"})
+    manifest.record_stats({"id": "scope", "name": "scope.pdf", "size": "100"}, {"pages": 1, "chunks": 3, "points": 3}, 0.5, 2.0)
+    vector_db.export_snapshot(str(tmp_path / "bundle"))
+
+    monkeypatch.setattr(ingest_manifest, "_ingest_manifest", ingest_manifest.SQLiteIngestManifest(str(tmp_path / "new_manifest.sqlite3")))
+    monkeypatch.setattr(embedding_cache, "_embedding_cache", embedding_cache.EmbeddingCache(str(tmp_path / "embeddings.sqlite3")))
+    return str(tmp_path / "bundle")
+
+
+@pytest.fixture
+def target(vector_db, monkeypatch):
+    db = QdrantDB(collection_name="copy")
+
+    def embed_documents(texts):
+        raise AssertionError(f"re-embedded {len(texts)} texts that came with the bundle")
+
+    monkeypatch.setattr(db.embedding_function, "embed_documents", embed_documents)
+    return db
+
+
+def test_import_derives_point_ids_for_the_target_collection(exported, target):
+    assert target.import_snapshot(exported) == 3
+
+    ids = {str(point.id) for point in target.client.scroll(collection_name="copy", limit=10, with_payload=True)[0]}
+    assert ids == {chunk_point_id(doc.metadata, "copy") for doc in chunks()}
+    # Ingesting the same version again overwrites the imported points instead of adding to them
+    target.add_documents(chunks(), "test", lambda *args: None)
+    assert target.client.count(collection_name="copy").count == 3
+
+
+def test_import_brings_the_ingest_manifest_and_embedding_cache(exported, target):
+    target.import_snapshot(exported)
+
+    manifest = ingest_manifest.get_ingest_manifest()
+    assert manifest.get("scope")["modified_time"] == "2024-01-01T00:00:00.000Z"
+    assert [row["points"] for row in manifest.all_stats()] == [3]
+    # A new version of the file only embeds what changed
+    cache = embedding_cache.get_embedding_cache()
+    assert len(cache.get_many(target.embedding_model, TEXTS)) == 3
+
+
+def test_import_refuses_a_collection_with_other_vectors(exported, target):
+    from qdrant_client.models import Distance, VectorParams
+
+    target.client.create_collection("copy", vectors_config=VectorParams(size=4, distance=Distance.COSINE))
+    with pytest.raises(ValueError, match="4-dimensional"):
+        target.import_snapshot(exported)
+    assert target.client.count(collection_name="copy").count == 0
+    assert ingest_manifest.get_ingest_manifest().all() == []
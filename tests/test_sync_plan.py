@@ -0,0 +1,112 @@
+import pytest
+
+from sync_plan import DEFAULT_THROUGHPUT, entries_to_remove, estimate, files_to_ingest, plan_sync
+
+OLD = "2024-01-01T00:00:00.000Z"
+NEW = "2024-06-01T00:00:00.000Z"
+
+
+def drive_file(file_id, name, folder, modified_time=OLD, size=1000):
+    return {"id": file_id, "name": name, "folder": folder, "modifiedTime": modified_time, "size": str(size)}
+
+
+def entry(file_id, name, folder, modified_time=OLD):
+    return {"file_id": file_id, "name": name, "folder": folder, "modified_time": modified_time, "size": 1000, "ingested_at": 0.0}
+
+
+@pytest.fixture
+def plan():
+    files = [
+        drive_file("added", "added.pdf", "new"),
+        # Same name as added.pdf, in another subfolder of "new"
+        drive_file("added-twin", "added.pdf", "new"),
+        drive_file("updated", "updated.pdf", "new", modified_time=NEW),
+        drive_file("moved", "moved.pdf", "submitted"),
+        drive_file("renamed", "renamed v2.docx", "new"),
+        drive_file("unchanged", "unchanged.pdf", "new"),
+        drive_file("sheet", "budget.xlsx", "new"),
+    ]
+    manifest_entries = [
+        entry("updated", "updated.pdf", "new"),
+        entry("moved", "moved.pdf", "new"),
+        entry("renamed", "renamed.docx", "new"),
+        entry("unchanged", "unchanged.pdf", "new"),
+        entry("deleted", "deleted.pdf", "submitted"),
+    ]
+    return plan_sync(files, manifest_entries)
+
+
+def ids(files):
+    return sorted(file["id"] for file in files)
+
+
+def test_plan_sync_classifies_files_by_drive_id(plan):
+    assert ids(plan["add"]) == ["added", "added-twin"]
+    assert ids(plan["update"]) == ["updated"]
+    assert ids(plan["move"]) == ["moved", "renamed"]
+    assert ids(plan["unchanged"]) == ["unchanged"]
+    assert ids(plan["unsupported"]) == ["sheet"]
+    assert [entry["file_id"] for entry in plan["delete"]] == ["deleted"]
+    assert {file["id"]: file["previous"]["folder"] for file in plan["move"]} == {"moved": "new", "renamed": "new"}
+
+
+def test_only_deleted_files_are_removed_before_ingesting(plan):
+    assert [entry["file_id"] for entry in entries_to_remove(plan)] == ["deleted"]
+    to_ingest = files_to_ingest(plan)
+    assert ids(to_ingest) == ["added", "added-twin", "moved", "renamed", "updated"]
+    assert not any("previous" in file for file in to_ingest)
+
+
+def throughput(points_per_page=2.0):
+    kind = {"source": "default", "bytes_per_page": 100, "characters_per_page": 400, "points_per_page": points_per_page}
+    return {
+        "measured_files": 0,
+        "kinds": {"pdf": kind, "word": kind},
+        "download_bytes_per_second": 1000,
+        "ingest_pages_per_second": 10,
+    }
+
+
+def stats(points, bytes=1000, pages=5, characters=2000):
+    return {"bytes": bytes, "pages": pages, "characters": characters, "points": points}
+
+
+def test_estimate_scales_previous_ingestion_and_counts_replaced_points():
+    plan = plan_sync(
+        [drive_file("updated", "updated.pdf", "new", modified_time=NEW, size=2000), drive_file("moved", "moved.pdf", "submitted")],
+        [entry("updated", "updated.pdf", "new"), entry("moved", "moved.pdf", "new"), entry("deleted", "deleted.pdf", "new")],
+    )
+    previous_stats = {"updated": stats(points=10), "moved": stats(points=7), "deleted": stats(points=3)}
+
+    result = estimate(plan, throughput(), previous_stats, download_workers=2, ingest_workers=1)
+
+    # updated doubled in size: twice its last pages, characters and points
+    assert result["pages"] == 10 + 5
+    assert result["points_to_write"] == 20 + 7
+    # moved without changing: its chunks are all in the embedding cache
+    assert result["embedding_tokens"] == 4000 // 4
+    # The versions that updated and moved files replace, and the deleted file
+    assert result["points_to_delete"] == 10 + 7 + 3
+    assert result["download_bytes"] == 3000
+    assert result["download_seconds"] == 1.5
+    assert result["ingest_seconds"] == 1.5
+    assert result["wall_seconds"] == 1.5
+
+
+def test_estimate_falls_back_to_page_density_for_new_files():
+    plan = plan_sync([drive_file("added", "added.pdf", "new", size=1000)], [])
+    result = estimate(plan, throughput(points_per_page=2.5), {}, download_workers=1, ingest_workers=2)
+
+    assert result["pages"] == 10
+    assert result["embedding_tokens"] == 10 * 400 // 4
+    assert result["points_to_write"] == 25
+    assert result["points_to_delete"] == 0
+    assert result["wall_seconds"] == max(result["download_seconds"], result["ingest_seconds"]) == 1.0
+
+
+def test_default_throughput_is_used_without_measurements():
+    from sync_plan import measure_throughput
+
+    measured = measure_throughput([])
+    assert measured["download_bytes_per_second"] == DEFAULT_THROUGHPUT["download_bytes_per_second"]
+    assert {kind["source"] for kind in measured["kinds"].values()} == {"default"}
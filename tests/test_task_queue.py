@@ -0,0 +1,98 @@
+import threading
+import pytest
+
+from task_queue import RedisTaskQueue, SQLiteTaskQueue
+
+# An expired lease without waiting for one to run out
+EXPIRED = -1
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def make_queue(request, tmp_path, monkeypatch):
+    """Build queues on one shared store, so several of them act as separate workers."""
+    if request.param == "sqlite":
+        return lambda **kwargs: SQLiteTaskQueue(str(tmp_path / "tasks.sqlite3"), **kwargs)
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")  # fakeredis runs the Lua scripts with it
+    import redis
+
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.Redis, "from_url", lambda url, **kwargs: fakeredis.FakeRedis(server=server, **kwargs))
+    return lambda **kwargs: RedisTaskQueue("redis://fake", **kwargs)
+
+
+def test_tasks_are_claimed_by_priority(make_queue):
+    queue = make_queue()
+    queue.enqueue("sync", [{"name": "low"}, {"name": "high"}, {"name": "middle"}], [0.1, 0.9, 0.5])
+
+    claimed = [queue.claim("worker", 60)["payload"]["name"] for _ in range(3)]
+    assert claimed == ["high", "middle", "low"]
+    assert queue.claim("worker", 60) is None
+
+
+def test_expired_lease_is_claimed_again_by_another_worker(make_queue):
+    queue = make_queue()
+    (task_id,) = queue.enqueue("sync", [{"name": "a"}])
+    assert queue.claim("first", EXPIRED)["attempts"] == 1
+
+    task = queue.claim("second", 60)
+    assert (task["id"], task["attempts"]) == (task_id, 2)
+    # The first worker has lost the task
+    assert not queue.heartbeat(task_id, "first", 60)
+    queue.complete(task_id, "first")
+    assert queue.progress("sync")["leased"] == 1
+    queue.complete(task_id, "second")
+    assert queue.progress("sync") == {"queued": 0, "leased": 0, "done": 1, "failed": 0, "total": 1}
+    assert queue.done_payloads("sync") == [{"name": "a"}]
+
+
+def test_heartbeat_extends_the_lease(make_queue):
+    queue = make_queue()
+    (task_id,) = queue.enqueue("sync", [{"name": "a"}])
+    queue.claim("first", EXPIRED)
+
+    assert queue.heartbeat(task_id, "first", 60)
+    assert queue.claim("second", 60) is None
+
+
+def test_failed_task_is_retried_up_to_max_attempts(make_queue):
+    queue = make_queue(max_attempts=2, retry_delay=0)
+    (task_id,) = queue.enqueue("sync", [{"name": "a"}])
+
+    queue.fail(queue.claim("worker", 60)["id"], "worker", "parse error")
+    assert queue.progress("sync")["queued"] == 1
+    task = queue.claim("worker", 60)
+    assert task["attempts"] == 2
+    queue.fail(task_id, "worker", "parse error")
+
+    assert queue.claim("worker", 60) is None
+    assert queue.progress("sync")["failed"] == 1
+
+
+def test_lease_that_expires_on_the_last_attempt_fails_the_task(make_queue):
+    queue = make_queue(max_attempts=1)
+    queue.enqueue("sync", [{"name": "a"}])
+    queue.claim("worker", EXPIRED)
+
+    assert queue.claim("worker", 60) is None
+    assert queue.progress("sync")["failed"] == 1
+
+
+def test_concurrent_workers_never_claim_the_same_task(make_queue):
+    make_queue().enqueue("sync", [{"n": n} for n in range(40)])
+    claimed = []
+
+    def work(worker_id):
+        queue = make_queue()
+        while (task := queue.claim(worker_id, 60)) is not None:
+            claimed.append(task["payload"]["n"])
+            queue.complete(task["id"], worker_id)
+
+    workers = [threading.Thread(target=work, args=(f"worker-{n}",)) for n in range(6)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert sorted(claimed) == list(range(40))
+    assert make_queue().progress("sync")["done"] == 40